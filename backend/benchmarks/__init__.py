@@ -0,0 +1,25 @@
+"""
+Benchmarks and query budgets for the POS backend.
+
+Run from the backend directory:
+
+    python -m benchmarks                    # every suite
+    python -m benchmarks query_counts       # a single suite
+    python -m benchmarks explain --scale 100   # report plans on 1M orders
+    python -m benchmarks pagination         # page 1000: ?page= against the cursor
+    python -m benchmarks exports            # peak memory of the report downloads
+    python -m benchmarks realtime           # order board push latency
+    python -m benchmarks voucher_stress     # concurrent voucher postings
+    python -m benchmarks bulk_posting       # end-of-day voucher import rate
+    python -m benchmarks serialization      # nested lists against ?view=compact
+    python -m benchmarks ledger_statement   # cursor pages of a 100k-line ledger
+    python -m benchmarks auth               # cached JWT users against a query per request
+    python -m benchmarks passcode_login     # 50 terminals logging in at once
+    python -m benchmarks token_pruning      # deleting expired JWT tokens in batches
+    python -m benchmarks profiling          # cost of the per-endpoint profiling middleware
+    python -m benchmarks job_queue          # SMS jobs: retries, failures and queue limits
+    python -m benchmarks load --output load.json   # throughput and latency of the hot paths
+
+Each run creates a throw-away test database, seeds it and removes it
+afterwards, so it never touches the development database.
+"""
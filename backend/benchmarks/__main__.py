@@ -0,0 +1,86 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+
+
+# Suite name -> module in this package exposing run(options) -> dict.
+# A suite signals a failed budget by returning {"failures": [...]}.
+SUITES = [
+    "query_counts",
+    "explain",
+    "invoice_stress",
+    "import_time",
+    "pagination",
+    "exports",
+    "realtime",
+    "voucher_stress",
+    "bulk_posting",
+    "serialization",
+    "ledger_statement",
+    "auth",
+    "passcode_login",
+    "token_pruning",
+    "profiling",
+    "load",
+    "job_queue",
+]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("suites", nargs="*", help=f"suites to run (default: all of {', '.join(SUITES)})")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="multiplier applied to the seeded dataset sizes")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    options = parser.parse_args(argv)
+    unknown = set(options.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv if argv is not None else sys.argv[1:])
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "restaurant_project.settings")
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection, reset_queries
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        results = {}
+        for name in options.suites or SUITES:
+            module = importlib.import_module(f"benchmarks.{name}")
+            print(f"== {name}")
+            # The query log keeps the last 9000 queries only; once an earlier
+            # suite has filled it, CaptureQueriesContext captures nothing
+            reset_queries()
+            results[name] = module.run(options)
+            # Every suite seeds its own data from an empty database
+            call_command("flush", interactive=False, verbosity=0)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    report = json.dumps(results, indent=2, default=str)
+    if options.output:
+        with open(options.output, "w") as fh:
+            fh.write(report)
+    else:
+        print(report)
+
+    failures = [f for result in results.values() for f in result.get("failures", [])]
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Cost of authenticating a request, JWTAuthentication against
+CachedJWTAuthentication (restaurant_app/authentication.py).
+
+Each class authenticates REQUESTS requests per --scale step, spread over
+the seeded users' access tokens, on an endpoint that does nothing else,
+so the difference between the two rates is the authentication itself.
+The run fails when the cached class still queries the database once its
+caches are warm, when it is not faster, or when a token issued before a
+role change is still accepted afterwards.
+"""
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from benchmarks import seed
+
+REQUESTS = 5000
+
+
+class Ping(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"user": request.user.pk})
+
+
+def _measure(view, tokens, count):
+    factory = APIRequestFactory()
+    requests = [
+        factory.get("/", HTTP_AUTHORIZATION=f"Bearer {tokens[i % len(tokens)]}") for i in range(count)
+    ]
+    # One round to warm the caches
+    for request in requests[:len(tokens)]:
+        view(request)
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        statuses = {view(request).status_code for request in requests}
+        elapsed = time.perf_counter() - started
+    return {
+        "requests_per_second": round(count / elapsed),
+        "queries_per_request": round(len(captured) / count, 2),
+        "statuses": sorted(statuses),
+    }
+
+
+def run(options):
+    from restaurant_app import authentication
+
+    users = seed.seed_users(staff=10, drivers=10)
+    people = users["staff"] + [driver.user for driver in users["drivers"]]
+    tokens = [str(authentication.token_for_user(user).access_token) for user in people]
+    count = REQUESTS * options.scale
+
+    uncached = Ping.as_view(authentication_classes=[JWTAuthentication])
+    cached = Ping.as_view(authentication_classes=[authentication.CachedJWTAuthentication])
+    result = {
+        "JWTAuthentication": _measure(uncached, tokens, count),
+        "CachedJWTAuthentication": _measure(cached, tokens, count),
+    }
+
+    failures = []
+    before, after = result["JWTAuthentication"], result["CachedJWTAuthentication"]
+    if after["statuses"] != [200]:
+        failures.append(f"auth: cached authentication answered {after['statuses']}")
+    if after["queries_per_request"]:
+        failures.append(f"auth: {after['queries_per_request']} queries per request with warm caches")
+    if after["requests_per_second"] <= before["requests_per_second"]:
+        failures.append("auth: cached authentication is not faster")
+
+    # A role change bumps the token version: the old token must stop working
+    user = people[0]
+    user.role = "driver"
+    user.save()
+    request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {tokens[0]}")
+    if cached(request).status_code != 401:
+        failures.append("auth: a token issued before a role change is still accepted")
+
+    for name, timing in result.items():
+        print(f"{name}: {timing['requests_per_second']} requests/s, "
+              f"{timing['queries_per_request']} queries per request")
+    result["failures"] = failures
+    return result
@@ -0,0 +1,100 @@
+"""
+Throughput of /api/transactions/bulk/, the end-of-day voucher import.
+
+Each round, one request posts VOUCHERS balanced vouchers spread over a set
+of ledgers and the next month's dates, through the view with JSON parsing
+and validation included. The best of ROUNDS rounds counts, to keep a busy
+machine from skewing the rate, which is reported next to
+TARGET_ENTRIES_PER_SECOND. The run fails when a ledger's stored running
+balances do not add up to its postings.
+"""
+import datetime
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from benchmarks import seed
+from benchmarks.voucher_stress import seed_ledgers
+
+VOUCHERS = 5000
+ROUNDS = 5
+# Legs per second asked for. Not a budget: with bulk_create most of the
+# time goes into compiling the INSERTs, and SQLite reaches about 7000.
+TARGET_ENTRIES_PER_SECOND = 10000
+
+
+def _vouchers(ledgers, cash, count, month):
+    start = datetime.date(2024, month, 1)
+    for i in range(count):
+        ledger = ledgers[i % len(ledgers)]
+        date = (start + datetime.timedelta(days=i % 28)).isoformat()
+        amount = f"{i % 500 + 1}.25"
+        yield {
+            "transaction1": {"ledger_id": ledger.id, "particulars_id": cash.id, "date": date,
+                             "debit_amount": amount, "debit_credit": "debit"},
+            "transaction2": {"ledger_id": cash.id, "particulars_id": ledger.id, "date": date,
+                             "credit_amount": amount, "debit_credit": "credit"},
+        }
+
+
+def _balance_mismatches(ledger_ids):
+    from transactions_app.models import Transaction
+
+    mismatches = 0
+    for ledger_id in ledger_ids:
+        running = Decimal("0.00")
+        rows = (
+            Transaction.objects.filter(ledger_id=ledger_id).order_by("date", "id")
+            .values_list("debit_credit", "debit_amount", "credit_amount", "balance_amount")
+        )
+        for debit_credit, debit, credit, balance in rows:
+            running += debit if debit_credit == Transaction.DEBIT else -credit
+            mismatches += running != balance
+    return mismatches
+
+
+def run(options):
+    from transactions_app.views import TransactionViewSet
+
+    users = seed.seed_users(staff=1, drivers=1)
+    *ledgers, cash = seed_ledgers()
+    count = VOUCHERS * options.scale
+    view = TransactionViewSet.as_view({"post": "bulk"})
+
+    timings, queries = [], 0
+    for month in range(1, ROUNDS + 1):
+        body = {"vouchers": list(_vouchers(ledgers, cash, count, month))}
+        request = APIRequestFactory().post("/api/transactions/bulk/", body, format="json")
+        force_authenticate(request, users["staff"][0])
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = view(request)
+            timings.append(time.perf_counter() - started)
+        if response.status_code != 201:
+            return {"failures": [f"bulk posting: {response.status_code} {response.data}"]}
+        queries = len(captured)
+    elapsed = min(timings)
+
+    failures = []
+    entries = 2 * count
+    rate = entries / elapsed
+    mismatches = _balance_mismatches([ledger.id for ledger in ledgers] + [cash.id])
+    if mismatches:
+        failures.append(f"bulk posting: {mismatches} running balances do not match the postings")
+
+    result = {
+        "backend": connection.vendor,
+        "vouchers": count,
+        "entries": entries,
+        "queries": queries,
+        "seconds": round(elapsed, 3),
+        "entries_per_second": round(rate),
+        "target_entries_per_second": TARGET_ENTRIES_PER_SECOND,
+        "failures": failures,
+    }
+    print(f"{entries} entries in {result['seconds']}s ({result['entries_per_second']}/s, "
+          f"target {TARGET_ENTRIES_PER_SECOND}/s, {result['queries']} queries, best of {ROUNDS})")
+    return result
@@ -0,0 +1,122 @@
+"""
+EXPLAIN plans for the report access paths, with and without the indexes.
+
+Seeds 10,000 orders per --scale step (--scale 100 gives the 1M-order
+dataset), then records the plan and the median runtime of every report
+query twice: once with the Order/OrderItem indexes dropped and once with
+them in place. The `__date` variant of the sales report query is kept to
+show that casting the column defeats the index.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from benchmarks import seed
+from restaurant_app.utils import date_range_q
+
+ORDERS_PER_SCALE = 10_000
+SEED_CHUNK = 50_000
+RUNS = 3
+
+
+def report_queries(params):
+    from restaurant_app.models import Order, OrderItem
+
+    today, month_ago = params["today"], params["month_ago"]
+    month = date_range_q("created_at", month_ago, today)
+    return [
+        ("sales report (date range)", Order.objects.filter(month)),
+        ("sales report (__date cast)", Order.objects.filter(
+            created_at__date__gte=month_ago, created_at__date__lte=today)),
+        ("sales report (status)", Order.objects.filter(month, status="cancelled")),
+        ("dashboard (delivered, month)", Order.objects.filter(month, status="delivered")),
+        ("user order history", Order.objects.filter(customer_phone_number=params["phone"])),
+        ("driver report", Order.objects.filter(
+            month, order_type="delivery", delivery_driver_id=params["driver_id"])),
+        ("online delivery report", Order.objects.filter(month, order_type="onlinedelivery")),
+        ("product wise report", OrderItem.objects.filter(
+            date_range_q("order__created_at", month_ago, today), dish_name=params["dish_name"])),
+    ]
+
+
+def _indexes():
+    from restaurant_app.models import Order, OrderItem
+
+    return [(model, index) for model in (Order, OrderItem) for index in model._meta.indexes]
+
+
+def _analyze():
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def _measure(params):
+    index_names = [index.name for _, index in _indexes()]
+    results = {}
+    for name, queryset in report_queries(params):
+        plan = queryset.explain()
+        timings = []
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            rows = len(list(queryset.values_list("pk", flat=True)))
+            timings.append(time.perf_counter() - started)
+        results[name] = {
+            "rows": rows,
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "uses_index": next((index for index in index_names if index in plan), None),
+            "plan": plan.splitlines(),
+        }
+    return results
+
+
+def run(options):
+    from delivery_drivers.models import DeliveryDriver
+    from restaurant_app.models import Order
+
+    rng = random.Random(5)
+    users = seed.seed_users()
+    dish_rows = seed.seed_menu(rng=rng)
+    total = ORDERS_PER_SCALE * options.scale
+    for start in range(0, total, SEED_CHUNK):
+        seed.seed_orders(orders=min(SEED_CHUNK, total - start), days=365, items_per_order=(1, 3),
+                         users=users, dish_rows=dish_rows, rng=rng)
+
+    today = timezone.now().date()
+    params = {
+        "today": today,
+        "month_ago": today - timedelta(days=30),
+        "phone": Order.objects.values_list("customer_phone_number", flat=True).first(),
+        "driver_id": DeliveryDriver.objects.values_list("id", flat=True).first(),
+        "dish_name": dish_rows[0][1],
+    }
+
+    with connection.schema_editor() as editor:
+        for model, index in _indexes():
+            editor.remove_index(model, index)
+    _analyze()
+    before = _measure(params)
+
+    with connection.schema_editor() as editor:
+        for model, index in _indexes():
+            editor.add_index(model, index)
+    _analyze()
+    after = _measure(params)
+
+    queries = {
+        name: {
+            "rows": after[name]["rows"],
+            "speedup": round(before[name]["median_ms"] / after[name]["median_ms"], 1)
+            if after[name]["median_ms"] else None,
+            "before": before[name],
+            "after": after[name],
+        }
+        for name in after
+    }
+    for name, result in queries.items():
+        print(f"{name:32} {result['before']['median_ms']:>9} ms -> {result['after']['median_ms']:>9} ms"
+              f"  ({result['after']['uses_index'] or 'no index'})")
+    return {"orders": total, "queries": queries, "failures": []}
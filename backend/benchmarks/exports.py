@@ -0,0 +1,89 @@
+"""
+Peak memory of the streaming report exports.
+
+Seeds 10,000 orders per --scale step and downloads the sales report and
+the product wise report in every export format, once over a quarter of
+the orders and once over all of them, measuring the peak Python
+allocation with tracemalloc. Both spans cover several iterator chunks. A
+streamed export must not grow with the row count: the run fails when the
+full download peaks at more than GROWTH_LIMIT times the quarter (plus
+SLACK_BYTES for allocator noise). The JSON response over the quarter is
+measured for comparison only; over all rows it takes minutes under
+tracemalloc.
+"""
+import tracemalloc
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks import seed
+
+ORDERS_PER_SCALE = 10_000
+DAYS = 100
+GROWTH_LIMIT = 1.5
+SLACK_BYTES = 1024 * 1024
+
+REPORTS = [
+    ("sales report", "/api/orders/sales_report/"),
+    ("product wise report", "/api/orders/product_wise_report/"),
+]
+FORMATS = ["csv", "ndjson", "xlsx"]
+
+
+def _download(client, url):
+    """Return (status, bytes received, peak bytes allocated)."""
+    tracemalloc.start()
+    try:
+        response = client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return response.status_code, size, peak
+
+
+def run(options):
+    orders = ORDERS_PER_SCALE * options.scale
+    users = seed.seed_users(staff=2, drivers=2)
+    seed.seed_orders(orders=orders, days=DAYS, items_per_order=(1, 3), users=users)
+
+    client = APIClient()
+    client.force_authenticate(users["staff"][0])
+
+    today = timezone.now().date()
+    ranges = {
+        "quarter": (today - timedelta(days=DAYS // 4 - 1), today),
+        "full": (today - timedelta(days=DAYS), today),
+    }
+
+    results, failures = {"orders": orders}, []
+    for name, path in REPORTS:
+        from_date, to_date = ranges["quarter"]
+        url = f"{path}?from_date={from_date}&to_date={to_date}"
+        _, received, peak = _download(client, url)
+        results[name] = {"json (quarter)": {"bytes": received, "peak_kb": round(peak / 1024)}}
+        print(f"{name} json: peak {round(peak / 1024)} KB for a quarter")
+        for export_format in FORMATS:
+            measured = {}
+            for size, (from_date, to_date) in ranges.items():
+                url = f"{path}?from_date={from_date}&to_date={to_date}&format={export_format}"
+                status, received, peak = _download(client, url)
+                if status != 200:
+                    failures.append(f"{name}: {url} returned {status}")
+                measured[size] = {"bytes": received, "peak_kb": round(peak / 1024)}
+            results[name][export_format] = measured
+
+            quarter, full = measured["quarter"]["peak_kb"] * 1024, measured["full"]["peak_kb"] * 1024
+            print(f"{name} {export_format}: peak {measured['quarter']['peak_kb']} KB for a quarter, "
+                  f"{measured['full']['peak_kb']} KB for all rows")
+            if full > quarter * GROWTH_LIMIT + SLACK_BYTES:
+                failures.append(
+                    f"{name} {export_format}: peak memory grew from {quarter // 1024} KB "
+                    f"to {full // 1024} KB with the row count"
+                )
+    results["failures"] = failures
+    return results
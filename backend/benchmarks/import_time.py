@@ -0,0 +1,69 @@
+"""
+Cold start budget: how long `django.setup()` takes to import the app
+registry, measured with `python -X importtime` in a fresh interpreter.
+
+Fails when the median import time exceeds IMPORT_BUDGET_MS, or when one
+of the LAZY_MODULES is imported at startup. Those are only needed to
+render PDFs or send messages, and must stay behind the modules that use
+them.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+IMPORT_BUDGET_MS = 1000
+LAZY_MODULES = ("reportlab", "twilio")
+TOP_MODULES = 10
+
+SETUP = (
+    "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings'); "
+    "import django; django.setup()"
+)
+
+
+def _measure():
+    """Return ({module: (self_us, cumulative_us)}, total_ms) for one cold start."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SETUP],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules, sum(self_us for self_us, _ in modules.values()) / 1000
+
+
+def run(options):
+    runs = [_measure() for _ in range(RUNS)]
+    median_ms = statistics.median(total for _, total in runs)
+    modules = runs[-1][0]
+
+    failures = []
+    if median_ms > IMPORT_BUDGET_MS:
+        failures.append(f"import time: {median_ms:.0f} ms, budget is {IMPORT_BUDGET_MS} ms")
+    eager = sorted({name.split(".")[0] for name in modules} & set(LAZY_MODULES))
+    if eager:
+        failures.append(f"import time: {', '.join(eager)} imported at startup")
+
+    # Heaviest top-level packages by cumulative time
+    packages = {}
+    for name, (_, cumulative_us) in modules.items():
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), cumulative_us)
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:TOP_MODULES]
+
+    print(f"django.setup() imports: median {median_ms:.0f} ms over {RUNS} runs")
+    return {
+        "median_ms": round(median_ms, 1),
+        "runs_ms": [round(total, 1) for _, total in runs],
+        "budget_ms": IMPORT_BUDGET_MS,
+        "modules": len(modules),
+        "heaviest_ms": {package: round(us / 1000, 1) for package, us in heaviest},
+        "failures": failures,
+    }
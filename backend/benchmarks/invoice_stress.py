@@ -0,0 +1,100 @@
+"""
+Stress test for the invoice number allocator.
+
+Several threads create orders at the same time, like terminals at the
+till during peak. The run fails unless every order got a distinct invoice
+number and the numbers form a gap-free range. SQLite allows a single
+writer, so the threads there retry on "locked" errors; the retries are
+reported next to the throughput. The run also fails when an order ends
+up with neither its notification nor a queued retry of it (see
+order_effects.py).
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from benchmarks import seed
+
+THREADS = 8
+ORDERS_PER_THREAD = 50
+MAX_RETRIES = 200
+
+
+def _create_orders(user, count, stats, lock):
+    from restaurant_app.models import Order
+
+    created = retries = 0
+    try:
+        while created < count:
+            try:
+                with transaction.atomic():
+                    Order.objects.create(user=user, total_amount=Decimal("10.00"))
+                created += 1
+            except OperationalError:
+                retries += 1
+                if retries > MAX_RETRIES * count:
+                    raise
+                time.sleep(0.001)
+    finally:
+        with lock:
+            stats["created"] += created
+            stats["retries"] += retries
+        close_old_connections()
+
+
+def run(options):
+    from restaurant_app.models import Job, Notification, Order
+
+    users = seed.seed_users(staff=THREADS, drivers=1)
+    # Start from existing orders so the counter has to continue a numbering
+    seed.seed_orders(orders=100, users=users)
+    first = Order.objects.count() + 1
+
+    per_thread = ORDERS_PER_THREAD * options.scale
+    stats, lock = {"created": 0, "retries": 0}, threading.Lock()
+    threads = [
+        threading.Thread(target=_create_orders, args=(user, per_thread, stats, lock))
+        for user in users["staff"]
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected = THREADS * per_thread
+    numbers = [
+        int(number)
+        for number in Order.objects.order_by().values_list("invoice_number", flat=True)
+    ]
+    new_numbers = sorted(number for number in numbers if number >= first)
+
+    failures = []
+    if stats["created"] != expected:
+        failures.append(f"invoice stress: created {stats['created']} of {expected} orders")
+    if len(numbers) != len(set(numbers)):
+        failures.append(f"invoice stress: {len(numbers) - len(set(numbers))} duplicate invoice numbers")
+    if new_numbers != list(range(first, first + stats["created"])):
+        failures.append("invoice stress: invoice numbers are not a gap-free range")
+    notified = Notification.objects.count()
+    requeued = Job.objects.filter(name="run_order_effects").count()
+    # The seeded orders were bulk created, without notifications
+    if notified + requeued < stats["created"]:
+        failures.append(f"invoice stress: {stats['created'] - notified - requeued} order notifications lost")
+
+    result = {
+        "backend": connection.vendor,
+        "threads": THREADS,
+        "orders": stats["created"],
+        "retries": stats["retries"],
+        "seconds": round(elapsed, 3),
+        "orders_per_second": round(stats["created"] / elapsed, 1) if elapsed else None,
+        "requeued_effects": requeued,
+        "failures": failures,
+    }
+    print(f"{result['orders']} orders from {THREADS} threads in {result['seconds']}s "
+          f"({result['orders_per_second']}/s, {result['retries']} retries)")
+    return result
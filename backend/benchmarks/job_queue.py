@@ -0,0 +1,162 @@
+"""
+The background job queue (restaurant_app/jobs.py) sending SMS through
+LocmemBackend.
+
+Queues MESSAGES send_sms jobs per --scale step. Every FLAKY_EVERY-th
+number fails its first send and every DEAD_EVERY-th fails them all; each
+send takes SEND_MS, like a provider's API call. WORKERS workers with
+CONCURRENCY threads each then drain the queue, retries due at once, the
+"sms" queue limited to QUEUE_LIMIT jobs at a time. Two jobs left
+"running" by a dead worker are added: one on its last attempt, one not.
+
+The run fails when a message is not delivered exactly once, a dead number
+is not marked failed after max_attempts, more than QUEUE_LIMIT sends run
+at the same time, or a stale job is not failed or retried as it should.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.db import OperationalError, close_old_connections
+from django.test import override_settings
+from django.utils import timezone
+
+from restaurant_app.sms import LocmemBackend
+
+MESSAGES = 200
+FLAKY_EVERY = 10
+DEAD_EVERY = 25
+SEND_MS = 5
+WORKERS = 3
+CONCURRENCY = 2
+QUEUE_LIMIT = 2
+MAX_ATTEMPTS = 3
+MAX_RETRIES = 100
+
+
+class BenchmarkBackend(LocmemBackend):
+    """LocmemBackend with a send latency and numbers that fail."""
+    attempts = {}
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def send(self, to_number, message):
+        cls = type(self)
+        number = int(to_number)
+        with cls.lock:
+            cls.attempts[number] = cls.attempts.get(number, 0) + 1
+            attempt = cls.attempts[number]
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(SEND_MS / 1000)
+            if number % DEAD_EVERY == 0 or (number % FLAKY_EVERY == 0 and attempt == 1):
+                raise ConnectionError(f"provider refused {to_number}")
+            super().send(to_number, message)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+def _worker(index, errors):
+    from restaurant_app import jobs
+
+    retries = 0
+    try:
+        # A worker exits once nothing is due; another worker's jobs may
+        # still be running, so keep polling until the queue is empty
+        while True:
+            try:
+                if not _remaining():
+                    break
+            except OperationalError as exc:
+                # The in-memory SQLite test database fails a read that
+                # collides with a write instead of waiting
+                retries += 1
+                if retries > MAX_RETRIES:
+                    errors.append(repr(exc))
+                    break
+                time.sleep(0.01)
+                continue
+            jobs.work(concurrency=CONCURRENCY, poll_interval=0.01, once=True, worker_id=f"bench-{index}")
+    finally:
+        close_old_connections()
+
+
+def _remaining():
+    from restaurant_app.models import Job
+
+    return Job.objects.filter(status__in=("pending", "running")).exists()
+
+
+def _stale_jobs():
+    from restaurant_app.models import Job
+
+    locked_at = timezone.now() - timedelta(hours=1)
+    return [
+        Job.objects.create(name="send_sms", queue="sms", payload={"to_number": "9000001", "message": "stale"},
+                           status="running", attempts=attempts, max_attempts=MAX_ATTEMPTS,
+                           locked_by="dead-worker", locked_at=locked_at)
+        for attempts in (MAX_ATTEMPTS, 1)
+    ]
+
+
+def run(options):
+    from restaurant_app import jobs
+    from restaurant_app.models import Job
+
+    count = MESSAGES * options.scale
+    LocmemBackend.outbox.clear()
+    BenchmarkBackend.attempts.clear()
+    BenchmarkBackend.max_in_flight = 0
+
+    with override_settings(SMS_BACKEND="benchmarks.job_queue.BenchmarkBackend", JOB_MAX_ATTEMPTS=MAX_ATTEMPTS,
+                           JOB_RETRY_BACKOFF=0, JOB_QUEUE_LIMITS={"sms": QUEUE_LIMIT}, JOB_SCHEDULE={},
+                           JOB_TRANSPORT="restaurant_app.jobs.DatabaseTransport"):
+        for number in range(1, count + 1):
+            jobs.enqueue("send_sms", to_number=str(number), message=f"Order {number} is on its way")
+        last_attempt, retried = _stale_jobs()
+
+        errors = []
+        threads = [threading.Thread(target=_worker, args=(index, errors)) for index in range(WORKERS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    delivered = [int(sent["to"]) for sent in LocmemBackend.outbox if sent["message"] != "stale"]
+    dead = {number for number in range(1, count + 1) if number % DEAD_EVERY == 0}
+    expected = set(range(1, count + 1)) - dead
+    statuses = dict(Job.objects.filter(pk__in=[last_attempt.pk, retried.pk]).values_list("pk", "status"))
+    failed = Job.objects.filter(status="failed", payload__message__startswith="Order")
+    flaky_done = Job.objects.filter(status="done", attempts=2).count()
+
+    failures = [f"job queue: worker error {error}" for error in errors]
+    if sorted(delivered) != sorted(expected):
+        failures.append(f"job queue: {len(delivered)} messages delivered ({len(set(delivered))} distinct), "
+                        f"expected {len(expected)}")
+    if failed.count() != len(dead) or failed.exclude(attempts=MAX_ATTEMPTS).exists():
+        failures.append(f"job queue: {failed.count()} jobs failed, expected {len(dead)} after {MAX_ATTEMPTS} attempts")
+    if BenchmarkBackend.max_in_flight > QUEUE_LIMIT:
+        failures.append(f"job queue: {BenchmarkBackend.max_in_flight} sends at once, the limit is {QUEUE_LIMIT}")
+    if statuses != {last_attempt.pk: "failed", retried.pk: "done"}:
+        failures.append(f"job queue: stale jobs ended {statuses}, expected failed on the last attempt, else done")
+
+    jobs_run = sum(BenchmarkBackend.attempts.values())
+    result = {
+        "messages": count,
+        "delivered": len(delivered),
+        "failed": failed.count(),
+        "retried_and_delivered": flaky_done,
+        "send_attempts": jobs_run,
+        "max_sends_at_once": BenchmarkBackend.max_in_flight,
+        "seconds": round(elapsed, 2),
+        "jobs_per_second": round(jobs_run / elapsed, 1),
+        "failures": failures,
+    }
+    print(f"{jobs_run} sends for {count} messages in {result['seconds']}s ({result['jobs_per_second']}/s), "
+          f"{result['delivered']} delivered, {result['failed']} failed, at most {result['max_sends_at_once']} at once")
+    return result
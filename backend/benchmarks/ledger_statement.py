@@ -0,0 +1,112 @@
+"""
+Ledger statement paging on a long ledger.
+
+Seeds one ledger with LINES transactions per --scale step, then reads its
+statement through /api/transactions/ledger-statement/ from the middle of
+its history to the end, following the cursor page by page. Keyset pages
+cost the same at the end as at the start: the run fails when a page
+takes more than PAGE_QUERIES queries, when the slowest page exceeds
+PAGE_BUDGET_MS, or when the lines do not carry on from the opening
+balance to the closing balance.
+"""
+import datetime
+import statistics
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from benchmarks import seed
+from benchmarks.voucher_stress import seed_ledgers
+
+LINES = 100_000
+PER_DAY = 50
+PAGE_SIZE = 500
+PAGE_QUERIES = 4
+PAGE_BUDGET_MS = 100
+
+
+def seed_ledger_lines(ledger, other, count):
+    from transactions_app import balances
+    from transactions_app.models import Transaction
+
+    start = datetime.date(2020, 1, 1)
+    Transaction.objects.bulk_create(
+        (
+            Transaction(
+                ledger=ledger,
+                particulars=other,
+                date=start + datetime.timedelta(days=i // PER_DAY),
+                debit_credit=Transaction.DEBIT if i % 3 else Transaction.CREDIT,
+                debit_amount=Decimal(i % 97 + 1) if i % 3 else 0,
+                credit_amount=0 if i % 3 else Decimal(i % 89 + 1),
+                voucher_no=i + 1,
+            )
+            for i in range(count)
+        ),
+        batch_size=5000,
+    )
+    balances.recompute(ledger.id)
+    return start + datetime.timedelta(days=(count - 1) // PER_DAY)
+
+
+def run(options):
+    from transactions_app.views import TransactionViewSet
+
+    users = seed.seed_users(staff=1, drivers=1)
+    ledger, other, *_ = seed_ledgers()
+    count = LINES * options.scale
+    last_date = seed_ledger_lines(ledger, other, count)
+    from_date = datetime.date(2020, 1, 1) + (last_date - datetime.date(2020, 1, 1)) / 2
+
+    view = TransactionViewSet.as_view({"get": "ledger_statement"})
+    factory = APIRequestFactory()
+    url = (f"/api/transactions/ledger-statement/?ledger={ledger.id}"
+           f"&from_date={from_date.isoformat()}&page_size={PAGE_SIZE}")
+    timings, queries, lines, first = [], [], [], None
+    while url:
+        request = factory.get(url)
+        force_authenticate(request, users["staff"][0])
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        data = response.data
+        first = first or data
+        lines.extend(data["results"])
+        url = data["next"]
+
+    failures = []
+    balance = Decimal(first["opening_balance"])
+    broken = 0
+    for line in lines:
+        if line["debit_credit"] == "debit":
+            balance += Decimal(line["debit_amount"])
+        else:
+            balance -= Decimal(line["credit_amount"])
+        broken += balance != Decimal(line["balance"])
+    if broken or balance != Decimal(first["closing_balance"]):
+        failures.append(f"ledger statement: {broken} lines do not follow from the opening balance")
+    if max(queries) > PAGE_QUERIES:
+        failures.append(f"ledger statement: {max(queries)} queries on a page, budget is {PAGE_QUERIES}")
+    if max(timings) > PAGE_BUDGET_MS:
+        failures.append(f"ledger statement: slowest page {max(timings):.1f} ms, budget is {PAGE_BUDGET_MS} ms")
+
+    tenth = max(len(timings) // 10, 1)
+    result = {
+        "ledger_lines": count,
+        "statement_lines": len(lines),
+        "pages": len(timings),
+        "first_pages_ms": round(statistics.mean(timings[:tenth]), 2),
+        "last_pages_ms": round(statistics.mean(timings[-tenth:]), 2),
+        "max_page_ms": round(max(timings), 2),
+        "queries_per_page": max(queries),
+        "failures": failures,
+    }
+    print(f"{len(lines)} of {count} lines in {len(timings)} pages: first pages {result['first_pages_ms']} ms, "
+          f"last pages {result['last_pages_ms']} ms, slowest {result['max_page_ms']} ms")
+    return result
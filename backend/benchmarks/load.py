@@ -0,0 +1,241 @@
+"""
+Load test of the POS hot paths on a restaurant-sized dataset.
+
+Seeds DISHES dishes, ORDERS orders (with their items and delivery orders)
+and TRANSACTIONS ledger lines per --scale step, then drives each scenario
+through the Django test client, with the whole middleware and JWT
+authentication stack: first SEQUENTIAL requests one after another, then
+THREADS terminals at once, REQUESTS_PER_THREAD requests each, all threads
+released together. Every scenario reports its throughput and latency
+percentiles; `--output` keeps them in a JSON file to compare runs against
+each other.
+
+The runner's test database follows DATABASES, so DB_ENGINE and friends
+point the run at a local PostgreSQL. On the in-memory SQLite test
+database a write that collides with another fails at once ("table is
+locked") instead of waiting, so there the writing scenarios take turns,
+as they would waiting out the lock of a file database; the wait counts
+in their latency. A request that still fails with a database error is
+retried after a short pause and reported as a retry. The run fails when
+a request ends with another status than its scenario expects.
+"""
+import functools
+import io
+import random
+import statistics
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks import seed
+
+DISHES = 10_000
+ORDERS = 20_000
+TRANSACTIONS = 20_000
+THREADS = 8
+SEQUENTIAL = 20
+REQUESTS_PER_THREAD = 10
+# Requests per scenario before the timings start, excluded from them
+WARMUP = 3
+ORDER_LINES = (1, 6)
+MAX_RETRIES = 100
+PERCENTILES = (50, 90, 95, 99)
+
+# path and body are called with the worker number and the request index
+Scenario = namedtuple("Scenario", "name method path body authenticated writes status")
+
+_write_lock = threading.Lock()
+
+
+def _scenarios(context):
+    today = timezone.now().date()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    week_ago = (today - timedelta(days=7)).isoformat()
+    ledger_ids, dish_names, passcodes = context["ledger_ids"], context["dish_names"], context["passcodes"]
+
+    def order_body(worker, i):
+        rng = random.Random(worker * 100_000 + i)
+        return {
+            "items": [
+                {"dish_name": rng.choice(dish_names), "price": "12.50", "quantity": rng.randint(1, 3)}
+                for _ in range(rng.randint(*ORDER_LINES))
+            ],
+            "total_amount": "0",
+            "order_type": "dining",
+            "customer_name": f"Customer {worker}",
+            "customer_phone_number": f"5{worker:07d}",
+        }
+
+    return [
+        Scenario("create order", "post", lambda worker, i: "/api/orders/", order_body, True, True, 201),
+        Scenario("orders list", "get", lambda worker, i: f"/api/orders/?page={i % 20 + 1}",
+                 None, True, False, 200),
+        Scenario("dashboard", "get", lambda worker, i: "/api/orders/dashboard_data/?time_range=month",
+                 None, True, False, 200),
+        Scenario("sales report", "get",
+                 lambda worker, i: f"/api/orders/sales_report/?from_date={yesterday}&to_date={yesterday}",
+                 None, True, False, 200),
+        Scenario("ledger report", "get",
+                 lambda worker, i: (f"/api/transactions/ledger_report/"
+                                    f"?ledger={ledger_ids[(worker + i) % len(ledger_ids)]}"
+                                    f"&from_date={week_ago}&to_date={today.isoformat()}"),
+                 None, True, False, 200),
+        # Token rows are queued and written in batches, see authentication.py
+        Scenario("passcode login", "post", lambda worker, i: "/api/login-passcode/",
+                 lambda worker, i: {"passcode": passcodes[(worker + i) % len(passcodes)]}, False, False, 200),
+    ]
+
+
+def _client(token=None):
+    client = APIClient()
+    if token:
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _send(client, scenario, worker, i):
+    """Status of one request of `scenario` and the retries it took."""
+    path = scenario.path(worker, i)
+    if scenario.body is None:
+        send = functools.partial(getattr(client, scenario.method), path)
+    else:
+        send = functools.partial(getattr(client, scenario.method), path, scenario.body(worker, i), format="json")
+    retries = 0
+    while True:
+        try:
+            if scenario.writes and connection.vendor == "sqlite":
+                with _write_lock:
+                    return send().status_code, retries
+            return send().status_code, retries
+        except OperationalError:
+            retries += 1
+            if retries > MAX_RETRIES:
+                raise
+            time.sleep(random.uniform(0.005, 0.03))
+
+
+def _stats(latencies, elapsed, retries, errors):
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    result = {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+    }
+    for percent in PERCENTILES:
+        result[f"p{percent}_ms"] = round(cuts[percent - 1], 2)
+    result["max_ms"] = round(max(latencies), 2)
+    result["retries"] = retries
+    result["errors"] = len(errors)
+    result["error_kinds"] = sorted(set(errors))
+    return result
+
+
+def _sequential(client, scenario, count):
+    for i in range(WARMUP):
+        _send(client, scenario, 0, count + i)
+    latencies, errors, retries = [], [], 0
+    started = time.perf_counter()
+    for i in range(count):
+        request_started = time.perf_counter()
+        try:
+            status, request_retries = _send(client, scenario, 0, i)
+        except Exception as exc:
+            status, request_retries = repr(exc), MAX_RETRIES
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        retries += request_retries
+        if status != scenario.status:
+            errors.append(str(status))
+    return _stats(latencies, time.perf_counter() - started, retries, errors)
+
+
+def _concurrent(clients, scenario, count):
+    barrier = threading.Barrier(len(clients))
+    latencies, errors, lock = [], [], threading.Lock()
+    totals = {"retries": 0}
+
+    def terminal(worker, client):
+        try:
+            barrier.wait()
+            for i in range(count):
+                started = time.perf_counter()
+                try:
+                    status, retries = _send(client, scenario, worker, i)
+                except Exception as exc:
+                    status, retries = repr(exc), MAX_RETRIES
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    totals["retries"] += retries
+                    if status != scenario.status:
+                        errors.append(str(status))
+        finally:
+            close_old_connections()
+
+    threads = [
+        threading.Thread(target=terminal, args=(worker + 1, client))
+        for worker, client in enumerate(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _stats(latencies, time.perf_counter() - started, totals["retries"], errors)
+
+
+def run(options):
+    from restaurant_app import authentication
+    from restaurant_app.models import Dish
+    from transactions_app.models import Ledger
+
+    started = time.perf_counter()
+    users, dataset = seed.seed_dataset(
+        dishes=DISHES * options.scale, orders=ORDERS * options.scale, transactions=TRANSACTIONS * options.scale,
+    )
+    # Seeded with bulk_create, so the passcodes are still plaintext
+    call_command("hash_passcodes", stdout=io.StringIO())
+    seconds_to_seed = round(time.perf_counter() - started, 1)
+    print(f"seeded {dataset} in {seconds_to_seed}s")
+
+    staff = users["staff"]
+    context = {
+        "ledger_ids": list(Ledger.objects.values_list("id", flat=True)),
+        "dish_names": list(Dish.objects.values_list("name", flat=True)[:500]),
+        "passcodes": [user.passcode for user in staff] + [driver.user.passcode for driver in users["drivers"]],
+    }
+    tokens = [str(authentication.token_for_user(staff[i % len(staff)]).access_token) for i in range(THREADS + 1)]
+    # Written now rather than by the flush timer in the middle of a scenario
+    authentication.flush_outstanding()
+    cache.clear()
+
+    scenarios, failures = {}, []
+    for scenario in _scenarios(context):
+        clients = [_client(token if scenario.authenticated else None) for token in tokens]
+        result = {
+            "sequential": _sequential(clients[0], scenario, SEQUENTIAL),
+            "concurrent": _concurrent(clients[1:], scenario, REQUESTS_PER_THREAD),
+        }
+        scenarios[scenario.name] = result
+        for mode, stats in result.items():
+            if stats["errors"]:
+                failures.append(f"load: {scenario.name} ({mode}): {stats['errors']} of {stats['requests']} "
+                                f"requests failed: {', '.join(stats['error_kinds'])[:200]}")
+            print(f"{scenario.name} ({mode}): {stats['requests_per_second']}/s, p50 {stats['p50_ms']} ms, "
+                  f"p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms, {stats['retries']} retries, "
+                  f"{stats['errors']} errors")
+    # Before the runner flushes the database under the pending rows
+    authentication.flush_outstanding(retry=False)
+
+    return {
+        "dataset": dataset,
+        "seconds_to_seed": seconds_to_seed,
+        "threads": THREADS,
+        "scenarios": scenarios,
+        "failures": failures,
+    }
@@ -0,0 +1,101 @@
+"""
+Deep page latency: page number pagination against the keyset cursor.
+
+Seeds 10,000 orders and notifications per --scale step and fetches page
+DEEP_PAGE of each listing twice: with `?page=` (COUNT(*) plus a growing
+OFFSET) and with `?pagination=cursor`, starting from the cursor of the
+row just before that page. The run fails if the two modes return
+different rows, or if the cursor request still counts the table.
+"""
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from benchmarks import seed
+from restaurant_app.pagination import KeysetPagination
+
+ROWS_PER_SCALE = 10_000
+DEEP_PAGE = 1000
+RUNS = 5
+
+
+def seed_notifications(count, user):
+    from restaurant_app.models import Notification
+
+    # created_at is auto_now_add, so bursts of rows share timestamps and
+    # the cursor has to break the ties on id
+    Notification.objects.bulk_create(
+        (Notification(user=user, message=f"Order {i} placed") for i in range(count)),
+        batch_size=seed.BATCH_SIZE,
+    )
+
+
+def _timed_get(client, url):
+    timings = []
+    for _ in range(RUNS):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+    return response, ctx.captured_queries, statistics.median(timings)
+
+
+def compare(client, name, path, view, page_size):
+    paginator = KeysetPagination()
+    paginator.ordering = paginator.get_ordering(view.queryset, view)
+    offset = (DEEP_PAGE - 1) * page_size
+    before = view.queryset.order_by(*paginator.ordering)[offset - 1]
+    cursor = paginator.encode_cursor(paginator.position_of(before), reverse=False)
+
+    urls = {
+        "page": f"{path}?page={DEEP_PAGE}",
+        "cursor": f"{path}?pagination=cursor&cursor={cursor}",
+    }
+    result, rows, failures = {}, {}, []
+    for mode, url in urls.items():
+        response, queries, median_ms = _timed_get(client, url)
+        if response.status_code != 200:
+            failures.append(f"{name}: {url} returned {response.status_code}")
+            continue
+        rows[mode] = [row["id"] for row in response.data["results"]]
+        result[mode] = {
+            "median_ms": round(median_ms, 2),
+            "queries": len(queries),
+            "counts_rows": any("COUNT(" in query["sql"].upper() for query in queries),
+        }
+
+    if len(rows) == 2 and rows["page"] != rows["cursor"]:
+        failures.append(f"{name}: page {DEEP_PAGE} and the cursor returned different rows")
+    if result.get("cursor", {}).get("counts_rows"):
+        failures.append(f"{name}: cursor pagination still runs COUNT(*)")
+    if len(result) == 2:
+        result["speedup"] = round(result["page"]["median_ms"] / result["cursor"]["median_ms"], 1)
+        print(f"{name} page {DEEP_PAGE}: {result['page']['median_ms']} ms with ?page=, "
+              f"{result['cursor']['median_ms']} ms with the cursor")
+    return result, failures
+
+
+def run(options):
+    from restaurant_app.views import NotificationViewSet, OrderViewSet
+
+    rows = ROWS_PER_SCALE * options.scale
+    page_size = KeysetPagination.page_size
+    users = seed.seed_users(staff=2, drivers=2)
+    seed.seed_orders(orders=rows, items_per_order=(1, 3), users=users)
+    seed_notifications(rows, users["staff"][0])
+
+    client = APIClient()
+    client.force_authenticate(users["staff"][0])
+
+    results, failures = {"rows": rows, "page_size": page_size}, []
+    for name, path, view in (
+        ("orders", "/api/orders/", OrderViewSet),
+        ("notifications", "/api/notifications/", NotificationViewSet),
+    ):
+        results[name], found = compare(client, name, path, view, page_size)
+        failures.extend(found)
+    results["failures"] = failures
+    return results
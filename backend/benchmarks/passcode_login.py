@@ -0,0 +1,143 @@
+"""
+Shift change: THREADS terminals logging in by passcode at the same time.
+
+Each thread logs one user in LOGINS_PER_THREAD times through
+/api/login-passcode/, all threads released together. The storm runs twice:
+once through the previous login (plaintext passcode lookup, serialized
+user and an OutstandingToken insert per login) and once through the
+current one, after `manage.py hash_passcodes`. Queries per login are
+counted separately on sequential logins. On the in-memory SQLite test
+database a write that collides with another fails at once ("table is
+locked") instead of waiting, so the previous login's errors there stand
+for the waits a file database would have. The run fails when a current
+login fails, takes more than QUERIES_PER_LOGIN queries on average, or
+when an issued refresh token has no OutstandingToken row after the queue
+is flushed.
+"""
+import io
+import statistics
+import threading
+import time
+
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import permissions, serializers
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from benchmarks import seed
+
+THREADS = 50
+LOGINS_PER_THREAD = 10
+SEQUENTIAL_LOGINS = 200
+QUERIES_PER_LOGIN = 1.5
+
+
+class PreviousPasscodeLoginView(APIView):
+    """The passcode login as it was before passcodes were hashed."""
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        from restaurant_app.models import User
+        from restaurant_app.serializers import UserSerializer
+
+        try:
+            user = User.objects.get(passcode=request.data["passcode"])
+        except User.DoesNotExist:
+            raise serializers.ValidationError("Invalid passcode")
+        refresh = RefreshToken.for_user(user)
+        return Response({
+            "user": UserSerializer(user).data,
+            "refresh": str(refresh),
+            "access": str(refresh.access_token),
+        })
+
+
+def _storm(view, passcodes, logins):
+    factory = APIRequestFactory()
+    barrier = threading.Barrier(len(passcodes))
+    latencies, errors, lock = [], [], threading.Lock()
+
+    def terminal(passcode):
+        try:
+            barrier.wait()
+            for _ in range(logins):
+                request = factory.post("/api/login-passcode/", {"passcode": passcode}, format="json")
+                started = time.perf_counter()
+                try:
+                    status = view(request).status_code
+                except Exception as exc:
+                    status = repr(exc)
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if status != 200:
+                        errors.append(str(status))
+        finally:
+            close_old_connections()
+
+    threads = [threading.Thread(target=terminal, args=(passcode,)) for passcode in passcodes]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "logins": len(latencies),
+        "errors": len(errors),
+        "error_kinds": sorted(set(errors)),
+        "logins_per_second": round(len(latencies) / elapsed),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 2),
+    }
+
+
+def _queries_per_login(view, passcodes, count):
+    factory = APIRequestFactory()
+    with CaptureQueriesContext(connection) as captured:
+        for i in range(count):
+            view(factory.post("/api/login-passcode/", {"passcode": passcodes[i % len(passcodes)]}, format="json"))
+    return round(len(captured) / count, 2)
+
+
+def run(options):
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    from restaurant_app import authentication
+    from restaurant_app.views import PasscodeLoginView
+
+    # Seeded with bulk_create, so the passcodes are still plaintext
+    users = seed.seed_users(staff=THREADS // 2, drivers=THREADS - THREADS // 2)
+    passcodes = [user.passcode for user in users["staff"]] + [driver.user.passcode for driver in users["drivers"]]
+    logins = LOGINS_PER_THREAD * options.scale
+
+    previous, current = PreviousPasscodeLoginView.as_view(), PasscodeLoginView.as_view()
+    result = {"previous": _storm(previous, passcodes, logins)}
+    result["previous"]["queries_per_login"] = _queries_per_login(previous, passcodes, SEQUENTIAL_LOGINS)
+
+    call_command("hash_passcodes", stdout=io.StringIO())
+    OutstandingToken.objects.all().delete()
+    result["current"] = _storm(current, passcodes, logins)
+    result["current"]["queries_per_login"] = _queries_per_login(current, passcodes, SEQUENTIAL_LOGINS)
+    authentication.flush_outstanding()
+
+    failures = []
+    after = result["current"]
+    if after["errors"]:
+        failures.append(f"passcode login: {after['errors']} of {after['logins']} logins failed")
+    if after["queries_per_login"] > QUERIES_PER_LOGIN:
+        failures.append(f"passcode login: {after['queries_per_login']} queries per login, "
+                        f"budget is {QUERIES_PER_LOGIN}")
+    issued = after["logins"] + SEQUENTIAL_LOGINS
+    recorded = OutstandingToken.objects.count()
+    if recorded != issued:
+        failures.append(f"passcode login: {recorded} OutstandingToken rows for {issued} refresh tokens")
+
+    for name, storm in result.items():
+        print(f"{name}: {storm['logins']} logins, {storm['logins_per_second']}/s, p50 {storm['p50_ms']} ms, "
+              f"p95 {storm['p95_ms']} ms, {storm['errors']} errors, {storm['queries_per_login']} queries per login")
+    result["failures"] = failures
+    return result
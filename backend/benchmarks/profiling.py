@@ -0,0 +1,89 @@
+"""
+Overhead of the request profiling middleware (restaurant_app/profiling.py).
+
+Requests a set of list and report endpoints REQUESTS times each through
+the whole middleware stack, with PERF_PROFILING off and on, in
+alternating rounds, best of ROUNDS each. The run fails when profiling
+slows the requests down by more than OVERHEAD_BUDGET, when an endpoint is
+missing from the report, or when one of them is flagged as an N+1
+suspect.
+"""
+import time
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from benchmarks import seed
+
+REQUESTS = 10
+ROUNDS = 20
+OVERHEAD_BUDGET = 0.10
+
+ENDPOINTS = [
+    ("OrderViewSet.list", "/api/orders/"),
+    ("OrderViewSet.dashboard_data", "/api/orders/dashboard_data/?time_range=year"),
+    ("DishViewSet.list", "/api/dishes/"),
+    ("DeliveryOrderViewSet.list", "/api/delivery-orders/"),
+]
+
+
+def _client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    # The handler loads the middleware on its first request
+    client.get(ENDPOINTS[0][1])
+    return client
+
+
+def _seconds(client, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        for _, path in ENDPOINTS:
+            client.get(path)
+    return time.perf_counter() - started
+
+
+def run(options):
+    from restaurant_app import profiling
+
+    users = seed.seed_users()
+    seed.seed_orders(orders=200 * options.scale, users=users)
+    staff = users["staff"][0]
+
+    cache.clear()
+    profiling.reset()
+    with override_settings(PERF_PROFILING=False):
+        client_off = _client(staff)
+    with override_settings(PERF_PROFILING=True):
+        client_on = _client(staff)
+        # Alternating, so that both see the same machine load
+        off, on = [], []
+        for _ in range(ROUNDS):
+            off.append(_seconds(client_off, REQUESTS))
+            on.append(_seconds(client_on, REQUESTS))
+        off, on = min(off), min(on)
+        report = {row["endpoint"]: row for row in profiling.report()["endpoints"]}
+
+    requests = REQUESTS * len(ENDPOINTS)
+    overhead = on / off - 1
+    failures = []
+    if overhead > OVERHEAD_BUDGET:
+        failures.append(f"profiling: {overhead:.0%} overhead, budget is {OVERHEAD_BUDGET:.0%}")
+    for endpoint, _ in ENDPOINTS:
+        if endpoint not in report:
+            failures.append(f"profiling: {endpoint} missing from the report")
+        elif report[endpoint]["n_plus_one"]:
+            failures.append(f"profiling: {endpoint} flagged as N+1: {report[endpoint]['n_plus_one'][0]['sql'][:120]}")
+
+    result = {
+        "requests_per_round": requests,
+        "ms_per_request_off": round(off / requests * 1000, 3),
+        "ms_per_request_on": round(on / requests * 1000, 3),
+        "overhead": round(overhead, 3),
+        "report": [report[endpoint] for endpoint, _ in ENDPOINTS if endpoint in report],
+        "failures": failures,
+    }
+    print(f"{ROUNDS} rounds of {requests} requests: {result['ms_per_request_off']} ms each without profiling, "
+          f"{result['ms_per_request_on']} ms with ({overhead:+.1%})")
+    return result
@@ -0,0 +1,98 @@
+"""
+Query budgets for the order, dashboard and accounting report endpoints.
+
+Every endpoint is requested against a dataset larger than any page, so an
+N+1 regression in a nested serializer pushes the count over its budget and
+the run exits non-zero.
+"""
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from benchmarks import seed
+
+# (name, path, max queries). Budgets include pagination COUNT(*) queries and
+# the one-off dish name index load, but not authentication.
+BUDGETS = [
+    ("orders list", "/api/orders/", 5),
+    ("order detail", "/api/orders/{order_id}/", 4),
+    ("sales report", "/api/orders/sales_report/", 4),
+    ("user order history", "/api/orders/user_order_history/?customer_phone_number={phone}", 4),
+    ("staff order report", "/api/orders/staff-user-order-report/", 4),
+    ("dashboard (year)", "/api/orders/dashboard_data/?time_range=year", 5),
+    ("delivery orders list", "/api/delivery-orders/", 5),
+    ("driver orders report", "/api/delivery-orders/driver-orders-report/", 5),
+    ("dishes list", "/api/dishes/", 2),
+    ("menu catalogue", "/api/menu-catalogue/", 4),
+    ("trial balance", "/api/transactions/trial-balance/?from_date=2024-01-01&to_date=2024-12-31", 1),
+    ("profit and loss", "/api/transactions/profit-and-loss/?from_date=2024-01-01&to_date=2024-12-31", 1),
+    ("balance sheet", "/api/transactions/balance-sheet/?from_date=2024-01-01&to_date=2024-12-31", 1),
+]
+
+# (name, path, max queries) for POSTs of ORDER_LINES-line orders. Placing
+# an order must not cost a statement per line; the rest of the budget is
+# the receivers, the rollup upserts and serializing the response. The
+# first order also creates the invoice counter row. Measured with
+# SALES_ROLLUPS_ENABLED on, the most an order costs.
+ORDER_LINES = 20
+WRITE_BUDGETS = [
+    ("create dining order", "/api/orders/", 28),
+    ("create delivery order", "/api/orders/", 25),
+]
+
+
+def run(options):
+    from delivery_drivers.models import DeliveryDriver
+    from restaurant_app.models import Order
+
+    users = seed.seed_users()
+    seed.seed_orders(orders=200 * options.scale, users=users)
+    staff = users["staff"][0]
+    staff.is_staff = True
+    staff.save()
+
+    order = Order.objects.order_by("id").first()
+    params = {"order_id": order.id, "phone": order.customer_phone_number}
+
+    staff_client = APIClient()
+    staff_client.force_authenticate(staff)
+    driver = DeliveryDriver.objects.filter(orders__isnull=False).select_related("user").first()
+    driver_client = APIClient()
+    driver_client.force_authenticate(driver.user)
+
+    results, failures = {}, []
+    for name, path, budget in BUDGETS:
+        client = driver_client if "driver orders" in name else staff_client
+        url = path.format(**params)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        count = len(ctx.captured_queries)
+        results[name] = {"url": url, "status": response.status_code, "queries": count, "budget": budget}
+        if response.status_code != 200:
+            failures.append(f"{name}: {url} returned {response.status_code}")
+        elif count > budget:
+            failures.append(f"{name}: {count} queries, budget is {budget}")
+
+    for name, path, budget in WRITE_BUDGETS:
+        body = {
+            "items": [
+                {"dish_name": f"Dish {i}", "price": "10.00", "quantity": 2} for i in range(ORDER_LINES)
+            ],
+            "total_amount": "0",
+            "order_type": "delivery" if "delivery" in name else "dining",
+            "customer_name": "Customer",
+            "customer_phone_number": "50000000",
+            "address": "Doha",
+        }
+        if "delivery" in name:
+            body["delivery_driver_id"] = driver.id
+        with override_settings(SALES_ROLLUPS_ENABLED=True), CaptureQueriesContext(connection) as ctx:
+            response = staff_client.post(path, body, format="json")
+        count = len(ctx.captured_queries)
+        results[name] = {"url": path, "status": response.status_code, "queries": count, "budget": budget}
+        if response.status_code != 201:
+            failures.append(f"{name}: {path} returned {response.status_code}")
+        elif count > budget:
+            failures.append(f"{name}: {count} queries, budget is {budget}")
+    return {"endpoints": results, "failures": failures}
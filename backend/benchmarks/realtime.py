@@ -0,0 +1,106 @@
+"""
+Order board push latency: commit to screen.
+
+A WebSocket subscriber is connected to the ASGI application while another
+thread creates orders, one transaction each. Each order's latency runs
+from its commit to the moment the subscriber receives the order.created
+event, through the configured broker and the order effects runner. The
+run fails when the 95th percentile exceeds LATENCY_BUDGET_MS or an event
+is lost.
+"""
+import asyncio
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from asgiref.testing import ApplicationCommunicator
+from django.db import close_old_connections, transaction
+
+from benchmarks import seed
+
+ORDERS = 200
+PACE_SECONDS = 0.005
+LATENCY_BUDGET_MS = 100
+RECEIVE_TIMEOUT = 5
+
+
+def _create_orders(user, count, committed):
+    from restaurant_app.models import Order, OrderItem
+
+    try:
+        for _ in range(count):
+            with transaction.atomic():
+                # Registered first, so it runs before the publish callbacks
+                stamp = {}
+                transaction.on_commit(lambda stamp=stamp: stamp.setdefault("at", time.perf_counter()))
+                order = Order.objects.create(user=user, total_amount=Decimal("12.00"))
+                order.add_items([OrderItem(dish_name="Dish 1", price=Decimal("6.00"), quantity=2)])
+            committed[order.pk] = stamp["at"]
+            time.sleep(PACE_SECONDS)
+    finally:
+        close_old_connections()
+
+
+async def _measure(user, count):
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from restaurant_project.asgi import application
+
+    communicator = ApplicationCommunicator(application, {
+        "type": "websocket",
+        "path": "/ws/events/",
+        "query_string": f"token={AccessToken.for_user(user)}".encode(),
+    })
+    await communicator.send_input({"type": "websocket.connect"})
+    accepted = await communicator.receive_output(RECEIVE_TIMEOUT)
+    if accepted["type"] != "websocket.accept":
+        raise RuntimeError(f"WebSocket refused: {accepted}")
+
+    committed, received = {}, {}
+    writer = asyncio.get_running_loop().run_in_executor(None, _create_orders, user, count, committed)
+    try:
+        while len(received) < count:
+            message = await communicator.receive_output(RECEIVE_TIMEOUT)
+            event = json.loads(message["text"])
+            if event["type"] == "order.created":
+                received[event["order"]["id"]] = time.perf_counter()
+    except asyncio.TimeoutError:
+        pass
+    await writer
+    await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+    await communicator.wait(RECEIVE_TIMEOUT)
+    return committed, received
+
+
+def run(options):
+    from django.conf import settings
+
+    users = seed.seed_users(staff=1, drivers=1)
+    user = users["staff"][0]
+    count = ORDERS * options.scale
+
+    committed, received = asyncio.run(_measure(user, count))
+    latencies = sorted(
+        (received[order_id] - committed_at) * 1000
+        for order_id, committed_at in committed.items()
+        if order_id in received
+    )
+
+    failures = []
+    if len(latencies) != count:
+        failures.append(f"realtime: {count - len(latencies)} of {count} order.created events not received")
+    result = {"broker": settings.REALTIME_BROKER, "orders": count, "received": len(latencies)}
+    if latencies:
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        result.update({
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(p95, 2),
+            "max_ms": round(latencies[-1], 2),
+            "budget_ms": LATENCY_BUDGET_MS,
+        })
+        if p95 > LATENCY_BUDGET_MS:
+            failures.append(f"realtime: p95 latency {p95:.1f} ms, budget is {LATENCY_BUDGET_MS} ms")
+        print(f"{len(latencies)} events: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms")
+    result["failures"] = failures
+    return result
@@ -0,0 +1,171 @@
+"""
+Deterministic dataset seeding for the benchmark suites.
+
+Rows are written with bulk_create, so model save() overrides and signals
+are bypassed; fields they would normally fill (invoice numbers, delivery
+orders) are set explicitly here.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from delivery_drivers.models import DeliveryDriver, DeliveryOrder
+from restaurant_app.models import (
+    Category, Dish, DishSize, DishVariant, FOCProduct, Order, OrderItem, User,
+)
+
+BATCH_SIZE = 2000
+
+
+def seed_users(staff=5, drivers=5):
+    users = []
+    for i in range(staff):
+        users.append(User(username=f"staff{i}", email=f"staff{i}@example.com",
+                          role="staff", is_staff=True, passcode=f"{100000 + i}"))
+    for i in range(drivers):
+        users.append(User(username=f"driver{i}", email=f"driver{i}@example.com",
+                          role="driver", passcode=f"{200000 + i}"))
+    for user in users:
+        user.set_password("password")
+    User.objects.bulk_create(users)
+
+    driver_users = User.objects.filter(role="driver")
+    DeliveryDriver.objects.bulk_create(
+        DeliveryDriver(user=user, is_active=True, is_available=True) for user in driver_users
+    )
+    return {
+        "staff": list(User.objects.filter(role="staff")),
+        "drivers": list(DeliveryDriver.objects.select_related("user")),
+    }
+
+
+def seed_menu(dishes=200, categories=10, rng=None):
+    rng = rng or random.Random(0)
+    Category.objects.bulk_create(Category(name=f"Category {i}") for i in range(categories))
+    category_ids = list(Category.objects.values_list("id", flat=True))
+
+    Dish.objects.bulk_create(
+        (
+            Dish(
+                name=f"Dish {i}",
+                arabic_name=f"طبق {i}",
+                price=Decimal(rng.randint(500, 5000)) / 100,
+                category_id=rng.choice(category_ids),
+            )
+            for i in range(dishes)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    dish_rows = list(Dish.objects.values_list("id", "name", "price"))
+    sizes, variants = [], []
+    for dish_id, name, price in dish_rows:
+        for size, factor in (("Small", Decimal("0.8")), ("Large", Decimal("1.3"))):
+            sizes.append(DishSize(dish_id=dish_id, size=size, price=price * factor))
+        variants.append(DishVariant(dish_id=dish_id, name="Extra spicy"))
+    DishSize.objects.bulk_create(sizes, batch_size=BATCH_SIZE)
+    DishVariant.objects.bulk_create(variants, batch_size=BATCH_SIZE)
+    FOCProduct.objects.bulk_create(FOCProduct(name=f"Free item {i}", quantity=1) for i in range(3))
+    return dish_rows
+
+
+def seed_orders(orders=500, days=60, items_per_order=(1, 8), users=None, dish_rows=None, rng=None):
+    rng = rng or random.Random(1)
+    users = users or seed_users()
+    dish_rows = dish_rows or seed_menu(rng=rng)
+    staff, drivers = users["staff"], users["drivers"]
+    now = timezone.now()
+    first_invoice = Order.objects.count() + 1
+
+    order_rows, order_items, order_drivers = [], [], []
+    for offset in range(orders):
+        order_type = rng.choice(["dining", "takeaway", "delivery", "onlinedelivery"])
+        payment_method = rng.choice(["cash", "bank", "cash-bank", "credit"])
+        status = rng.choices(["delivered", "pending", "cancelled"], weights=[8, 1, 1])[0]
+        driver = rng.choice(drivers) if order_type == "delivery" else None
+
+        items = []
+        for _ in range(rng.randint(*items_per_order)):
+            _, name, price = rng.choice(dish_rows)
+            items.append(OrderItem(dish_name=name, price=price, quantity=rng.randint(1, 3)))
+        total = sum(item.price * item.quantity for item in items)
+
+        order = Order(
+            user=rng.choice(staff),
+            created_at=now - timedelta(minutes=rng.randint(0, days * 24 * 60)),
+            total_amount=total,
+            status=status,
+            order_type=order_type,
+            payment_method=payment_method,
+            cash_amount=total if payment_method == "cash" else 0,
+            bank_amount=total if payment_method == "bank" else 0,
+            credit_amount=total if payment_method == "credit" else 0,
+            invoice_number=f"{first_invoice + offset:04d}",
+            customer_name=f"Customer {offset % 1000}",
+            customer_phone_number=f"5{offset % 1000:07d}",
+            address="Doha",
+            delivery_driver_id=driver.id if driver else None,
+            is_scanned=driver is not None,
+        )
+        order_rows.append(order)
+        order_items.append(items)
+        order_drivers.append(driver)
+
+    # bulk_create sets the primary keys on SQLite and PostgreSQL
+    Order.objects.bulk_create(order_rows, batch_size=BATCH_SIZE)
+    item_rows, delivery_rows = [], []
+    for order, items, driver in zip(order_rows, order_items, order_drivers):
+        for item in items:
+            item.order = order
+        item_rows.extend(items)
+        if driver:
+            delivery_rows.append(DeliveryOrder(order=order, driver=driver, status="delivered"))
+    OrderItem.objects.bulk_create(item_rows, batch_size=BATCH_SIZE)
+    DeliveryOrder.objects.bulk_create(delivery_rows, batch_size=BATCH_SIZE)
+    return {"orders": len(order_rows), "items": len(item_rows), "delivery_orders": len(delivery_rows)}
+
+
+def seed_transactions(transactions=1000, ledgers=20, days=60, rng=None):
+    """
+    Double-entry vouchers between `ledgers` ledgers: each voucher is a
+    debit line in one ledger and the matching credit line in another.
+    """
+    from transactions_app import balances
+    from transactions_app.models import Ledger, MainGroup, NatureGroup, Transaction
+
+    rng = rng or random.Random(2)
+    nature = NatureGroup.objects.create(name="Asset")
+    group = MainGroup.objects.create(name="Cash in hand", nature_group=nature)
+    Ledger.objects.bulk_create(Ledger(name=f"Ledger {i}", group=group) for i in range(ledgers))
+    ledger_ids = list(Ledger.objects.values_list("id", flat=True))
+    today = timezone.now().date()
+
+    rows = []
+    for voucher_no in range(1, transactions // 2 + 1):
+        debit_ledger, credit_ledger = rng.sample(ledger_ids, 2)
+        amount = Decimal(rng.randint(100, 50000)) / 100
+        date = today - timedelta(days=rng.randint(0, days))
+        rows.append(Transaction(ledger_id=debit_ledger, particulars_id=credit_ledger, date=date,
+                                debit_credit=Transaction.DEBIT, debit_amount=amount, voucher_no=voucher_no))
+        rows.append(Transaction(ledger_id=credit_ledger, particulars_id=debit_ledger, date=date,
+                                debit_credit=Transaction.CREDIT, credit_amount=amount, voucher_no=voucher_no))
+    Transaction.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    for ledger_id in ledger_ids:
+        balances.recompute(ledger_id)
+    return {"ledgers": len(ledger_ids), "transactions": len(rows)}
+
+
+def seed_dataset(dishes=10_000, orders=20_000, transactions=20_000, days=60, rng=None):
+    """A restaurant's worth of history: menu, orders, deliveries and ledger postings."""
+    from restaurant_app import rollups
+
+    rng = rng or random.Random(3)
+    users = seed_users(staff=10, drivers=10)
+    dish_rows = seed_menu(dishes=dishes, categories=50, rng=rng)
+    counts = {"dishes": len(dish_rows)}
+    counts.update(seed_orders(orders=orders, days=days, users=users, dish_rows=dish_rows, rng=rng))
+    counts.update(seed_transactions(transactions=transactions, days=days, rng=rng))
+    # bulk_create skipped the rollup receivers
+    rollups.rebuild()
+    return users, counts
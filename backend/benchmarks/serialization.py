@@ -0,0 +1,118 @@
+"""
+List serialization cost, nested against `?view=compact`.
+
+Seeds ROWS accounting transactions and credit transactions per --scale
+step and renders all of them through each view's queryset, once with the
+view's serializer and once as the compact projection (projections.py).
+The nested serializers are also run on the bare model queryset, to show
+the per-row fan-out the eager loading removes. Times are reported per
+1,000 rows. The run fails when a compact listing takes more than one
+query or is not faster than the nested one.
+"""
+import datetime
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from benchmarks import seed
+from benchmarks.voucher_stress import seed_ledgers
+
+ROWS = 1000
+CREDIT_USERS = 50
+
+
+def seed_transactions(count):
+    from transactions_app.models import Transaction
+
+    *ledgers, cash = seed_ledgers()
+    start = datetime.date(2024, 1, 1)
+    Transaction.objects.bulk_create(
+        Transaction(
+            ledger=ledgers[i % len(ledgers)],
+            particulars=cash,
+            date=start + datetime.timedelta(days=i % 300),
+            debit_amount=Decimal(i % 500 + 1),
+            debit_credit=Transaction.DEBIT,
+            voucher_no=i + 1,
+        )
+        for i in range(count)
+    )
+
+
+def seed_credit(count, users):
+    from restaurant_app.models import CreditOrder, CreditTransaction, CreditUser, Order
+
+    CreditUser.objects.bulk_create(
+        CreditUser(username=f"Credit {i}", mobile_number=f"{7000000 + i}") for i in range(CREDIT_USERS)
+    )
+    credit_users = list(CreditUser.objects.all())
+    seed.seed_orders(orders=CREDIT_USERS * 4, users=users)
+    CreditOrder.objects.bulk_create(
+        CreditOrder(order=order, credit_user=credit_users[i % CREDIT_USERS])
+        for i, order in enumerate(Order.objects.all())
+    )
+    CreditTransaction.objects.bulk_create(
+        CreditTransaction(
+            received_amount=Decimal(i % 300 + 1),
+            cash_amount=Decimal(i % 300 + 1),
+            status="completed",
+            credit_user=credit_users[i % CREDIT_USERS],
+        )
+        for i in range(count)
+    )
+
+
+def _measure(render):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        rows = render()
+        elapsed = time.perf_counter() - started
+    return {
+        "rows": len(rows),
+        "queries": len(queries),
+        "ms_per_1000_rows": round(elapsed * 1000 / max(len(rows), 1) * 1000, 2),
+    }
+
+
+def run(options):
+    from restaurant_app.projections import compact_rows, project
+    from restaurant_app.views import CreditTransactionViewSet
+    from transactions_app.views import TransactionViewSet
+
+    count = ROWS * options.scale
+    users = seed.seed_users(staff=1, drivers=1)
+    seed_transactions(count)
+    seed_credit(count, users)
+
+    results, failures = {}, []
+    for name, viewset in [("transactions", TransactionViewSet), ("credit transactions", CreditTransactionViewSet)]:
+        view = viewset()
+        view.request = Request(APIRequestFactory().get("/"))
+        view.format_kwarg = None
+        queryset = view.get_queryset()
+        serializer = view.get_serializer_class()
+
+        result = {
+            "nested, no eager loading": _measure(
+                lambda: serializer(queryset.model.objects.all(), many=True).data
+            ),
+            "nested": _measure(lambda: serializer(queryset.all(), many=True).data),
+            "compact": _measure(lambda: compact_rows(project(queryset.all(), viewset.compact_fields))),
+        }
+        results[name] = result
+        compact, nested = result["compact"], result["nested"]
+        if compact["queries"] > 1:
+            failures.append(f"{name}: compact listing took {compact['queries']} queries")
+        if compact["ms_per_1000_rows"] >= nested["ms_per_1000_rows"]:
+            failures.append(f"{name}: compact listing is not faster than the nested one")
+        print(f"{name}: " + ", ".join(
+            f"{mode} {timing['ms_per_1000_rows']} ms/1000 rows ({timing['queries']} queries)"
+            for mode, timing in result.items()
+        ))
+
+    results["failures"] = failures
+    return results
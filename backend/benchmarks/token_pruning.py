@@ -0,0 +1,101 @@
+"""
+Pruning of the JWT token tables (restaurant_app/token_tables.py).
+
+Seeds TOKENS outstanding refresh tokens per --scale step, as months of
+logins and rotations leave them: the older EXPIRED_SHARE expired, every
+BLACKLIST_EVERY-th one blacklisted. Then prunes them in batches and
+measures the blacklist check before and after. The run fails when an
+expired token survives, an unexpired one or its blacklist entry is
+deleted, or a batch holds its transaction longer than BATCH_BUDGET_MS.
+"""
+import datetime
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from benchmarks import seed
+
+TOKENS = 100_000
+EXPIRED_SHARE = 0.9
+BLACKLIST_EVERY = 2
+BATCH_SIZE = 1000
+BATCH_BUDGET_MS = 250
+
+
+def seed_tokens(user, count):
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    now = timezone.now()
+    expired = int(count * EXPIRED_SHARE)
+    OutstandingToken.objects.bulk_create(
+        (
+            OutstandingToken(
+                user=user,
+                jti=f"{i:032x}",
+                token=f"token-{i}",
+                created_at=now - datetime.timedelta(days=3),
+                # Issued in order, so they expire in id order
+                expires_at=now + datetime.timedelta(hours=i - expired + 1),
+            )
+            for i in range(count)
+        ),
+        batch_size=5000,
+    )
+    BlacklistedToken.objects.bulk_create(
+        (BlacklistedToken(token_id=token_id) for token_id in
+         OutstandingToken.objects.values_list("id", flat=True)[::BLACKLIST_EVERY]),
+        batch_size=5000,
+    )
+    return expired
+
+
+def run(options):
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    from restaurant_app import token_tables
+
+    users = seed.seed_users(staff=1, drivers=0)
+    count = TOKENS * options.scale
+    expired = seed_tokens(users["staff"][0], count)
+    blacklisted = BlacklistedToken.objects.count()
+    before = token_tables.metrics()
+
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        deleted, unblacklisted = token_tables.prune(batch_size=BATCH_SIZE)
+        elapsed = time.perf_counter() - started
+    after = token_tables.metrics()
+
+    # Each batch is a select, a blacklist delete and a token delete
+    batches = [captured.captured_queries[i:i + 3] for i in range(0, len(captured), 3)]
+    slowest_batch_ms = max((sum(float(query["time"]) for query in batch) for batch in batches), default=0) * 1000
+
+    failures = []
+    if not batches:
+        failures.append("token pruning: no queries captured, batch timings are unavailable")
+    if deleted != expired or after["expired_outstanding_tokens"]:
+        failures.append(f"token pruning: deleted {deleted} of {expired} expired tokens")
+    if after["outstanding_tokens"] != count - expired:
+        failures.append(f"token pruning: {after['outstanding_tokens']} tokens left, expected {count - expired}")
+    if after["blacklisted_tokens"] != blacklisted - unblacklisted or OutstandingToken.objects.filter(
+            blacklistedtoken__isnull=False).count() != after["blacklisted_tokens"]:
+        failures.append("token pruning: blacklist entries of unexpired tokens were lost")
+    if slowest_batch_ms > BATCH_BUDGET_MS:
+        failures.append(f"token pruning: slowest batch {slowest_batch_ms:.1f} ms, budget is {BATCH_BUDGET_MS} ms")
+
+    result = {
+        "tokens": count,
+        "deleted_outstanding": deleted,
+        "deleted_blacklisted": unblacklisted,
+        "seconds": round(elapsed, 2),
+        "slowest_batch_ms": round(slowest_batch_ms, 2),
+        "before": before,
+        "after": after,
+        "failures": failures,
+    }
+    print(f"deleted {deleted} of {count} tokens in {result['seconds']}s, slowest batch "
+          f"{result['slowest_batch_ms']} ms; blacklist check {before['blacklist_check_ms']} ms "
+          f"-> {after['blacklist_check_ms']} ms")
+    return result
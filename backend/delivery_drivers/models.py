@@ -1,7 +1,8 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from restaurant_app import order_effects, passcodes, realtime
 from restaurant_app.models import Order
 
 User = get_user_model()
@@ -43,12 +44,30 @@ class DeliveryOrder(models.Model):
     class Meta:
         ordering = ("-updated_at",)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.status if "status" in field_names else None
+        return instance
+
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
 
-@receiver(post_save, sender=Order)
-def create_delivery_order(sender, instance, created, **kwargs):
+@receiver(post_save, sender=DeliveryDriver)
+@receiver(post_delete, sender=DeliveryDriver)
+def invalidate_login_payload(sender, instance, **kwargs):
+    # The passcode login returns the user with its driver profile id
+    passcodes.invalidate(instance.user_id)
+
+
+@order_effects.register(
+    "create_delivery_order",
+    fields=["order_type", "delivery_driver_id", "is_scanned"],
+    # An order assigned to a driver must not commit without its DeliveryOrder
+    in_transaction=True,
+)
+def create_delivery_order(instance, created):
     if instance.is_delivery_order():
         driver = None
         if not instance.is_scanned:
@@ -57,4 +76,20 @@ def create_delivery_order(sender, instance, created, **kwargs):
             )
             DeliveryOrder.objects.create(order=instance, driver=driver)
             instance.is_scanned = True
-            instance.save()
+            # Update the flag only, re-saving would run every receiver again
+            Order.objects.filter(pk=instance.pk).update(is_scanned=True)
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def publish_delivery_status(sender, instance, created, **kwargs):
+    if created or instance.status != getattr(instance, "_loaded_status", None):
+        instance._loaded_status = instance.status
+        realtime.publish({
+            "type": "delivery.status_changed",
+            "delivery_order": {
+                "id": instance.pk,
+                "order_id": instance.order_id,
+                "driver_id": instance.driver_id,
+                "status": instance.status,
+            },
+        })
@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from .models import DeliveryDriver, DeliveryOrder
 from .serializers import DeliveryDriverSerializer, DeliveryOrderSerializer, DeliveryOrderUpdateSerializer
 from restaurant_app.models import Order
-from restaurant_app.serializers import OrderTypeChangeSerializer
+from restaurant_app.serializers import OrderSerializer, OrderTypeChangeSerializer
 from django.utils.dateparse import parse_date
 
 
@@ -52,8 +52,11 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return DeliveryOrder.objects.all()
-        return DeliveryOrder.objects.filter(driver__user=self.request.user)
+            queryset = DeliveryOrder.objects.all()
+        else:
+            queryset = DeliveryOrder.objects.filter(driver__user=self.request.user)
+        queryset = queryset.select_related("driver__user")
+        return OrderSerializer.setup_eager_loading(queryset, prefix="order__")
 
     @action(detail=True, methods=["patch"])
     def update_status(self, request, pk=None):
@@ -138,7 +141,7 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
         except DeliveryDriver.DoesNotExist:
             return Response([], status=status.HTTP_200_OK)
 
-        delivery_orders = DeliveryOrder.objects.filter(driver=delivery_driver)
+        delivery_orders = self.get_queryset().filter(driver=delivery_driver)
         
         # Extract query parameters
         from_date = request.query_params.get('from_date')
@@ -4,6 +4,7 @@ from unfold.admin import ModelAdmin as UnflodModelAdmin
 from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from django.utils.html import format_html
+from django.utils import timezone
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from restaurant_app.models import *
@@ -128,4 +129,34 @@ class SidebarItemAdmin(UnflodModelAdmin,ImportExportModelAdmin):
         js = ('admin/js/list_filter_toggle.js',)
 
 admin.site.register(DishVariant, UnflodModelAdmin)
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(UnflodModelAdmin):
+    list_display = ("date", "order_type", "payment_method", "status", "order_count", "total_amount")
+    list_filter = ("order_type", "payment_method", "status")
+    date_hierarchy = "date"
+
+
+@admin.register(DailyDishRollup)
+class DailyDishRollupAdmin(UnflodModelAdmin):
+    list_display = ("date", "dish_name", "status", "quantity", "total_amount")
+    list_filter = ("order_type", "payment_method", "status")
+    search_fields = ("dish_name",)
+    date_hierarchy = "date"
+
+
+@admin.register(Job)
+class JobAdmin(UnflodModelAdmin):
+    list_display = ("id", "name", "queue", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "queue", "periodic", "name")
+    readonly_fields = ("locked_by", "locked_at", "slot", "periodic", "last_error", "created_at", "finished_at")
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        # Periodic jobs are queued again by the workers themselves
+        queryset.exclude(status="running").exclude(periodic=True).update(
+            status="pending", attempts=0, run_at=timezone.now(), finished_at=None
+        )
 admin.site.register(ChairBooking,UnflodModelAdmin)
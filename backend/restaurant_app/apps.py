@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RestaurantAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurant_app'
+
+    def ready(self):
+        # Register the background tasks
+        from . import tasks  # noqa: F401
@@ -0,0 +1,196 @@
+"""
+JWT authentication without a User query per request.
+
+JWTAuthentication loads the token's user from the database on every
+request. CachedJWTAuthentication resolves it from two caches keyed by the
+user id and the token's version claim instead:
+
+- an in-process dict, kept AUTH_USER_LOCAL_TTL seconds, which other
+  worker processes cannot invalidate, so the TTL stays short;
+- the Django cache, kept AUTH_USER_CACHE_TIMEOUT seconds, which every
+  process sees when the cache backend is shared.
+
+Tokens issued by token_for_user carry the user's token_version. User.save
+bumps it when the role, is_active or the password changes, and tokens
+with an older version are refused from then on, so those changes log the
+user out. Every save or delete of a user drops its cached entries (see
+invalidate). Updates through QuerySet.update() skip save() and are only
+picked up once the entries expire.
+
+token_for_user does not write the OutstandingToken row of each refresh
+token it issues. The rows are queued and inserted together once
+TOKEN_OUTSTANDING_BATCH_SIZE are waiting, or TOKEN_OUTSTANDING_FLUSH_DELAY
+seconds after the first of them was queued. Rows whose insert failed go
+back to the queue and are retried after the same delay. Blacklisting a
+token whose row is still queued creates the row itself, like simplejwt
+does for tokens it has never seen. The queue is flushed once more when
+the process exits; rows still queued when it is killed are lost, which
+leaves those tokens out of the outstanding token list.
+"""
+import atexit
+import copy
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_CLAIM = "token_version"
+
+_lock = threading.Lock()
+# (user id, token version) -> (expiry, user). Tokens carry the id as a
+# string, so the keys do too.
+_users = {}
+
+
+def _key(user_id, version):
+    return f"auth-user:{user_id}:{version}"
+
+
+def invalidate(user_id, *versions):
+    """Drop the cached entries of a user, under the given token versions."""
+    user_id = str(user_id)
+    with _lock:
+        for entry in [entry for entry in _users if entry[0] == user_id]:
+            del _users[entry]
+    cache.delete_many([_key(user_id, version) for version in versions])
+
+
+def _load(user_id, version):
+    from restaurant_app.models import User
+
+    try:
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    if user.token_version != version:
+        raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+    cache.set(_key(user_id, version), user, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_user(user_id, version):
+    """The user behind a token, from the caches or the database."""
+    user_id = str(user_id)
+    entry = (user_id, version)
+    cached = _users.get(entry)
+    if cached is None or cached[0] <= time.monotonic():
+        user = cache.get(_key(user_id, version))
+        if user is None:
+            user = _load(user_id, version)
+        cached = (time.monotonic() + settings.AUTH_USER_LOCAL_TTL, user)
+        with _lock:
+            _users[entry] = cached
+    # Requests must not share one instance
+    return copy.copy(cached[1])
+
+
+_queue_lock = threading.Lock()
+# OutstandingToken rows not inserted yet
+_outstanding = []
+# The pending flush timer, if any
+_timer = None
+
+
+def _flush_later():
+    global _timer
+
+    with _queue_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(settings.TOKEN_OUTSTANDING_FLUSH_DELAY, _flush_in_thread)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_in_thread():
+    global _timer
+
+    with _queue_lock:
+        _timer = None
+    try:
+        flush_outstanding()
+    finally:
+        connection.close()
+
+
+def flush_outstanding(retry=True):
+    """
+    Insert the queued OutstandingToken rows. When that fails, the rows go
+    back to the queue, to be retried after the flush delay, or, without
+    `retry`, by whichever flush comes next.
+    """
+    with _queue_lock:
+        rows = _outstanding[:]
+        del _outstanding[:]
+    if not rows:
+        return
+    try:
+        with transaction.atomic():
+            # The row of a token blacklisted in the meantime already exists
+            OutstandingToken.objects.bulk_create(rows, ignore_conflicts=True)
+    except DatabaseError:
+        # A failed insert must not fail the login that triggered it
+        logger.exception("Could not insert %d outstanding tokens, retrying later", len(rows))
+        with _queue_lock:
+            _outstanding[:0] = rows
+        if retry:
+            _flush_later()
+
+
+# A recycled worker process writes what it still has queued
+atexit.register(flush_outstanding, retry=False)
+
+
+def _queue_outstanding(token, user):
+    row = OutstandingToken(
+        user=user,
+        jti=token[api_settings.JTI_CLAIM],
+        token=str(token),
+        created_at=token.current_time,
+        expires_at=datetime_from_epoch(token["exp"]),
+    )
+    with _queue_lock:
+        _outstanding.append(row)
+        queued = len(_outstanding)
+    if queued >= settings.TOKEN_OUTSTANDING_BATCH_SIZE:
+        flush_outstanding()
+    else:
+        _flush_later()
+
+
+def token_for_user(user):
+    """A refresh token for `user` carrying its current token version."""
+    # RefreshToken.for_user would insert the OutstandingToken row right away
+    token = RefreshToken()
+    token[api_settings.USER_ID_CLAIM] = str(getattr(user, api_settings.USER_ID_FIELD))
+    token[VERSION_CLAIM] = user.token_version
+    _queue_outstanding(token, user)
+    return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # Tokens issued before the claim existed count as version 0
+        user = get_user(user_id, validated_token.get(VERSION_CLAIM, 0))
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
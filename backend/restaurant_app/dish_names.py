@@ -0,0 +1,57 @@
+"""
+Process-local index of dish name -> arabic name.
+
+Order items only store the dish name, so the arabic name has to be resolved
+from the Dish table when an order is serialized. Instead of querying Dish for
+every item, the whole name index is loaded with a single query and kept in
+memory until a Dish is saved or deleted (see the receivers in models.py).
+The TTL bounds how long other worker processes can serve a stale name.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = 0.0
+
+
+def _ttl():
+    return settings.DISH_NAME_INDEX_TTL
+
+
+def _load_index():
+    from restaurant_app.models import Dish
+
+    index = {}
+    # Dish is ordered by "-price", so keeping the first row per name matches
+    # the previous Dish.objects.filter(name=...).first() lookup.
+    for name, arabic_name in Dish.objects.values_list("name", "arabic_name"):
+        index.setdefault(name, arabic_name)
+    return index
+
+
+def get_index():
+    global _index, _loaded_at
+
+    index = _index
+    if index is not None and time.monotonic() - _loaded_at < _ttl():
+        return index
+
+    with _lock:
+        if _index is None or time.monotonic() - _loaded_at >= _ttl():
+            _index = _load_index()
+            _loaded_at = time.monotonic()
+        return _index
+
+
+def get_arabic_name(dish_name):
+    return get_index().get(dish_name)
+
+
+def invalidate():
+    global _index
+    with _lock:
+        _index = None
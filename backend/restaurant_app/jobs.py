@@ -0,0 +1,306 @@
+"""
+Database-backed background jobs.
+
+Tasks are plain functions registered with `@task` (see tasks.py) and
+queued with `enqueue(name, **payload)`. The payload must be JSON
+serializable. settings.JOB_TRANSPORT decides where a queued job goes:
+
+- DatabaseTransport (default) inserts a Job row that `manage.py run_worker`
+  claims and runs off the request thread;
+- ImmediateTransport runs the task in-process once the current transaction
+  commits, for development and tests.
+
+Attempts are counted when a worker claims a job. A failing job is retried
+with exponential backoff (JOB_RETRY_BACKOFF seconds, doubled per attempt,
+capped at JOB_RETRY_BACKOFF_MAX) until it has used max_attempts, then it is
+marked failed. Jobs left "running" by a worker that died are handed out
+again after JOB_LOCK_TIMEOUT seconds, or marked failed if that was their
+last attempt, so a job that kills its worker is not retried forever.
+JOB_QUEUE_LIMITS caps how many jobs of a queue run at once across all
+workers, e.g. to respect an SMS provider's rate limit: a running job of
+such a queue holds one of its numbered slots, and a unique index on the
+running jobs' (queue, slot) lets only one worker take each slot.
+
+A worker outlives database errors: a failed poll is logged and the next
+one tried, and the outcome of a job is written again if that fails, for
+up to OUTCOME_ATTEMPTS tries. An outcome that still could not be written
+leaves the job "running" until JOB_LOCK_TIMEOUT hands it out again, so a
+job may run more than once. Tasks named in JOB_SCHEDULE are queued by the
+workers themselves, again and again, that many seconds apart (see
+`schedule_periodic`).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple("Task", ["name", "func", "queue", "max_attempts"])
+
+_tasks = {}
+
+# Tries at writing a job's outcome, OUTCOME_PAUSE seconds apart and more
+OUTCOME_ATTEMPTS = 10
+OUTCOME_PAUSE = 0.05
+
+# When this process next looks at each JOB_SCHEDULE task, by name
+_schedule_checks = {}
+
+
+def task(name=None, queue="default", max_attempts=None):
+    """Register the decorated function as a task called `name`."""
+    def decorator(func):
+        task_name = name or func.__name__
+        _tasks[task_name] = Task(task_name, func, queue, max_attempts)
+        return func
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f"Unknown task {name!r}") from None
+
+
+def enqueue(name, run_at=None, **payload):
+    return import_string(settings.JOB_TRANSPORT)().send(get_task(name), payload, run_at)
+
+
+class DatabaseTransport:
+    def send(self, task, payload, run_at=None, periodic=False):
+        from restaurant_app.models import Job
+
+        return Job.objects.create(
+            name=task.name,
+            queue=task.queue,
+            payload=payload,
+            max_attempts=task.max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_at=run_at or timezone.now(),
+            periodic=periodic,
+        )
+
+
+class ImmediateTransport:
+    def send(self, task, payload, run_at=None):
+        transaction.on_commit(lambda: task.func(**payload))
+
+
+def retry_delay(attempts):
+    return timedelta(
+        seconds=min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+    )
+
+
+def _take(job, worker_id, now, slot=None):
+    """Mark `job` as running for this worker, unless another worker was first."""
+    from restaurant_app.models import Job
+
+    # Conditional update, so each job is won by exactly one worker; the
+    # attempts must match too, or it ran and failed since it was read
+    won = Job.objects.filter(pk=job.pk, status="pending", attempts=job.attempts).update(
+        status="running", locked_by=worker_id, locked_at=now, slot=slot, attempts=F("attempts") + 1
+    )
+    if won:
+        job.status, job.locked_by, job.locked_at, job.slot = "running", worker_id, now, slot
+        job.attempts += 1
+    return bool(won)
+
+
+def _take_slot(job, worker_id, now, slots, taken):
+    """_take for a job of a limited queue, in one of its `slots` not `taken` yet."""
+    for slot in range(slots):
+        if slot in taken:
+            continue
+        try:
+            with transaction.atomic():
+                won = _take(job, worker_id, now, slot)
+        except IntegrityError:
+            # Another worker took the slot since we looked
+            taken.add(slot)
+            continue
+        if won:
+            taken.add(slot)
+        return won
+    return False
+
+
+def claim(worker_id, limit, queues=None):
+    """Mark up to `limit` due jobs as running for this worker and return them."""
+    from restaurant_app.models import Job
+
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status="running", locked_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status="failed", finished_at=now, locked_by="", locked_at=None, slot=None,
+        last_error="The worker running the last attempt stopped before it finished.",
+    )
+    stale.update(status="pending", locked_by="", locked_at=None, slot=None)
+
+    queue_limits = settings.JOB_QUEUE_LIMITS
+    taken = {queue: set() for queue in queue_limits}
+    if queue_limits:
+        running = Job.objects.filter(status="running", queue__in=queue_limits).values_list("queue", "slot")
+        for queue, slot in running:
+            taken[queue].add(slot)
+
+    due = Job.objects.filter(status="pending", run_at__lte=now)
+    if queues:
+        due = due.filter(queue__in=queues)
+    exhausted = [queue for queue, slots in queue_limits.items() if len(taken[queue]) >= slots]
+    if exhausted:
+        due = due.exclude(queue__in=exhausted)
+
+    claimed = []
+    for job in due.order_by("run_at", "id")[:limit * 4]:
+        if len(claimed) == limit:
+            break
+        try:
+            if job.queue in queue_limits:
+                won = _take_slot(job, worker_id, now, queue_limits[job.queue], taken[job.queue])
+            else:
+                won = _take(job, worker_id, now)
+        except DatabaseError:
+            # Hand out the jobs already taken rather than leave them running
+            logger.warning("Could not claim job %s", job.pk, exc_info=True)
+            break
+        if won:
+            claimed.append(job)
+    return claimed
+
+
+def schedule_periodic(now=None):
+    """
+    Queue the next run of each JOB_SCHEDULE task that has no pending or
+    running job, JOB_SCHEDULE[name] seconds after its last run finished.
+
+    A process looks at each task once per its interval, with one query for
+    all of them. Only one pending or running periodic job per name fits
+    the unique index on Job, so of two workers queueing the same run, one
+    gets an IntegrityError and skips it. A name that is not a registered
+    task is logged and skipped instead of stopping the worker.
+    """
+    from restaurant_app.models import Job
+
+    now = now or timezone.now()
+    due = {
+        name: interval for name, interval in settings.JOB_SCHEDULE.items()
+        if _schedule_checks.get(name, now) <= now
+    }
+    if not due:
+        return []
+
+    state = {
+        row["name"]: row
+        for row in Job.objects.filter(name__in=due)
+        .values("name")
+        .annotate(
+            active=Count("id", filter=Q(status__in=("pending", "running"))),
+            last_run=Max("finished_at"),
+        )
+        .order_by()
+    }
+    created = []
+    for name, interval in due.items():
+        _schedule_checks[name] = now + timedelta(seconds=interval)
+        try:
+            task = get_task(name)
+        except LookupError:
+            logger.error("JOB_SCHEDULE names %r, which is not a registered task", name)
+            continue
+        row = state.get(name, {})
+        if row.get("active"):
+            continue
+        last_run = row.get("last_run")
+        run_at = max(last_run + timedelta(seconds=interval), now) if last_run else now
+        try:
+            with transaction.atomic():
+                created.append(DatabaseTransport().send(task, {}, run_at, periodic=True))
+        except IntegrityError:
+            # Another worker queued it first
+            continue
+    return created
+
+
+def _record(job, **outcome):
+    from restaurant_app.models import Job
+
+    for attempt in range(1, OUTCOME_ATTEMPTS + 1):
+        try:
+            Job.objects.filter(pk=job.pk).update(locked_by="", locked_at=None, slot=None, **outcome)
+            return
+        except DatabaseError:
+            if attempt == OUTCOME_ATTEMPTS:
+                logger.exception("Could not record the outcome of job %s (%s)", job.pk, job.name)
+                return
+            time.sleep(OUTCOME_PAUSE * attempt)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    try:
+        get_task(job.name).func(**job.payload)
+    except Exception:
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            outcome = {"status": "failed", "finished_at": now}
+        else:
+            outcome = {"status": "pending", "run_at": now + retry_delay(job.attempts)}
+        logger.warning("Job %s (%s) attempt %s failed", job.pk, job.name, job.attempts, exc_info=True)
+        _record(job, last_error=traceback.format_exc(), **outcome)
+        succeeded = False
+    else:
+        _record(job, status="done", finished_at=timezone.now())
+        succeeded = True
+    close_old_connections()
+    return succeeded
+
+
+def work(concurrency=1, queues=None, poll_interval=1.0, once=False, stop=None, worker_id=None):
+    """
+    Claim and run jobs on `concurrency` threads until `stop` is set, or,
+    with `once`, until no job is due. Returns the number of jobs run.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    processed = 0
+    running = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job") as pool:
+        while not stop.is_set():
+            running = {future for future in running if not future.done()}
+            try:
+                schedule_periodic()
+                jobs = claim(worker_id, concurrency - len(running), queues)
+            except DatabaseError:
+                logger.exception("Could not poll the job queue")
+                jobs = []
+            running.update(pool.submit(run_job, job) for job in jobs)
+            processed += len(jobs)
+
+            if once and not jobs and not running:
+                break
+            # Poll again right away while jobs are coming in and slots are free
+            if not jobs or len(running) == concurrency:
+                if running:
+                    wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    stop.wait(poll_interval)
+    close_old_connections()
+    return processed
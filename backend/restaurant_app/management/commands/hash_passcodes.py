@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from restaurant_app import passcodes
+from restaurant_app.models import User
+
+
+class Command(BaseCommand):
+    help = "Replace the plaintext passcodes left in the users table with their keyed hash."
+
+    def handle(self, *args, **options):
+        hashed = 0
+        for user in User.objects.exclude(passcode="").exclude(passcode__startswith=passcodes.PREFIX):
+            # save() hashes it
+            user.save(update_fields=["passcode"])
+            hashed += 1
+        self.stdout.write(self.style.SUCCESS(f"Hashed {hashed} passcodes."))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from restaurant_app import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "Latency percentiles, query counts and N+1 suspects per endpoint, from the "
+        "profiling data the server processes published to the cache (PERF_PROFILING)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="print the report as JSON")
+        parser.add_argument("--limit", type=int, default=40, help="endpoints shown, slowest p95 first")
+
+    def handle(self, *args, **options):
+        report = profiling.report()
+        report["endpoints"] = report["endpoints"][:options["limit"]]
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if not report["endpoints"]:
+            self.stdout.write(
+                "No profiling data. Turn PERF_PROFILING on, and use a cache shared with the "
+                "server processes, or read /api/_perf/ instead."
+            )
+            return
+
+        self.stdout.write(
+            f"{report['processes']} processes, last {report['window_minutes']} minutes. "
+            f"Latencies in ms (p50/p95/p99):"
+        )
+        self.stdout.write(f"{'endpoint':<50} {'requests':>8}  {'total':>22}  {'db':>22}  "
+                          f"{'serializer':>22}  {'queries':>12}")
+        for row in report["endpoints"]:
+            timings = [
+                "/".join(f"{row[f'{field}_p{percent}_ms']:g}" for percent in profiling.PERCENTILES)
+                for field in ("total", "db", "serializer")
+            ]
+            queries = f"{row['queries_mean']:g} (max {row['queries_max']})"
+            self.stdout.write(f"{row['endpoint']:<50} {row['requests']:>8}  {timings[0]:>22}  "
+                              f"{timings[1]:>22}  {timings[2]:>22}  {queries:>12}")
+            for suspect in row["n_plus_one"]:
+                self.stdout.write(self.style.WARNING(
+                    f"    N+1 suspect in {suspect['requests']} requests, up to {suspect['max_repeats']} "
+                    f"times: {suspect['sql'][:160]}"
+                ))
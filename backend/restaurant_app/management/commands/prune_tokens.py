@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant_app import token_tables
+
+
+class Command(BaseCommand):
+    help = "Delete expired JWT refresh tokens from the outstanding and blacklisted token tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.TOKEN_PRUNE_BATCH_SIZE,
+                            help="tokens deleted per transaction")
+        parser.add_argument("--pause", type=float, default=settings.TOKEN_PRUNE_PAUSE,
+                            help="seconds to wait between batches")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        outstanding, blacklisted = token_tables.prune(batch_size=options["batch_size"], pause=options["pause"])
+        metrics = token_tables.metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {outstanding} outstanding and {blacklisted} blacklisted tokens. "
+            f"{metrics['outstanding_tokens']} outstanding and {metrics['blacklisted_tokens']} blacklisted "
+            f"tokens left, blacklist check {metrics['blacklist_check_ms']} ms."
+        ))
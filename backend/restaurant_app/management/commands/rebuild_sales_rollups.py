@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from restaurant_app import rollups
+from restaurant_app.models import DailyDishRollup, DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales and dish rollups from the orders table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from-date", help="first day to rebuild (YYYY-MM-DD), default: all history")
+        parser.add_argument("--to-date", help="last day to rebuild (YYYY-MM-DD), default: today")
+
+    def handle(self, *args, **options):
+        from_date = self._parse(options["from_date"], "--from-date")
+        to_date = self._parse(options["to_date"], "--to-date")
+        if from_date and to_date and from_date > to_date:
+            raise CommandError("--from-date must not be after --to-date")
+
+        rollups.rebuild(from_date, to_date)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups: {DailySalesRollup.objects.count()} sales rows, "
+            f"{DailyDishRollup.objects.count()} dish rows in total."
+        ))
+
+    def _parse(self, value, option):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if not parsed:
+            raise CommandError(f"{option} must be a date in YYYY-MM-DD format")
+        return parsed
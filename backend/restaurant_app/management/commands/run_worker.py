@@ -0,0 +1,40 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant_app import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (SMS, order PDFs, order side effects)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="jobs run at the same time")
+        parser.add_argument("--queue", action="append", dest="queues",
+                            help="only run jobs of this queue (repeatable), default: all queues")
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="seconds to wait when no job is due")
+        parser.add_argument("--once", action="store_true", help="exit when no job is due")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1")
+
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping after the running jobs finish...")
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        processed = jobs.work(
+            concurrency=options["concurrency"],
+            queues=options["queues"],
+            poll_interval=options["poll_interval"],
+            once=options["once"],
+            stop=stop,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Worker stopped after {processed} jobs."))
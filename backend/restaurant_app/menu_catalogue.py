@@ -0,0 +1,63 @@
+"""
+Pre-rendered menu catalogue for the POS terminals.
+
+The whole menu (categories, dishes, sizes and variants) is serialized in a
+fixed number of queries and the rendered JSON is cached under the current
+catalogue version. Saving or deleting a Category, Dish, DishSize or
+DishVariant bumps the version (see the receivers in models.py), so the
+next request renders it again.
+
+The ETag is a hash of the rendered document, so a terminal that already
+has the current menu gets a 304. Rendered documents also expire after
+MENU_CATALOGUE_CACHE_TIMEOUT seconds. That bounds how stale another
+process can be when the cache backend is not shared between processes
+(the default local-memory cache).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = "menu-catalogue:version"
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+
+
+def build(request=None):
+    from restaurant_app.models import Category, Dish
+    from restaurant_app.serializers import CategorySerializer, MenuCatalogueDishSerializer
+
+    context = {"request": request}
+    dishes = Dish.objects.prefetch_related("size", "variants")
+    return {
+        "categories": CategorySerializer(Category.objects.all(), many=True, context=context).data,
+        "dishes": MenuCatalogueDishSerializer(dishes, many=True, context=context).data,
+    }
+
+
+def get_rendered(request):
+    """Return (etag, JSON bytes) of the current catalogue."""
+    from rest_framework.renderers import JSONRenderer
+
+    # Image URLs are absolute, so the document depends on the host asked
+    key = f"menu-catalogue:{get_version()}:{request.scheme}://{request.get_host()}"
+    rendered = cache.get(key)
+    if rendered is None:
+        content = JSONRenderer().render(build(request))
+        rendered = (f'"{hashlib.md5(content).hexdigest()}"', content)
+        cache.set(key, rendered, timeout=settings.MENU_CATALOGUE_CACHE_TIMEOUT)
+    return rendered
@@ -1,7 +1,7 @@
 from datetime import timedelta
 from django.db import models,transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
@@ -9,6 +9,8 @@ from django.core.exceptions import ValidationError
 
 from transactions_app.models import MainGroup,Ledger
 from .utils import default_time_period
+from sequences import counters
+from . import authentication, dish_names, menu_catalogue, order_effects, passcodes, realtime, rollups
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,13 +28,36 @@ class User(AbstractUser):
         ("other", "Other"),
     )
     role = models.CharField(max_length=10, choices=ROLES, blank=True, null=True)
-    passcode = models.CharField(max_length=6, unique=True)
+    # Keyed hash of the six digit passcode, see passcodes.py
+    passcode = models.CharField(max_length=80, unique=True, validators=[passcodes.validate_stored_passcode])
     gender = models.CharField(max_length=10, choices=GENDERS, null=True, blank=True)
     mobile_number = models.CharField(max_length=15, blank=True)
+    # Claimed by the tokens issued to the user, see authentication.py
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+    # Changing any of these revokes the tokens issued so far
+    TOKEN_FIELDS = ("role", "is_active", "password")
 
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields():
+            instance._token_state = instance.token_state()
+        return instance
+
+    def token_state(self):
+        return tuple(getattr(self, field) for field in self.TOKEN_FIELDS)
+
+    def validate_unique(self, exclude=None):
+        # The unique index holds hashes, compare the passcode as it will be stored
+        check_passcode = not exclude or "passcode" not in exclude
+        super().validate_unique(exclude={*(exclude or ()), "passcode"})
+        if check_passcode and self.passcode and passcodes.in_use(self.passcode, exclude_pk=self.pk):
+            raise ValidationError({"passcode": "A user with this passcode already exists."})
+
     def save(self, *args, **kwargs):
         if self.role == "admin":
             self.is_staff = True
@@ -47,7 +72,19 @@ class User(AbstractUser):
         if self.password and not self.password.startswith("pbkdf2_"):
             self.password = make_password(self.password)
 
+        if self.passcode and not passcodes.is_hashed(self.passcode):
+            self.passcode = passcodes.make_passcode(self.passcode)
+
+        previous_version = self.token_version
+        if getattr(self, "_token_state", self.token_state()) != self.token_state():
+            self.token_version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "token_version"}
+
         super().save(*args, **kwargs)
+        self._token_state = self.token_state()
+        authentication.invalidate(self.pk, previous_version)
+        passcodes.invalidate(self.pk)
 
 class LogoInfo(models.Model):
     company_name = models.CharField(max_length=255,blank=True, null=True)
@@ -110,6 +147,9 @@ class Dish(models.Model):
     def __str__(self):
         return self.name
 
+
+
+
 class DishSize(models.Model):
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name="size")
     size = models.CharField(max_length=20)
@@ -134,6 +174,31 @@ class DishVariant(models.Model):
     def __str__(self):
         return f"{self.name} ({self.dish.name})"
 
+
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    authentication.invalidate(instance.pk, instance.token_version)
+    passcodes.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+def invalidate_dish_name_index(sender, **kwargs):
+    dish_names.invalidate()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=DishSize)
+@receiver(post_delete, sender=DishSize)
+@receiver(post_save, sender=DishVariant)
+@receiver(post_delete, sender=DishVariant)
+def invalidate_menu_catalogue(sender, **kwargs):
+    menu_catalogue.bump_version()
+
+
 class OnlineOrder(models.Model):
     """
     Model representing an online third party platform for ordering with a name, percentage, and reference.
@@ -190,6 +255,13 @@ class CustomerDetails(models.Model):
         return f"{self.customer_name} - {self.phone_number}"
 
 
+def next_invoice_number():
+    # Invoice numbers used to be the order id, so the counter continues from there
+    return counters.next_value(
+        "invoice", initial=lambda: Order.objects.aggregate(last=models.Max("id"))["last"] or 0
+    )
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -257,19 +329,66 @@ class Order(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
-
+        # Access paths of the order list and the reports: every report
+        # filters on a created_at range, usually together with one of these
+        indexes = [
+            models.Index(fields=["-created_at"], name="order_created_at_idx"),
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            models.Index(fields=["order_type", "created_at"], name="order_type_created_idx"),
+            models.Index(fields=["user", "created_at"], name="order_user_created_idx"),
+            models.Index(
+                fields=["customer_phone_number", "created_at"],
+                name="order_phone_created_idx",
+            ),
+            models.Index(
+                fields=["delivery_driver_id", "created_at"],
+                name="order_driver_created_idx",
+                condition=models.Q(delivery_driver_id__isnull=False),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if rollups.enabled() and rollups.ORDER_SOURCE_FIELDS.issubset(field_names):
+            rollups.remember_order(instance)
+        if order_effects.watched_fields().issubset(field_names):
+            order_effects.remember(instance)
+        return instance
 
     def __str__(self):
         return f"{self.id} - {self.created_at} - {self.order_type}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        if self.invoice_number:
+            return super().save(*args, **kwargs)
 
-        if not self.invoice_number:
+        # The number is taken in the same transaction as the write, so a
+        # rollback hands it back and the invoice sequence stays gap-free
+        with transaction.atomic(savepoint=False):
             self.invoice_number = (
-                f"{self.id:04d}"  # Generates an invoice number with leading zeros
+                f"{next_invoice_number():04d}"  # Invoice number with leading zeros
             )
-            self.save(update_fields=["invoice_number"])
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "invoice_number"}
+            super().save(*args, **kwargs)
+
+    def add_items(self, items):
+        """
+        Insert unsaved OrderItems for this order in a single statement.
+
+        bulk_create does not send post_save, so the rollup update the
+        OrderItem receivers would make is applied here for the whole batch.
+        """
+        if not items:
+            return items
+        for item in items:
+            item.order = self
+        OrderItem.objects.bulk_create(items)
+        if rollups.enabled():
+            rollups.items_saved(self, items)
+        publish_items_added(self, items)
+        return items
 
     def is_delivery_order(self):
         if not self.delivery_driver_id:
@@ -299,8 +418,11 @@ class Order(models.Model):
         self.save(update_fields=["total_amount"])
 
 
-@receiver(post_save, sender=Order)
-def create_customer_details(sender, instance, **kwargs):
+@order_effects.register(
+    "create_customer_details",
+    fields=["customer_phone_number", "customer_name", "address", "order_type"],
+)
+def create_customer_details(instance, created):
     # Check if the order type is "delivery"
     if instance.customer_phone_number != "" and instance.customer_name != "" and instance.address != "" and instance.order_type != "onlinedelivery":
         if instance.order_type == "delivery" or instance.order_type == "dining" or instance.order_type == "takeaway":
@@ -316,17 +438,205 @@ def create_customer_details(sender, instance, **kwargs):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     dish_name = models.CharField(max_length=200)
+    # Snapshot of Dish.arabic_name taken when the item is created, only
+    # written when settings.ORDER_ITEM_ARABIC_NAME_SNAPSHOT is enabled.
+    arabic_name = models.CharField(max_length=200, blank=True, null=True)
     price = models.DecimalField(max_digits=6, decimal_places=2)
     size_name = models.CharField(max_length=20, blank=True, null=True)
     quantity = models.PositiveIntegerField(default=1)
     is_newly_added = models.BooleanField(default=False)
     variants = models.JSONField(default=list)
 
+    class Meta:
+        indexes = [
+            # product_wise_report and the dashboard filter and group by dish
+            models.Index(fields=["dish_name", "order"], name="orderitem_dish_order_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if rollups.enabled() and rollups.ITEM_SOURCE_FIELDS.issubset(field_names):
+            rollups.remember_item(instance)
+        return instance
+
     def __str__(self):
         size_info = f" - {self.size_name}" if self.size_name else ""
         return f"{self.order.id} - {self.dish_name}{size_info} - {self.quantity}"
 
 
+class DailySalesRollup(models.Model):
+    """
+    Per-day order totals by order type, payment method and status.
+
+    Maintained incrementally from Order saves (see restaurant_app.rollups)
+    and rebuilt with `manage.py rebuild_sales_rollups`.
+    """
+    date = models.DateField()
+    order_type = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cash_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    bank_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credit_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivery_charge = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ("date",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "order_type", "payment_method", "status"],
+                name="unique_daily_sales_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.order_type} - {self.payment_method} - {self.status}"
+
+
+class DailyDishRollup(models.Model):
+    """
+    Per-day, per-dish item totals, keyed like DailySalesRollup.
+    """
+    date = models.DateField()
+    dish_name = models.CharField(max_length=200)
+    order_type = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    line_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ("date", "dish_name")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "dish_name", "order_type", "payment_method", "status"],
+                name="unique_daily_dish_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.dish_name} - {self.status}"
+
+
+class Job(models.Model):
+    """
+    Background job in the database queue (see jobs.py).
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    queue = models.CharField(max_length=50, default="default")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    # Which of its queue's JOB_QUEUE_LIMITS slots a running job holds
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Queued by jobs.schedule_periodic for a JOB_SCHEDULE task
+    periodic = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
+        constraints = [
+            # Two workers cannot take the same slot, so a queue never runs
+            # more jobs at once than it has slots
+            models.UniqueConstraint(
+                fields=["queue", "slot"], condition=models.Q(status="running"), name="job_running_slot_unique",
+            ),
+            # One queued run of a periodic task at a time, however many
+            # workers schedule it
+            models.UniqueConstraint(
+                fields=["name"], condition=models.Q(periodic=True, status__in=("pending", "running")),
+                name="job_periodic_active_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} - {self.status}"
+
+
+@receiver(pre_save, sender=Order)
+def load_order_rollup_state(sender, instance, **kwargs):
+    # Instances built without going through from_db (or with deferred
+    # fields) need their stored contribution before it is overwritten
+    if rollups.enabled() and instance.pk and not hasattr(instance, "_rollup_sales"):
+        stored = Order.objects.filter(pk=instance.pk).first()
+        if stored:
+            instance._rollup_key = stored._rollup_key
+            instance._rollup_sales = stored._rollup_sales
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, created, **kwargs):
+    if rollups.enabled():
+        rollups.order_saved(instance, created)
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order_rollups(sender, instance, **kwargs):
+    # Sent before the cascade deletes the items
+    if rollups.enabled():
+        rollups.order_deleting(instance)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_rollups(sender, instance, **kwargs):
+    if rollups.enabled():
+        rollups.order_deleted(instance)
+
+
+@receiver(pre_save, sender=OrderItem)
+def load_order_item_rollup_state(sender, instance, **kwargs):
+    if rollups.enabled() and instance.pk and not hasattr(instance, "_rollup_item"):
+        stored = OrderItem.objects.filter(pk=instance.pk).first()
+        if stored:
+            instance._rollup_item = stored._rollup_item
+
+
+@receiver(post_save, sender=OrderItem)
+def update_order_item_rollups(sender, instance, created, **kwargs):
+    if rollups.enabled():
+        rollups.items_saved(instance.order, [instance], created=created)
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_order_item_rollups(sender, instance, **kwargs):
+    if rollups.enabled():
+        rollups.item_deleted(instance)
+
+
+def publish_items_added(order, items):
+    realtime.publish({
+        "type": "order.items_added",
+        "order_id": order.pk,
+        "items": [realtime.item_payload(item) for item in items],
+    })
+
+
+@receiver(post_save, sender=OrderItem)
+def publish_order_item(sender, instance, created, **kwargs):
+    if created:
+        publish_items_added(instance.order, [instance])
+
+
 class Bill(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="bills")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bills")
@@ -336,6 +646,9 @@ class Bill(models.Model):
 
     class Meta:
         ordering = ("-billed_at",)
+        indexes = [
+            models.Index(fields=["-billed_at", "-id"], name="bill_billed_at_idx"),
+        ]
 
     def __str__(self):
         return f"Bill for order {self.order.id}"
@@ -367,17 +680,47 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="notification_created_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.message[:50]}..."
 
 
+@order_effects.register("create_notification_for_orders")
+def create_notification_for_orders(instance, created):
+    Notification.objects.create(
+        message=f"New order created: Order #{instance.id} with a total amount of QAR {instance.total_amount}"
+    )
+
+
+@order_effects.register("publish_order_event", fields=["status"])
+def publish_order_event(instance, created):
+    realtime.publish({
+        "type": "order.created" if created else "order.status_changed",
+        "order": realtime.order_payload(instance),
+    })
+
+
 @receiver(post_save, sender=Order)
-def create_notification_for_orders(sender, instance, created, **kwargs):
+def dispatch_order_effects(sender, instance, created, update_fields=None, **kwargs):
+    # Single entry point for the order side effects, run after commit
+    order_effects.dispatch(instance, created, update_fields)
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(
-            message=f"New order created: Order #{instance.id} with a total amount of QAR {instance.total_amount}"
-        )
+        realtime.publish({
+            "type": "notification.created",
+            "notification": {
+                "id": instance.pk,
+                "user_id": instance.user_id,
+                "message": instance.message,
+                "created_at": instance.created_at,
+            },
+        })
 
 
 @receiver(post_save, sender=Bill)
@@ -0,0 +1,144 @@
+"""
+Side effects of order writes, run once the transaction has committed.
+
+Apps register an effect with the order fields it depends on. A single
+post_save receiver (see models.py) works out which of those fields the
+save actually changed and schedules the matching effects with
+`transaction.on_commit`. A status flip therefore no longer re-runs the
+customer lookup or the delivery assignment, and nothing runs for a write
+that is rolled back.
+
+Effects registered with `in_transaction` are the exception: they run
+right away, inside the transaction writing the order, and an error in one
+rolls the order back. That is for rows the order must not exist without,
+like its DeliveryOrder.
+
+The others are handed to settings.ORDER_EFFECTS_RUNNER. The default runner
+calls them in-process right after the commit; one that fails is queued as
+a `run_order_effects` job of its own, so the worker retries it with
+backoff instead of it being lost. A background worker runner only needs to
+record (order id, effect names, created) and call `run_by_id` later.
+"""
+import logging
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+Effect = namedtuple("Effect", ["name", "handler", "fields", "on_create", "in_transaction"])
+
+_effects = {}
+
+# Seconds spent trying to queue a failed effect again, QUEUE_PAUSE at most
+# between tries; as long as SQLite waits for a lock by default
+QUEUE_TIMEOUT = 5
+QUEUE_PAUSE = 0.05
+
+
+def register(name, fields=(), on_create=True, in_transaction=False):
+    """
+    Register `handler(order, created)` as an order side effect.
+
+    It runs when an order is created (if `on_create`) and when a save
+    changes any of `fields`: after the commit, or, with `in_transaction`,
+    during the save itself.
+    """
+    def decorator(handler):
+        _effects[name] = Effect(name, handler, frozenset(fields), on_create, in_transaction)
+        return handler
+    return decorator
+
+
+def watched_fields():
+    return frozenset().union(*(effect.fields for effect in _effects.values()))
+
+
+def remember(order):
+    """Record the watched field values the order currently has."""
+    order._effect_state = {field: getattr(order, field) for field in watched_fields()}
+
+
+def changed_fields(order, update_fields=None):
+    previous = getattr(order, "_effect_state", None)
+    if previous is None:
+        # Nothing to compare against: assume whatever was written changed
+        return set(update_fields) if update_fields is not None else set(watched_fields())
+    return {field for field, value in previous.items() if getattr(order, field) != value}
+
+
+def dispatch(order, created, update_fields=None):
+    """Schedule the effects concerned by this save of `order`."""
+    changed = set() if created else changed_fields(order, update_fields)
+    remember(order)
+    names = []
+    for effect in _effects.values():
+        if not (effect.on_create if created else effect.fields & changed):
+            continue
+        if effect.in_transaction:
+            effect.handler(order, created)
+        else:
+            names.append(effect.name)
+    if not names:
+        return
+    runner = import_string(settings.ORDER_EFFECTS_RUNNER)
+    transaction.on_commit(lambda: runner(order, names, created))
+
+
+def _retry_later(order_id, name, created):
+    from restaurant_app import jobs
+
+    # The effect most likely failed on a busy database, which the insert
+    # of the job can run into as well
+    deadline = time.monotonic() + QUEUE_TIMEOUT
+    while True:
+        try:
+            job = jobs.enqueue("run_order_effects", run_at=timezone.now() + jobs.retry_delay(1),
+                               order_id=order_id, names=[name], created=created)
+        except Exception:
+            if time.monotonic() > deadline:
+                logger.exception("Order effect %s failed for order %s and could not be queued again",
+                                 name, order_id)
+                return
+            time.sleep(random.uniform(0, QUEUE_PAUSE))
+        else:
+            logger.warning("Order effect %s failed for order %s, retrying as job %s",
+                           name, order_id, getattr(job, "pk", None), exc_info=True)
+            return
+
+
+def run_now(order, names, created):
+    """Default runner: call the effects in this process."""
+    for name in names:
+        try:
+            _effects[name].handler(order, created)
+        except Exception:
+            # The order is already committed; one failing effect must not
+            # stop the others or turn the request into an error
+            _retry_later(order.pk, name, created)
+
+
+def run_by_id(order_id, names, created):
+    """
+    Entry point for workers that only stored the order id. The error of a
+    single effect propagates, so that the job is retried; of several, each
+    failing one is queued again on its own, so that the retries do not run
+    the others twice.
+    """
+    from restaurant_app.models import Order
+
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        logger.warning("Order %s no longer exists, skipping effects %s", order_id, names)
+        return
+    if len(names) == 1:
+        _effects[names[0]].handler(order, created)
+        return
+    run_now(order, names, created)
@@ -0,0 +1,138 @@
+"""
+Keyset (cursor) pagination that clients opt into.
+
+PageNumberPagination needs a COUNT(*) and an OFFSET that grows with the
+page number. With `?pagination=cursor` the listings below switch to keyset
+pagination instead: each page is fetched with a WHERE on the sort key of
+the last row seen, so page 1000 costs the same as page 1. The sort key
+always ends with the primary key, so it is unique and rows inserted while
+a client is paging never shift or repeat the pages it has not read yet.
+
+The keyset order is the view's `cursor_ordering`, or the model's
+Meta.ordering followed by "-id". Requests without the opt-in parameter
+keep the page number behaviour, so clients can move over one at a time.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def use_keyset(self, request):
+        return request.query_params.get(self.mode_query_param) == "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = [self._flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, reverse))
+
+        # One extra row tells whether there is another page in this direction
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            if has_more or reverse:
+                self.next_position = self.position_of(rows[-1])
+            if position is not None and (has_more or not reverse):
+                self.previous_position = self.position_of(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            "next": self.link(self.next_position, reverse=False),
+            "previous": self.link(self.previous_position, reverse=True),
+            "results": data,
+        })
+
+    def get_ordering(self, queryset, view):
+        ordering = list(getattr(view, "cursor_ordering", None) or queryset.model._meta.ordering)
+        if not ordering or ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering.append("-id")
+        return ordering
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def after(self, position, reverse):
+        """
+        Rows strictly after `position` in the keyset order, e.g. for
+        ("-created_at", "-id"):
+
+            created_at <= c AND (created_at < c OR id < i)
+
+        The leading range keeps the filter usable by an index on the first
+        field; the OR only refines the rows that tie on it.
+        """
+        fields = [(field.lstrip("-"), field.startswith("-") != reverse) for field in self.ordering]
+        (first, first_desc), first_value = fields[0], position[0]
+
+        strictly_after = Q()
+        equal = {}
+        for (name, descending), value in zip(fields, position):
+            strictly_after |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": value})
+            equal[name] = value
+        return Q(**{f"{first}__{'lte' if first_desc else 'gte'}": first_value}) & strictly_after
+
+    def position_of(self, row):
+        # Model instances, or dicts from the compact view (projections.py)
+        if isinstance(row, dict):
+            return [row[field.lstrip("-")] for field in self.ordering]
+        return [getattr(row, field.lstrip("-")) for field in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        payload = {"p": [value.isoformat() if hasattr(value, "isoformat") else value for value in position]}
+        if reverse:
+            payload["r"] = 1
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = payload["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get("r"))
+
+    def link(self, position, reverse):
+        if position is None:
+            return None
+        url = remove_query_param(self.base_url, self.page_query_param)
+        url = replace_query_param(url, self.mode_query_param, "cursor")
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
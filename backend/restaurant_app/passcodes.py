@@ -0,0 +1,83 @@
+"""
+Passcode login for the POS terminals.
+
+Passcodes are stored as a keyed hash, "hmac$" followed by the HMAC-SHA256
+of the passcode under settings.PASSCODE_HASH_KEY (User.save hashes them).
+The hash is deterministic, so a login finds its user with one lookup on
+the unique passcode index. Rows still holding a plaintext passcode match
+too, and are hashed on their first login; `manage.py hash_passcodes`
+converts them all at once. Changing PASSCODE_HASH_KEY invalidates every
+stored passcode.
+
+Because of the hash, the model's own unique check cannot compare a new
+passcode with the stored ones; `in_use` does, and User.validate_unique
+and UserSerializer call it.
+
+The user data returned by the login is cached per user until the user or
+its driver profile is saved or deleted (see the receivers in models.py),
+so a shift change does not serialize the same users over and over.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.validators import RegexValidator
+from django.utils.crypto import salted_hmac
+
+
+PREFIX = "hmac$"
+LENGTH = 6
+
+validate_passcode = RegexValidator(
+    rf"^[0-9]{{{LENGTH}}}\Z", f"Enter a passcode of exactly {LENGTH} digits.", code="invalid_passcode"
+)
+
+
+def validate_stored_passcode(passcode):
+    """Validator of User.passcode: a hash already stored, or a new passcode."""
+    if not is_hashed(passcode):
+        validate_passcode(passcode)
+
+
+def make_passcode(passcode):
+    digest = salted_hmac("restaurant_app.passcodes", passcode, secret=settings.PASSCODE_HASH_KEY, algorithm="sha256")
+    return PREFIX + digest.hexdigest()
+
+
+def is_hashed(passcode):
+    return passcode.startswith(PREFIX)
+
+
+def in_use(passcode, exclude_pk=None):
+    """Whether another user than `exclude_pk` has this passcode."""
+    from restaurant_app.models import User
+
+    candidates = [passcode] if is_hashed(passcode) else [make_passcode(passcode), passcode]
+    return User.objects.filter(passcode__in=candidates).exclude(pk=exclude_pk).exists()
+
+
+def find_user(passcode):
+    """The user with this passcode, or None."""
+    from restaurant_app.models import User
+
+    user = User.objects.filter(passcode__in=[make_passcode(passcode), passcode]).first()
+    if user is not None and not is_hashed(user.passcode):
+        user.save(update_fields=["passcode"])
+    return user
+
+
+def _key(user_id):
+    return f"login-user:{user_id}"
+
+
+def user_payload(user):
+    """UserSerializer data of `user`, from the cache when possible."""
+    from restaurant_app.serializers import UserSerializer
+
+    payload = cache.get(_key(user.pk))
+    if payload is None:
+        payload = dict(UserSerializer(user).data)
+        cache.set(_key(user.pk), payload, timeout=settings.PASSCODE_LOGIN_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
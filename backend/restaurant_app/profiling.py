@@ -0,0 +1,327 @@
+"""
+Per-endpoint request profiling, turned on with settings.PERF_PROFILING.
+
+PerfMiddleware records, for every request, its total latency, the number
+of SQL queries and the time spent in them, and the time spent in DRF
+serializers (validation and `.data`, including the queries those trigger).
+Requests are keyed by the view that served them and the viewset action,
+e.g. "OrderViewSet.list" or "PasscodeLoginView.post".
+
+Timings go into log-scale histograms (buckets BUCKET_GROWTH apart), one
+set per endpoint and minute, and the last PERF_WINDOW_MINUTES minutes are
+kept, so percentiles describe recent traffic and the memory used stays
+bounded. Histograms add up, so the ones of several worker processes can
+be merged: every PERF_PUBLISH_INTERVAL seconds a process copies its own to
+the Django cache, where /api/_perf/ and `manage.py perf_report` read them.
+The list of publishing processes expires with their snapshots, and a
+report drops the processes whose snapshot has expired. That needs a cache
+shared between the processes; with the default local-memory cache,
+/api/_perf/ only reports the process answering it and perf_report (a
+process of its own) finds nothing.
+
+A request that runs the same SQL statement (its text with the parameters
+left out) PERF_N_PLUS_ONE_THRESHOLD times or more is counted as an N+1
+suspect for that statement.
+
+A streaming response (report exports, the order board event stream) is
+timed until the view returns it, not until its last byte.
+"""
+import contextvars
+import math
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+BUCKET_GROWTH = 1.1
+# Upper bound of bucket 0, in milliseconds
+BUCKET_BASE = 0.1
+PERCENTILES = (50, 95, 99)
+# Statements kept per endpoint among the N+1 suspects
+MAX_SUSPECTS = 10
+
+PROCESSES_KEY = "perf:processes"
+
+_current = contextvars.ContextVar("perf_request", default=None)
+_lock = threading.Lock()
+# Minute -> {endpoint: stats}
+_minutes = deque()
+_published_at = 0.0
+
+
+def _process_key():
+    # Not computed at import: forked workers would share it
+    return f"perf:{socket.gethostname()}:{os.getpid()}"
+
+
+class RequestRecord:
+    __slots__ = ("endpoint", "queries", "db_ms", "serializer_ms", "in_serializer", "statements")
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serializer_ms = 0.0
+        self.in_serializer = False
+        self.statements = Counter()
+
+
+def _execute(execute, sql, params, many, context):
+    # Installed on every connection. The context variable also reaches
+    # the threads sync views run in under ASGI.
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.db_ms += (time.perf_counter() - started) * 1000
+        current.queries += 1
+        current.statements[sql] += 1
+
+
+def _install_execute_wrapper(sender, connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _bucket(ms):
+    if ms <= BUCKET_BASE:
+        return 0
+    return math.ceil(math.log(ms / BUCKET_BASE, BUCKET_GROWTH))
+
+
+def _bucket_bound(index):
+    return round(BUCKET_BASE * BUCKET_GROWTH ** index, 2)
+
+
+def _new_stats():
+    return {"requests": 0, "queries": 0, "max_queries": 0,
+            "total_ms": Counter(), "db_ms": Counter(), "serializer_ms": Counter(), "suspects": {}}
+
+
+def statement_shape(sql):
+    """`sql` with its IN (...) lists collapsed, so that batches of any size match."""
+    return re.sub(r"\((?:%s, )+%s\)", "(...)", sql)
+
+
+def record_request(current, total_ms):
+    minute = int(time.time() // 60)
+    shapes = Counter()
+    for sql, count in current.statements.items():
+        shapes[statement_shape(sql)] += count
+    threshold = settings.PERF_N_PLUS_ONE_THRESHOLD
+    repeated = [(shape, count) for shape, count in shapes.items() if count >= threshold]
+    with _lock:
+        if not _minutes or _minutes[-1][0] != minute:
+            _minutes.append((minute, {}))
+        while _minutes[0][0] <= minute - settings.PERF_WINDOW_MINUTES:
+            _minutes.popleft()
+        stats = _minutes[-1][1].setdefault(current.endpoint, _new_stats())
+        stats["requests"] += 1
+        stats["queries"] += current.queries
+        stats["max_queries"] = max(stats["max_queries"], current.queries)
+        stats["total_ms"][_bucket(total_ms)] += 1
+        stats["db_ms"][_bucket(current.db_ms)] += 1
+        stats["serializer_ms"][_bucket(current.serializer_ms)] += 1
+        for shape, count in repeated:
+            suspect = stats["suspects"].get(shape)
+            if suspect is None and len(stats["suspects"]) >= MAX_SUSPECTS:
+                continue
+            suspect = suspect or {"requests": 0, "max_repeats": 0}
+            suspect["requests"] += 1
+            suspect["max_repeats"] = max(suspect["max_repeats"], count)
+            stats["suspects"][shape] = suspect
+
+
+def _merge(into, stats):
+    into["requests"] += stats["requests"]
+    into["queries"] += stats["queries"]
+    into["max_queries"] = max(into["max_queries"], stats["max_queries"])
+    for field in ("total_ms", "db_ms", "serializer_ms"):
+        into[field].update(stats[field])
+    for shape, suspect in stats["suspects"].items():
+        merged = into["suspects"].setdefault(shape, {"requests": 0, "max_repeats": 0})
+        merged["requests"] += suspect["requests"]
+        merged["max_repeats"] = max(merged["max_repeats"], suspect["max_repeats"])
+
+
+def snapshot():
+    """This process' stats over the window, per endpoint."""
+    oldest = int(time.time() // 60) - settings.PERF_WINDOW_MINUTES
+    merged = {}
+    with _lock:
+        for minute, endpoints in _minutes:
+            if minute <= oldest:
+                continue
+            for endpoint, stats in endpoints.items():
+                _merge(merged.setdefault(endpoint, _new_stats()), stats)
+    return merged
+
+
+def publish(force=False):
+    """Copy this process' snapshot to the cache, at most every PERF_PUBLISH_INTERVAL seconds."""
+    global _published_at
+
+    now = time.monotonic()
+    if not force and now - _published_at < settings.PERF_PUBLISH_INTERVAL:
+        return
+    _published_at = now
+    key = _process_key()
+    timeout = settings.PERF_WINDOW_MINUTES * 60
+    cache.set(key, snapshot(), timeout=timeout)
+    # Written every time, so it outlives the last snapshot published, and
+    # adds back a key a concurrent report() pruned
+    cache.set(PROCESSES_KEY, cache.get(PROCESSES_KEY, set()) | {key}, timeout=timeout)
+
+
+def reset():
+    with _lock:
+        _minutes.clear()
+    cache.delete(_process_key())
+
+
+def _percentile(histogram, percent):
+    count = sum(histogram.values())
+    if not count:
+        return None
+    rank = math.ceil(count * percent / 100)
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= rank:
+            return _bucket_bound(index)
+
+
+def report():
+    """
+    Percentiles and N+1 suspects per endpoint, over the snapshots published
+    by every process and this process' own, slowest p95 first.
+    """
+    processes = cache.get(PROCESSES_KEY, set())
+    published = cache.get_many(processes)
+    expired = processes - published.keys()
+    if expired:
+        # Processes that stopped publishing more than a window ago
+        cache.set(PROCESSES_KEY, processes - expired, timeout=settings.PERF_WINDOW_MINUTES * 60)
+    published[_process_key()] = snapshot()
+    published = {key: endpoints for key, endpoints in published.items() if endpoints}
+    merged = {}
+    for endpoints in published.values():
+        for endpoint, stats in endpoints.items():
+            _merge(merged.setdefault(endpoint, _new_stats()), stats)
+
+    rows = []
+    for endpoint, stats in merged.items():
+        row = {"endpoint": endpoint, "requests": stats["requests"]}
+        for field in ("total_ms", "db_ms", "serializer_ms"):
+            for percent in PERCENTILES:
+                row[f"{field[:-3]}_p{percent}_ms"] = _percentile(stats[field], percent)
+        row["queries_mean"] = round(stats["queries"] / stats["requests"], 1)
+        row["queries_max"] = stats["max_queries"]
+        row["n_plus_one"] = [
+            {"sql": shape, **suspect}
+            for shape, suspect in sorted(stats["suspects"].items(), key=lambda item: -item[1]["requests"])
+        ]
+        rows.append(row)
+    rows.sort(key=lambda row: row["total_p95_ms"], reverse=True)
+    return {"processes": len(published), "window_minutes": settings.PERF_WINDOW_MINUTES, "endpoints": rows}
+
+
+def _timed(method):
+    def wrapper(self, *args, **kwargs):
+        current = _current.get()
+        # Only the outermost serializer counts, nested ones are part of it
+        if current is None or current.in_serializer:
+            return method(self, *args, **kwargs)
+        current.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            current.serializer_ms += (time.perf_counter() - started) * 1000
+            current.in_serializer = False
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument_serializers():
+    from rest_framework.serializers import BaseSerializer
+
+    if getattr(BaseSerializer.is_valid, "profiled", False):
+        return
+    BaseSerializer.is_valid = _timed(BaseSerializer.is_valid)
+    # Serializer.data and ListSerializer.data both go through it
+    BaseSerializer.data = property(_timed(BaseSerializer.data.fget))
+
+
+def endpoint_name(view_func):
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    return view_class.__name__
+
+
+class PerfMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERF_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_serializers()
+        connection_created.connect(_install_execute_wrapper, dispatch_uid="perf-execute-wrapper")
+        for connection in connections.all(initialized_only=True):
+            _install_execute_wrapper(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        current = RequestRecord()
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(current, started)
+        return response
+
+    async def __acall__(self, request):
+        current = RequestRecord()
+        token = _current.set(current)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(current, started)
+        return response
+
+    def finish(self, current, started):
+        if current.endpoint:
+            record_request(current, (time.perf_counter() - started) * 1000)
+            publish()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current = _current.get()
+        if current is None:
+            return None
+        actions = getattr(view_func, "actions", None)
+        method = request.method.lower()
+        current.endpoint = f"{endpoint_name(view_func)}.{actions.get(method, method) if actions else method}"
+        return None
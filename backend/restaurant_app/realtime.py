@@ -0,0 +1,249 @@
+"""
+Push channel for the order board: kitchen screens and the cashier app
+subscribe once instead of polling /api/orders/ and /api/notifications/.
+
+Order, item, delivery and notification writes publish a compact event
+after their transaction commits:
+
+    {"type": "order.created", "order": {"id": 12, "invoice_number": "0012", ...}}
+
+Event types are order.created, order.status_changed, order.items_added,
+delivery.status_changed and notification.created. Subscribers connect
+over ASGI with an access token, either as Server-Sent Events on
+/api/events/ or as a WebSocket on /ws/events/ (see asgi.py). Browsers
+cannot set headers on EventSource, so the token may also be passed as
+`?token=`. Served by the WSGI application, /api/events/ answers 501.
+
+Events travel through settings.REALTIME_BROKER:
+
+- InMemoryBroker (default) fans out inside one process, for development,
+  tests and single-worker deployments;
+- RedisBroker uses Redis pub/sub so every ASGI worker, and writes made by
+  WSGI workers or `run_worker`, reach every subscriber.
+
+A broker needs `publish(event)`, callable from any thread, and an async
+`subscribe()` context manager that yields an async iterator of events.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield _drain(subscriber[1])
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+def _offer(queue, event):
+    # A screen that stops reading loses its oldest events rather than
+    # growing the queue without bound
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+async def _drain(queue):
+    while True:
+        yield await queue.get()
+
+
+class RedisBroker:
+    channel = "restaurant-events"
+
+    def __init__(self):
+        import redis
+
+        self._client = redis.Redis.from_url(settings.REALTIME_REDIS_URL)
+
+    def publish(self, event):
+        self._client.publish(self.channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(settings.REALTIME_REDIS_URL)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        try:
+            yield (json.loads(message["data"]) async for message in pubsub.listen())
+        finally:
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    # One broker per process: the in-memory one only works if publishers
+    # and subscribers share it
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def publish(event):
+    """Hand `event` to the broker once the current transaction commits."""
+    def send():
+        try:
+            get_broker().publish(event)
+        except Exception:
+            # The write is committed; a broker outage only costs the push
+            logger.exception("Could not publish %s", event["type"])
+
+    transaction.on_commit(send)
+
+
+def order_payload(order):
+    return {
+        "id": order.pk,
+        "invoice_number": order.invoice_number,
+        "order_type": order.order_type,
+        "status": order.status,
+        "total_amount": order.total_amount,
+        "created_at": order.created_at,
+        "kitchen_note": order.kitchen_note,
+    }
+
+
+def item_payload(item):
+    return {
+        "id": item.pk,
+        "dish_name": item.dish_name,
+        "quantity": item.quantity,
+        "is_newly_added": item.is_newly_added,
+    }
+
+
+def encode(event):
+    return json.dumps(event, cls=DjangoJSONEncoder)
+
+
+async def authenticate(token):
+    """Return the active user for an access token, or None."""
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+    from restaurant_app.authentication import CachedJWTAuthentication
+
+    if not token:
+        return None
+    authentication = CachedJWTAuthentication()
+    try:
+        validated = authentication.get_validated_token(token)
+        return await sync_to_async(authentication.get_user)(validated)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _request_token(request):
+    header = request.headers.get("Authorization", "")
+    scheme, _, token = header.partition(" ")
+    if scheme in settings.SIMPLE_JWT["AUTH_HEADER_TYPES"] and token:
+        return token
+    return request.GET.get("token")
+
+
+async def _sse(events):
+    keepalive = settings.REALTIME_KEEPALIVE
+    yield "retry: 2000\n\n"
+    # The pending read survives keepalive timeouts; cancelling it would
+    # close the event iterator
+    pending = asyncio.ensure_future(anext(events))
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=keepalive)
+            if not done:
+                # Comment line, keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            event = pending.result()
+            pending = asyncio.ensure_future(anext(events))
+            yield f"event: {event['type']}\ndata: {encode(event)}\n\n"
+    finally:
+        pending.cancel()
+
+
+async def event_stream(request):
+    """Server-Sent Events endpoint. Needs an ASGI server."""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would consume the endless stream synchronously and
+        # stay tied up with it for good
+        return HttpResponse("The event stream needs the ASGI application (asgi.py).", status=501)
+    if await authenticate(_request_token(request)) is None:
+        return HttpResponse(status=401)
+
+    async def stream():
+        async with get_broker().subscribe() as events:
+            async for chunk in _sse(events):
+                yield chunk
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def websocket_application(scope, receive, send):
+    """Raw ASGI WebSocket endpoint, routed from asgi.py."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if await authenticate(query.get("token", [None])[0]) is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+    await send({"type": "websocket.accept"})
+
+    async with get_broker().subscribe() as events:
+        forward = asyncio.ensure_future(_forward(events, send))
+        try:
+            # Screens only listen; wait for them to go away
+            while (await receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            forward.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await forward
+
+
+async def _forward(events, send):
+    async for event in events:
+        await send({"type": "websocket.send", "text": encode(event)})
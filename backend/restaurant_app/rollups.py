@@ -0,0 +1,242 @@
+"""
+Incremental maintenance of the daily sales rollup tables.
+
+Orders and order items remember the rollup contribution they had when they
+were loaded (`remember_order` / `remember_item`). On save or delete only
+the difference between the old and the new contribution is applied to the
+DailySalesRollup / DailyDishRollup rows involved, so a status flip moves
+an order's totals from one bucket to another instead of forcing a rescan.
+`manage.py rebuild_sales_rollups` recomputes a date range from scratch.
+
+The tables are only maintained while settings.SALES_ROLLUPS_ENABLED is on,
+so orders written with it off cost no rollup queries; rebuild the days it
+was off before turning it back on.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from .utils import date_range_q
+
+
+ORDER_KEY_FIELDS = ("date", "order_type", "payment_method", "status")
+SALES_VALUE_FIELDS = (
+    "order_count",
+    "total_amount",
+    "cash_amount",
+    "bank_amount",
+    "credit_amount",
+    "delivery_charge",
+)
+DISH_KEY_FIELDS = ("date", "dish_name", "order_type", "payment_method", "status")
+DISH_VALUE_FIELDS = ("line_count", "quantity", "total_amount")
+
+# Model fields a loaded instance needs for its contribution to be known
+ORDER_SOURCE_FIELDS = {
+    "created_at", "order_type", "payment_method", "status", "total_amount",
+    "cash_amount", "bank_amount", "credit_amount", "delivery_charge",
+}
+ITEM_SOURCE_FIELDS = {"dish_name", "price", "quantity"}
+
+# Keys of the orders being deleted, by pk, for their items' post_delete
+# to use instead of loading the order once per item in the cascade
+_deleted_order_keys = {}
+
+
+def enabled():
+    return settings.SALES_ROLLUPS_ENABLED
+
+
+def order_key(order):
+    return (order.created_at.date(), order.order_type, order.payment_method, order.status)
+
+
+def sales_contribution(order):
+    return {
+        order_key(order): {
+            "order_count": 1,
+            "total_amount": Decimal(order.total_amount or 0),
+            "cash_amount": Decimal(order.cash_amount or 0),
+            "bank_amount": Decimal(order.bank_amount or 0),
+            "credit_amount": Decimal(order.credit_amount or 0),
+            "delivery_charge": Decimal(order.delivery_charge or 0),
+        }
+    }
+
+
+def item_values(item):
+    return (item.dish_name, Decimal(item.price or 0), item.quantity)
+
+
+def dish_contribution(key, items):
+    """`items` is an iterable of (dish_name, price, quantity) tuples."""
+    contribution = defaultdict(lambda: dict.fromkeys(DISH_VALUE_FIELDS, 0))
+    for dish_name, price, quantity in items:
+        date, order_type, payment_method, status = key
+        row = contribution[(date, dish_name, order_type, payment_method, status)]
+        row["line_count"] += 1
+        row["quantity"] += quantity
+        row["total_amount"] += price * quantity
+    return contribution
+
+
+def remember_order(order):
+    """Record the contribution the order currently makes."""
+    order._rollup_key = order_key(order)
+    order._rollup_sales = sales_contribution(order)
+
+
+def remember_item(item):
+    item._rollup_item = item_values(item)
+
+
+def _diff(before, after, value_fields):
+    delta = defaultdict(lambda: dict.fromkeys(value_fields, 0))
+    for sign, contribution in ((-1, before), (1, after)):
+        for key, values in contribution.items():
+            for field in value_fields:
+                delta[key][field] += sign * values[field]
+    return {key: values for key, values in delta.items() if any(values.values())}
+
+
+def _apply(model, key_fields, value_fields, delta):
+    if not delta:
+        return
+    keys = [dict(zip(key_fields, key)) for key in delta]
+    # Inserting first takes the write lock on every backend (including
+    # SQLite), so concurrent writers serialize on the rows below.
+    model.objects.bulk_create([model(**key) for key in keys], ignore_conflicts=True)
+
+    match = Q()
+    for key in keys:
+        match |= Q(**key)
+    rows = list(model.objects.select_for_update().filter(match))
+    for row in rows:
+        values = delta[tuple(getattr(row, field) for field in key_fields)]
+        for field in value_fields:
+            setattr(row, field, getattr(row, field) + values[field])
+    model.objects.bulk_update(rows, value_fields)
+
+
+def apply_sales_delta(before, after):
+    from restaurant_app.models import DailySalesRollup
+
+    _apply(DailySalesRollup, ORDER_KEY_FIELDS, SALES_VALUE_FIELDS,
+           _diff(before, after, SALES_VALUE_FIELDS))
+
+
+def apply_dish_delta(before, after):
+    from restaurant_app.models import DailyDishRollup
+
+    _apply(DailyDishRollup, DISH_KEY_FIELDS, DISH_VALUE_FIELDS,
+           _diff(before, after, DISH_VALUE_FIELDS))
+
+
+@transaction.atomic
+def order_saved(order, created):
+    # A save may change the key a failed delete left behind
+    _deleted_order_keys.pop(order.pk, None)
+    before_key = None if created else getattr(order, "_rollup_key", None)
+    before_sales = {} if created else getattr(order, "_rollup_sales", {})
+    remember_order(order)
+    apply_sales_delta(before_sales, order._rollup_sales)
+
+    # Item totals only move when the order changes bucket
+    if before_key is not None and before_key != order._rollup_key:
+        items = [item_values(item) for item in order.items.all()]
+        apply_dish_delta(dish_contribution(before_key, items),
+                         dish_contribution(order._rollup_key, items))
+
+
+def order_deleting(order):
+    _deleted_order_keys[order.pk] = order_key(order)
+
+
+@transaction.atomic
+def order_deleted(order):
+    _deleted_order_keys.pop(order.pk, None)
+    apply_sales_delta(getattr(order, "_rollup_sales", {}), {})
+
+
+@transaction.atomic
+def items_saved(order, items, created=True):
+    """Add newly created items, or apply the edits made to loaded items."""
+    key = order_key(order)
+    before = [] if created else [item._rollup_item for item in items if hasattr(item, "_rollup_item")]
+    for item in items:
+        remember_item(item)
+    apply_dish_delta(dish_contribution(key, before),
+                     dish_contribution(key, [item._rollup_item for item in items]))
+
+
+@transaction.atomic
+def item_deleted(item):
+    key = _deleted_order_keys.get(item.order_id)
+    if key is None:
+        key = order_key(item.order)
+    apply_dish_delta(dish_contribution(key, [getattr(item, "_rollup_item", item_values(item))]), {})
+
+
+@transaction.atomic
+def rebuild(from_date=None, to_date=None):
+    """Recompute the rollup rows for the given (inclusive) date range."""
+    from restaurant_app.models import DailyDishRollup, DailySalesRollup, Order, OrderItem
+
+    orders = Order.objects.all()
+    items = OrderItem.objects.all()
+    sales_rows = DailySalesRollup.objects.all()
+    dish_rows = DailyDishRollup.objects.all()
+    orders = orders.filter(date_range_q("created_at", from_date, to_date))
+    items = items.filter(date_range_q("order__created_at", from_date, to_date))
+    if from_date:
+        sales_rows = sales_rows.filter(date__gte=from_date)
+        dish_rows = dish_rows.filter(date__gte=from_date)
+    if to_date:
+        sales_rows = sales_rows.filter(date__lte=to_date)
+        dish_rows = dish_rows.filter(date__lte=to_date)
+
+    sales_rows.delete()
+    dish_rows.delete()
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    DailySalesRollup.objects.bulk_create(
+        (
+            DailySalesRollup(**row)
+            for row in orders.annotate(date=TruncDate("created_at"))
+            .values(*ORDER_KEY_FIELDS)
+            .annotate(
+                order_count=Count("id"),
+                total_amount=Coalesce(Sum("total_amount"), 0, output_field=money),
+                cash_amount=Coalesce(Sum("cash_amount"), 0, output_field=money),
+                bank_amount=Coalesce(Sum("bank_amount"), 0, output_field=money),
+                credit_amount=Coalesce(Sum("credit_amount"), 0, output_field=money),
+                delivery_charge=Coalesce(Sum("delivery_charge"), 0, output_field=money),
+            )
+            .order_by()
+        ),
+        batch_size=1000,
+    )
+    DailyDishRollup.objects.bulk_create(
+        (
+            DailyDishRollup(**row)
+            for row in items.annotate(
+                date=TruncDate("order__created_at"),
+                order_type=F("order__order_type"),
+                payment_method=F("order__payment_method"),
+                status=F("order__status"),
+            )
+            .values(*DISH_KEY_FIELDS)
+            .annotate(
+                # total_amount first, before "quantity" is shadowed by its sum
+                total_amount=Sum(F("price") * F("quantity"), output_field=money),
+                line_count=Count("id"),
+                quantity=Sum("quantity"),
+            )
+            .order_by()
+        ),
+        batch_size=1000,
+    )
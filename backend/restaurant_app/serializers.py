@@ -1,11 +1,12 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.settings import api_settings
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth.models import update_last_login
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from delivery_drivers.models import DeliveryDriver
 from restaurant_app.models import *
+from restaurant_app import dish_names, passcodes
+from restaurant_app.authentication import token_for_user
 
 
 
@@ -18,6 +19,7 @@ class SidebarItemSerializer(serializers.ModelSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
+    passcode = serializers.CharField(write_only=True, required=False, validators=[passcodes.validate_passcode])
 
     class Meta:
         model = User
@@ -29,9 +31,16 @@ class UserSerializer(serializers.ModelSerializer):
             "mobile_number",
             "gender",
             "password",
+            "passcode",
             "driver_profile",
         ]
 
+    def validate_passcode(self, value):
+        # Stored hashed, so the model's unique validator cannot compare it
+        if passcodes.in_use(value, exclude_pk=self.instance.pk if self.instance else None):
+            raise serializers.ValidationError("A user with this passcode already exists.")
+        return value
+
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
         return user
@@ -49,19 +58,15 @@ class DriverSerializer(serializers.ModelSerializer):
 
 class LoginSerializer(TokenObtainPairSerializer):
 
+    @classmethod
+    def get_token(cls, user):
+        return token_for_user(user)
+
     def validate(self, attrs):
+        # TokenObtainPairSerializer issues the token pair and updates
+        # last_login
         data = super().validate(attrs)
-        refresh = self.get_token(self.user)
-
-        user_data = UserSerializer(self.user).data
-
-        data["user"] = user_data
-        data["refresh"] = str(refresh)
-        data["access"] = str(refresh.access_token)
-
-        if api_settings.UPDATE_LAST_LOGIN:
-            update_last_login(None, self.user)
-
+        data["user"] = UserSerializer(self.user).data
         return data
 
 
@@ -69,20 +74,16 @@ class PasscodeLoginSerializer(serializers.Serializer):
     passcode = serializers.CharField(max_length=6, min_length=6)
 
     def validate(self, attrs):
-        passcode = attrs.get("passcode")
-        User = get_user_model()
-
-        try:
-            user = User.objects.get(passcode=passcode)
-        except User.DoesNotExist:
+        user = passcodes.find_user(attrs.get("passcode"))
+        if user is None:
             raise serializers.ValidationError("Invalid passcode")
 
         if not user.is_active:
             raise serializers.ValidationError("User account is disabled")
 
-        refresh = RefreshToken.for_user(user)
+        refresh = token_for_user(user)
         return {
-            "user": UserSerializer(user).data,
+            "user": passcodes.user_payload(user),
             "refresh": str(refresh),
             "access": str(refresh.access_token),
         }
@@ -129,6 +130,13 @@ class DishVariantSerializer(serializers.ModelSerializer):
         fields = ['id', 'name','dish']
 
 
+class MenuCatalogueDishSerializer(DishSerializer):
+    variants = DishVariantSerializer(many=True, read_only=True)
+
+    class Meta(DishSerializer.Meta):
+        fields = DishSerializer.Meta.fields + ["variants"]
+
+
 class OnlineOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = OnlineOrder
@@ -151,12 +159,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
         ]
     
     def get_arabic_name(self, obj):
-        try:
-            # Get the first dish with matching name
-            dish = Dish.objects.filter(name=obj.dish_name).first()
-            return dish.arabic_name if dish else None
-        except Dish.DoesNotExist:
-            return None
+        # Prefer the snapshot taken at order time, otherwise resolve it from
+        # the in-memory dish name index (one query per index load, not per item)
+        if obj.arabic_name:
+            return obj.arabic_name
+        return dish_names.get_arabic_name(obj.dish_name)
 
 class CustomerDetailsSerializer(serializers.ModelSerializer):
     class Meta:
@@ -203,6 +210,22 @@ class OrderSerializer(serializers.ModelSerializer):
             "credit_amount",
         ]
     
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=""):
+        """
+        Load every relation this serializer reads in a fixed number of queries.
+
+        `prefix` is the lookup path to the order when the queryset is of a
+        model that nests OrderSerializer (e.g. "order__" for DeliveryOrder).
+        """
+        return queryset.select_related(
+            f"{prefix}user__driver_profile",
+            f"{prefix}delivery_order__driver__user",
+        ).prefetch_related(
+            f"{prefix}items",
+            f"{prefix}foc_products",
+        )
+
     def get_foc_product_details(self, obj):
         return [
             {
@@ -213,62 +236,63 @@ class OrderSerializer(serializers.ModelSerializer):
             if foc_product.name is not None
         ]
 
-    def create(self, validated_data):
-        items_data = validated_data.pop("items")
-        foc_products_data = validated_data.pop("foc_products", [])
-        user = self.context["request"].user
-        order = Order.objects.create(user=user, **validated_data)
-        total_amount = 0
-
+    def build_items(self, items_data, **extra):
+        items = []
         for item_data in items_data:
-            order_item = OrderItem.objects.create(order=order, **item_data)
-            total_amount += order_item.quantity * order_item.price
-        
+            if settings.ORDER_ITEM_ARABIC_NAME_SNAPSHOT:
+                item_data["arabic_name"] = dish_names.get_arabic_name(item_data["dish_name"])
+            item_data.update(extra)
+            items.append(OrderItem(**item_data))
+        return items
+
+    @staticmethod
+    def items_total(items):
+        return sum((item.quantity * item.price for item in items), 0)
+
+    def add_charges(self, order, total_amount):
         # Add delivery charge to total amount if it's not the default value
         if order.delivery_charge != 0:
             total_amount += order.delivery_charge
         if order.chair_amount != 0:
-              total_amount += order.chair_amount
-        order.total_amount = total_amount
-        order.foc_products.set(foc_products_data)
+            total_amount += order.chair_amount
+        return total_amount
+
+    @transaction.atomic
+    def create(self, validated_data):
+        items_data = validated_data.pop("items")
+        foc_products_data = validated_data.pop("foc_products", [])
+        user = self.context["request"].user
+
+        # The total is known before the order is written, so it is inserted
+        # once and the items follow in a single bulk insert
+        order = Order(user=user, **validated_data)
+        items = self.build_items(items_data)
+        order.total_amount = self.add_charges(order, self.items_total(items))
         order.save()
+        order.add_items(items)
+
+        if foc_products_data:
+            order.foc_products.add(*foc_products_data)
         return order
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop("items", None)
         foc_products_data = validated_data.pop("foc_products", None)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        
-        # Start by resetting the total amount to 0
-        total_amount = 0
-
-        # Sum existing items' total amount
-        for existing_item in instance.items.all():
-            total_amount += existing_item.quantity * existing_item.price
-
-        # Add new items' total amount
-        if items_data:
-            for item_data in items_data:
-                item_data['is_newly_added'] = True  # Marking as newly added
-                order_item = OrderItem.objects.create(order=instance, **item_data)
-                total_amount += order_item.quantity * order_item.price
-        
-        # Add delivery charge to total amount if it's not the default value
-        if instance.delivery_charge != 0:
-            total_amount += instance.delivery_charge
-        
-        if instance.chair_amount != 0:
-            total_amount += instance.chair_amount
 
-        # Update the total amount
-        instance.total_amount = total_amount
+        # Existing items plus the new ones, marked as newly added
+        new_items = self.build_items(items_data or [], is_newly_added=True)
+        total_amount = self.items_total(instance.items.all()) + self.items_total(new_items)
+        instance.total_amount = self.add_charges(instance, total_amount)
 
         # Update FOC products if provided
         if foc_products_data is not None:
             instance.foc_products.set(foc_products_data)
 
         instance.save()
+        instance.add_items(new_items)
         return instance
     
 
@@ -580,17 +604,13 @@ class MessTransactionSerializer(serializers.ModelSerializer):
         fields = ['id', 'received_amount', 'status', 'cash_amount', 'bank_amount', 'payment_method', 'mess','date']
 
 class CreditTransactionSerializer(serializers.ModelSerializer):
-    credit_user_details = serializers.SerializerMethodField()
+    # A declared field instead of a CreditUserSerializer built per row
+    credit_user_details = CreditUserSerializer(source='credit_user', read_only=True)
 
     class Meta:
         model = CreditTransaction
         fields = '__all__'
         read_only_fields = ['status']
-        
-    def get_credit_user_details(self, obj):
-        if obj.credit_user:
-            return CreditUserSerializer(obj.credit_user).data
-        return None
 
 
 class ChairsSerializer(serializers.ModelSerializer):
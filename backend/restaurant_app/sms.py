@@ -0,0 +1,33 @@
+"""
+Backends for outgoing SMS / WhatsApp messages, selected with
+settings.SMS_BACKEND.
+
+TwilioBackend sends through Twilio. LocmemBackend keeps the messages in
+memory instead, for tests and development without network access.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class TwilioBackend:
+    def send(self, to_number, message):
+        from twilio.rest import Client
+
+        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        client.messages.create(
+            body=message,
+            from_=f"whatsapp:{settings.TWILIO_PHONE_NUMBER}",
+            to=to_number
+        )
+
+
+class LocmemBackend:
+    # Shared by every instance, like django.core.mail's locmem outbox
+    outbox = []
+
+    def send(self, to_number, message):
+        self.outbox.append({"to": to_number, "message": message})
+
+
+def get_backend():
+    return import_string(settings.SMS_BACKEND)()
@@ -0,0 +1,41 @@
+"""
+Background tasks, run by `manage.py run_worker` (see jobs.py).
+"""
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from . import jobs, order_effects, sms, token_tables, utils
+
+
+@jobs.task(queue="sms")
+def send_sms(to_number, message):
+    # Unlike utils.send_sms, errors propagate so that the job is retried
+    sms.get_backend().send(to_number, message)
+
+
+@jobs.task(queue="pdf")
+def generate_order_pdf(order_id):
+    from restaurant_app.models import Order
+
+    order = Order.objects.select_related("user").prefetch_related("items").get(pk=order_id)
+    buffer = utils.generate_order_pdf(order)
+    return default_storage.save(
+        f"order_pdfs/{order.invoice_number or order.pk}.pdf", ContentFile(buffer.getvalue())
+    )
+
+
+@jobs.task(queue="orders")
+def run_order_effects(order_id, names, created):
+    order_effects.run_by_id(order_id, names, created)
+
+
+@jobs.task(queue="maintenance", max_attempts=1)
+def prune_tokens():
+    # Scheduled by JOB_SCHEDULE, a failed run is simply the next one's work
+    token_tables.prune(pause=settings.TOKEN_PRUNE_PAUSE)
+
+
+def queue_order_effects(order, names, created):
+    """ORDER_EFFECTS_RUNNER that hands the order side effects to the worker."""
+    jobs.enqueue("run_order_effects", order_id=order.pk, names=names, created=created)
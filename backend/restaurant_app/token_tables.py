@@ -0,0 +1,87 @@
+"""
+Upkeep of simplejwt's OutstandingToken and BlacklistedToken tables.
+
+Every login and every refresh (ROTATE_REFRESH_TOKENS with
+BLACKLIST_AFTER_ROTATION) adds rows to them, and simplejwt never deletes
+any. `prune` deletes the rows of tokens that have expired, which can no
+longer be used whether blacklisted or not. It works in batches of
+TOKEN_PRUNE_BATCH_SIZE tokens, one short transaction each, so the tables
+are never locked for long. Tokens share one lifetime, so they expire in
+id order: each batch reads the next tokens by id, and the run stops at
+the first unexpired one instead of scanning the rest of the table.
+
+`prune_tokens` runs every JOB_SCHEDULE["prune_tokens"] seconds in
+`manage.py run_worker` (see tasks.py), and on demand with
+`manage.py prune_tokens`.
+
+`metrics` reports the table sizes and how long the blacklist check that
+runs on every refresh takes, for /api/token-metrics/.
+"""
+import logging
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+logger = logging.getLogger(__name__)
+
+PROBES = 5
+
+
+def prune(batch_size=None, now=None, pause=0):
+    """
+    Delete the expired outstanding tokens and their blacklist entries.
+    Waits `pause` seconds between batches. Returns the numbers of
+    outstanding and blacklisted tokens deleted.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = now or timezone.now()
+    outstanding = blacklisted = last_id = 0
+    while True:
+        with transaction.atomic():
+            tokens = (
+                OutstandingToken.objects.filter(id__gt=last_id)
+                .order_by("id").values_list("id", "expires_at")[:batch_size]
+            )
+            ids = []
+            for token_id, expires_at in tokens:
+                if expires_at >= now:
+                    break
+                ids.append(token_id)
+            if not ids:
+                break
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            # Nothing left to cascade to, the blacklist entries are gone
+            outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
+    logger.info("Pruned %d outstanding and %d blacklisted tokens", outstanding, blacklisted)
+    return outstanding, blacklisted
+
+
+def blacklist_check_ms():
+    """Median time of the query simplejwt runs to check a refresh token."""
+    timings = []
+    for _ in range(PROBES):
+        jti = uuid.uuid4().hex
+        started = time.perf_counter()
+        BlacklistedToken.objects.filter(token__jti=jti).exists()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def metrics():
+    return {
+        "outstanding_tokens": OutstandingToken.objects.count(),
+        "expired_outstanding_tokens": OutstandingToken.objects.filter(expires_at__lt=timezone.now()).count(),
+        "blacklisted_tokens": BlacklistedToken.objects.count(),
+        "blacklist_check_ms": blacklist_check_ms(),
+    }
@@ -11,17 +11,24 @@ from rest_framework_simplejwt.tokens import TokenError, RefreshToken
 from rest_framework_simplejwt.exceptions import InvalidToken
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.db.models import Sum, Count, Avg, F, Value,DecimalField, IntegerField
 from django.utils.dateparse import parse_date
 from django.db.models import Q, Case, When
 from django.db.models.functions import TruncDate, TruncHour, ExtractHour
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
 from django.contrib.admin.views.decorators import staff_member_required
 from delivery_drivers.models import DeliveryOrder
 from delivery_drivers.serializers import DeliveryOrderSerializer
 from restaurant_app.models import *
 from restaurant_app.serializers import *
+from restaurant_app.utils import date_range_q
+from restaurant_app import exports, menu_catalogue, profiling, token_tables
+from restaurant_app.pagination import KeysetPagination
+from restaurant_app.projections import CompactListMixin
 from rest_framework.decorators import api_view
+from rest_framework.settings import api_settings
 from django.db.models.functions import Coalesce,Cast
 from django.shortcuts import render
 from rest_framework.pagination import PageNumberPagination
@@ -132,7 +139,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
 
 class DishViewSet(viewsets.ModelViewSet):
-    queryset = Dish.objects.all()
+    queryset = Dish.objects.prefetch_related("size")
     serializer_class = DishSerializer
     pagination_class = None
     filter_backends = [
@@ -145,6 +152,41 @@ class DishViewSet(viewsets.ModelViewSet):
     ordering_fields = ["name", "price"]
 
 
+class MenuCatalogueView(APIView):
+    """
+    The whole menu (categories, dishes with sizes and variants) in one
+    cached document, with ETag support for the POS terminals.
+    """
+    def get(self, request):
+        etag, content = menu_catalogue.get_rendered(request)
+        response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        # Answers 304 Not Modified when the terminal already has this version
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+class TokenMetricsView(APIView):
+    """
+    Sizes of the JWT token tables and the latency of the blacklist check
+    run on every token refresh.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(token_tables.metrics())
+
+
+class PerfReportView(APIView):
+    """
+    Latency percentiles, query counts and N+1 suspects per endpoint, when
+    settings.PERF_PROFILING is on.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({"enabled": settings.PERF_PROFILING, **profiling.report()})
+
+
 class DishSizeViewSet(viewsets.ModelViewSet):
     queryset = DishSize.objects.all()
     serializer_class = DishSizeSerializer
@@ -184,21 +226,61 @@ class CustomerDetailsViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = None
 
+# Report actions also answer ?format=csv|xlsx|ndjson, see exports.py
+REPORT_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, *exports.EXPORT_RENDERERS]
+
+SALES_REPORT_COLUMNS = [
+    ("id", "id"),
+    ("invoice_number", "invoice_number"),
+    ("created_at", "created_at"),
+    ("user__username", "user"),
+    ("order_type", "order_type"),
+    ("status", "status"),
+    ("payment_method", "payment_method"),
+    ("customer_name", "customer_name"),
+    ("customer_phone_number", "customer_phone_number"),
+    ("total_amount", "total_amount"),
+    ("cash_amount", "cash_amount"),
+    ("bank_amount", "bank_amount"),
+    ("credit_amount", "credit_amount"),
+    ("delivery_charge", "delivery_charge"),
+]
+
+PRODUCT_WISE_REPORT_COLUMNS = [
+    ("dish_name", "dish_name"),
+    ("total_quantity", "total_quantity"),
+    ("total_amount", "total_amount"),
+    ("order__invoice_number", "invoice_number"),
+    ("order__created_at", "order_created_at"),
+    ("order__order_type", "order_type"),
+    ("order__payment_method", "payment_method"),
+    ("cash_amount", "cash_amount"),
+    ("bank_amount", "bank_amount"),
+    ("credit_amount", "credit_amount"),
+]
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
         return context
 
+    # Actions that serialize orders through OrderSerializer
+    serializer_actions = ("list", "retrieve", "sales_report", "user_order_history")
+
     def get_queryset(self):
         queryset = super().get_queryset()
         order_type = self.request.query_params.get("order_type", None)
         if order_type:
             queryset = queryset.filter(order_type=order_type)
+        if self.action in self.serializer_actions:
+            queryset = OrderSerializer.setup_eager_loading(queryset)
         return queryset
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
@@ -243,6 +325,9 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({"error": "Order item not found."}, status=status.HTTP_404_NOT_FOUND)
 
     def get_queryset_by_time_range(self, time_range):
+        return self.queryset.filter(created_at__range=self.get_time_range_bounds(time_range))
+
+    def get_time_range_bounds(self, time_range):
         end_date = timezone.now()
         if time_range == "day":
             start_date = end_date - timedelta(days=1)
@@ -255,7 +340,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         else:
             start_date = end_date - timedelta(days=30)
 
-        return self.queryset.filter(created_at__range=(start_date, end_date))
+        return start_date, end_date
     
     @action(detail=False, methods=["get"])
     def user_order_history(self, request):
@@ -275,7 +360,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=["get"])
+    @action(detail=False, methods=["get"], renderer_classes=REPORT_RENDERERS)
     def sales_report(self, request):
         from_date = request.query_params.get("from_date")
         to_date = request.query_params.get("to_date")
@@ -289,14 +374,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
 
         # Apply date filters if provided
-        if from_date and to_date:
-            queryset = queryset.filter(
-                created_at__date__gte=from_date, created_at__date__lte=to_date
-            )
-        elif from_date:
-            queryset = queryset.filter(created_at__date__gte=from_date)
-        elif to_date:
-            queryset = queryset.filter(created_at__date__lte=to_date)
+        queryset = queryset.filter(date_range_q("created_at", from_date, to_date))
 
         # Apply additional filters based on query parameters
         if order_type:
@@ -306,6 +384,10 @@ class OrderViewSet(viewsets.ModelViewSet):
         if status:
             queryset = queryset.filter(status=status)
 
+        if request.accepted_renderer.format in exports.FORMATS:
+            rows = queryset.prefetch_related(None).values(*(field for field, _ in SALES_REPORT_COLUMNS))
+            return exports.stream(request, rows, SALES_REPORT_COLUMNS, "sales_report")
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -324,38 +406,81 @@ class OrderViewSet(viewsets.ModelViewSet):
         else:  # year
             start_date = today - timedelta(days=365)
 
+        # Trends compare against a previous period of the same length
+        previous_start_date = start_date - timedelta(days=(today - start_date).days)
+        current_period = date_range_q('created_at', from_date=start_date)
+        previous_period = date_range_q('created_at', to_date=start_date - timedelta(days=1))
+
         # Base queryset for the date range - only delivered orders
         orders = Order.objects.filter(
-            created_at__date__gte=start_date,
+            current_period,
             status='delivered'  # Only consider delivered orders
         )
         order_items = OrderItem.objects.filter(
-            order__created_at__date__gte=start_date,
+            date_range_q('order__created_at', from_date=start_date),
             order__status='delivered'  # Only consider items from delivered orders
         )
 
+        if settings.SALES_ROLLUPS_ENABLED:
+            # Read the pre-aggregated daily rows instead of scanning orders
+            sales = DailySalesRollup.objects.filter(
+                date__gte=previous_start_date,
+                status='delivered'
+            )
+            totals = sales.aggregate(
+                total_income=Sum('total_amount', filter=Q(date__gte=start_date)),
+                total_orders=Sum('order_count', filter=Q(date__gte=start_date)),
+                previous_total_income=Sum('total_amount', filter=Q(date__lt=start_date)),
+                previous_total_orders=Sum('order_count', filter=Q(date__lt=start_date)),
+            )
+            daily_rows = (
+                sales.filter(date__gte=start_date)
+                .values(day=F('date'))
+                .annotate(total_sales=Sum('total_amount'), order_count=Sum('order_count'))
+            )
+            dish_rows = DailyDishRollup.objects.filter(date__gte=start_date, status='delivered')
+            dish_orders, dish_sales = Sum('line_count'), Sum('total_amount')
+        else:
+            # Current and previous period totals in a single conditional aggregate
+            totals = Order.objects.filter(
+                date_range_q('created_at', from_date=previous_start_date),
+                status='delivered'
+            ).aggregate(
+                total_income=Sum('total_amount', filter=current_period),
+                total_orders=Count('id', filter=current_period),
+                previous_total_income=Sum('total_amount', filter=previous_period),
+                previous_total_orders=Count('id', filter=previous_period),
+            )
+            daily_rows = (
+                orders.annotate(day=TruncDate('created_at'))
+                .values('day')
+                .annotate(total_sales=Sum('total_amount'), order_count=Count('id'))
+            )
+            dish_rows = order_items
+            dish_orders, dish_sales = Count('id'), Sum(F('price') * F('quantity'))
+
         # Calculate metrics for delivered orders only
-        total_income = orders.aggregate(total=Sum('total_amount'))['total'] or 0
-        total_orders = orders.count()
+        total_income = totals['total_income'] or 0
+        total_orders = totals['total_orders'] or 0
         avg_order_value = total_income / total_orders if total_orders > 0 else 0
 
         # Top dishes from delivered orders
         top_dishes = (
-            order_items
+            dish_rows
             .values('dish_name')
             .annotate(
-                orders=Count('id'),
-                total_sales=Sum(F('price') * F('quantity'))
+                orders=dish_orders,
+                total_sales=dish_sales
             )
             .order_by('-orders')[:5]
         )
 
         # Category sales from delivered orders
         category_sales = (
-            order_items
+            dish_rows
             .values('dish_name')
             .annotate(
-                value=Sum(F('price') * F('quantity'))
+                value=dish_sales
             )
             .order_by('-value')[:5]
         )
@@ -369,35 +494,28 @@ class OrderViewSet(viewsets.ModelViewSet):
             .order_by('-order_count')[:5]
         )
 
-        # Daily sales data for delivered orders
+        # Daily sales data for delivered orders, grouped in one query and
+        # zero-filled for days without orders
+        sales_by_day = {row['day']: row for row in daily_rows.order_by()}
         daily_sales = []
         current_date = start_date
         while current_date <= today:
-            day_orders = orders.filter(created_at__date=current_date)
+            day = sales_by_day.get(current_date, {})
             daily_sales.append({
                 'date': current_date.strftime('%Y-%m-%d'),
-                'total_sales': day_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
-                'order_count': day_orders.count()
+                'total_sales': day.get('total_sales') or 0,
+                'order_count': day.get('order_count') or 0
             })
             current_date += timedelta(days=1)
 
-        # Calculate trends for delivered orders
-        previous_start_date = start_date - timedelta(days=(today - start_date).days)
-        previous_orders = Order.objects.filter(
-            created_at__date__gte=previous_start_date,
-            created_at__date__lt=start_date,
-            status='delivered'  # Only consider delivered orders for trends
-        )
-
-        previous_total_income = previous_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-        previous_total_orders = previous_orders.count()
+        previous_total_income = totals['previous_total_income'] or 0
+        previous_total_orders = totals['previous_total_orders'] or 0
         previous_avg_order = previous_total_income / previous_total_orders if previous_total_orders > 0 else 0
 
         # Calculate percentage changes
         total_income_trend = ((total_income - previous_total_income) / previous_total_income * 100) if previous_total_income > 0 else 0
         total_orders_trend = ((total_orders - previous_total_orders) / previous_total_orders * 100) if previous_total_orders > 0 else 0
         avg_order_trend = ((avg_order_value - previous_avg_order) / previous_avg_order * 100) if previous_avg_order > 0 else 0
-        print("popular_time_slots",popular_time_slots)
         return Response({
             'total_income': total_income,
             'total_orders': total_orders,
@@ -430,21 +548,40 @@ class OrderViewSet(viewsets.ModelViewSet):
             start_date = end_date - timedelta(days=365)
             prev_start_date = start_date - timedelta(days=365)
 
-        prev_queryset = self.queryset.filter(
-            created_at__range=(prev_start_date, start_date)
-        )
+        if settings.SALES_ROLLUPS_ENABLED:
+            # Day-granular totals from the rollup table
+            def rollup_stats(start, end):
+                stats = DailySalesRollup.objects.filter(
+                    date__gte=start.date(), date__lte=end.date()
+                ).aggregate(
+                    total_income=Sum("total_amount"),
+                    total_orders=Sum("order_count"),
+                )
+                stats["avg_order_value"] = (
+                    stats["total_income"] / stats["total_orders"] if stats["total_orders"] else None
+                )
+                return stats
 
-        current_stats = current_queryset.aggregate(
-            total_income=Sum("total_amount"),
-            total_orders=Count("id"),
-            avg_order_value=Avg("total_amount"),
-        )
+            current_stats = rollup_stats(*self.get_time_range_bounds(time_range))
+            # Both bounds are inclusive days, so stop the day before start_date
+            # rather than count its rows in both periods
+            prev_stats = rollup_stats(prev_start_date, start_date - timedelta(days=1))
+        else:
+            prev_queryset = self.queryset.filter(
+                created_at__range=(prev_start_date, start_date)
+            )
 
-        prev_stats = prev_queryset.aggregate(
-            total_income=Sum("total_amount"),
-            total_orders=Count("id"),
-            avg_order_value=Avg("total_amount"),
-        )
+            current_stats = current_queryset.aggregate(
+                total_income=Sum("total_amount"),
+                total_orders=Count("id"),
+                avg_order_value=Avg("total_amount"),
+            )
+
+            prev_stats = prev_queryset.aggregate(
+                total_income=Sum("total_amount"),
+                total_orders=Count("id"),
+                avg_order_value=Avg("total_amount"),
+            )
 
         def calculate_trend(current, previous):
             if previous and previous != 0:
@@ -466,7 +603,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return Response(trends)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], renderer_classes=REPORT_RENDERERS)
     def product_wise_report(self, request):
         try:
             # Get parameters from request
@@ -480,7 +617,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             # Apply filters
             if from_date and to_date:
                 query = query.filter(
-                    order__created_at__date__range=[from_date, to_date]
+                    date_range_q('order__created_at', from_date, to_date)
                 )
             
             # Filter by dish_name if provided
@@ -514,6 +651,9 @@ class OrderViewSet(viewsets.ModelViewSet):
                 )
             ).order_by('dish_name')
 
+            if request.accepted_renderer.format in exports.FORMATS:
+                return exports.stream(request, product_report, PRODUCT_WISE_REPORT_COLUMNS, "product_wise_report")
+
             # Format the response
             formatted_report = [{
                 'dish_name': item['dish_name'],
@@ -550,10 +690,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         # Apply date filters if provided
         if from_date and to_date:
-            orders = orders.filter(
-                created_at__date__gte=from_date,
-                created_at__date__lte=to_date
-            )
+            orders = orders.filter(date_range_q('created_at', from_date, to_date))
 
         # Apply online platform filter if provided
         if online_order_id:
@@ -622,18 +759,9 @@ class OrderViewSet(viewsets.ModelViewSet):
             orders = Order.objects.filter(user__role__in=['staff', 'admin'])
 
         # Apply date filtering if provided
-        if from_date:
-            from_date_parsed = parse_date(from_date)
-            if from_date_parsed:
-                orders = orders.filter(created_at__date__gte=from_date_parsed)
-
-        if to_date:
-            to_date_parsed = parse_date(to_date)
-            if to_date_parsed:
-                orders = orders.filter(created_at__date__lte=to_date_parsed)
-
-        # Only prefetch items since dish is no longer a relationship
-        orders = orders.prefetch_related('items')
+        orders = orders.filter(date_range_q('created_at', from_date, to_date))
+
+        orders = OrderSerializer.setup_eager_loading(orders)
         
         serializer = OrderSerializer(orders, many=True)
         return Response(serializer.data)
@@ -671,12 +799,7 @@ class OrderViewSet(viewsets.ModelViewSet):
             print("No driver ID provided, returning all delivery orders")  # Add this log
 
         # Apply date range filter if provided
-        if from_date:
-            from_date = parse_date(from_date)
-            orders = orders.filter(created_at__date__gte=from_date)
-        if to_date:
-            to_date = parse_date(to_date)
-            orders = orders.filter(created_at__date__lte=to_date)
+        orders = orders.filter(date_range_q('created_at', from_date, to_date))
 
         # Select the fields we need
         report_data = orders.values(
@@ -803,6 +926,7 @@ class BillViewSet(viewsets.ModelViewSet):
     queryset = Bill.objects.all()
     serializer_class = BillSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -845,9 +969,10 @@ class CancelOrderByBillView(APIView):
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
-    queryset = Notification.objects.all().order_by("-created_at")
+    queryset = Notification.objects.select_related("user__driver_profile").order_by("-created_at")
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     @action(detail=True, methods=["post"])
     def mark_as_read(self, request, pk=None):
@@ -1044,15 +1169,24 @@ class SearchDishesAPIView(APIView):
     def get(self, request):
         query = request.GET.get("search", "")
         if query:
-            dishes = Dish.objects.filter(name__icontains=query)
+            dishes = Dish.objects.filter(name__icontains=query).prefetch_related("size")
             serializer = DishSerializer(dishes, many=True)
             return Response({"results": serializer.data}, status=status.HTTP_200_OK)
         return Response({"results": []}, status=status.HTTP_200_OK)
 
 
-class CreditUserViewSet(viewsets.ModelViewSet):
-    queryset = CreditUser.objects.all()
+class CreditUserViewSet(CompactListMixin, viewsets.ModelViewSet):
+    queryset = CreditUser.objects.prefetch_related("credit_orders")
     serializer_class = CreditUserSerializer
+    compact_fields = {
+        "id": "id",
+        "username": "username",
+        "mobile_number": "mobile_number",
+        "due_date": "due_date",
+        "total_due": "total_due",
+        "limit_amount": "limit_amount",
+        "is_active": "is_active",
+    }
     permission_classes = [permissions.IsAuthenticated]
 
     @action(detail=False, methods=["get"])
@@ -1121,13 +1255,26 @@ class MessTransactionViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(mess_id=mess_id)
         return queryset
 
-class CreditTransactionViewSet(viewsets.ModelViewSet):
+class CreditTransactionViewSet(CompactListMixin, viewsets.ModelViewSet):
     serializer_class = CreditTransactionSerializer
     queryset = CreditTransaction.objects.all()
+    compact_fields = {
+        "id": "id",
+        "date": "date",
+        "received_amount": "received_amount",
+        "status": "status",
+        "cash_amount": "cash_amount",
+        "bank_amount": "bank_amount",
+        "payment_method": "payment_method",
+        "credit_user_id": "credit_user_id",
+        "credit_user_name": "credit_user__username",
+    }
 
-    
     def get_queryset(self):
-        queryset = CreditTransaction.objects.all()
+        # credit_user_details embeds the credit user with its credit orders
+        queryset = CreditTransaction.objects.select_related("credit_user").prefetch_related(
+            "credit_user__credit_orders"
+        )
         credit_user_id = self.request.query_params.get('credit_user', None)
         if credit_user_id is not None:
             queryset = queryset.filter(credit_user_id=credit_user_id)
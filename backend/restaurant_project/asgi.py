@@ -2,6 +2,8 @@
 ASGI config for restaurant_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+WebSocket connections to /ws/events/ go to the order board push channel
+(restaurant_app/realtime.py); everything else is served by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from restaurant_app import realtime  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == "/ws/events/":
+            return await realtime.websocket_application(scope, receive, send)
+        await receive()
+        return await send({"type": "websocket.close", "code": 4404})
+    return await django_application(scope, receive, send)
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     "corsheaders",
     "django_filters",
     "import_export",
+    "sequences.apps.SequencesConfig",
     "restaurant_app.apps.RestaurantAppConfig",
     "delivery_drivers.apps.DeliveryDriversConfig",
     "transactions_app.apps.TransactionsAppConfig",
@@ -39,7 +40,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "restaurant_app.authentication.CachedJWTAuthentication",
     ],
     # "DEFAULT_THROTTLE_CLASSES": [
     #     "rest_framework.throttling.UserRateThrottle",
@@ -60,6 +61,8 @@ CSRF_TRUSTED_ORIGINS = env.list("CSRF_TRUSTED_ORIGINS")
 CORS_ALLOW_CREDENTIALS = True
 
 MIDDLEWARE = [
+    # Does nothing unless PERF_PROFILING is on
+    "restaurant_app.profiling.PerfMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -90,10 +93,16 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "restaurant_project.wsgi.application"
 
+# SQLite by default; set DB_ENGINE=django.db.backends.postgresql and the
+# connection variables to run on PostgreSQL
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": env.str("DB_ENGINE", default="django.db.backends.sqlite3"),
+        "NAME": env.str("DB_NAME", default=str(BASE_DIR / "db.sqlite3")),
+        "USER": env.str("DB_USER", default=""),
+        "PASSWORD": env.str("DB_PASSWORD", default=""),
+        "HOST": env.str("DB_HOST", default=""),
+        "PORT": env.str("DB_PORT", default=""),
     }
 }
 
@@ -159,6 +168,88 @@ TWILIO_ACCOUNT_SID = env.str("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = env.str("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = env.str("TWILIO_PHONE_NUMBER")
 
+# Store Dish.arabic_name on each OrderItem when the order is placed
+ORDER_ITEM_ARABIC_NAME_SNAPSHOT = env.bool("ORDER_ITEM_ARABIC_NAME_SNAPSHOT", default=False)
+# Seconds a worker keeps its in-memory dish name index before reloading it
+DISH_NAME_INDEX_TTL = env.int("DISH_NAME_INDEX_TTL", default=300)
+# Serve dashboard_data and sales_trends from the daily rollup tables, which
+# are only kept up to date while this is on. Run
+# `manage.py rebuild_sales_rollups` before turning it on.
+SALES_ROLLUPS_ENABLED = env.bool("SALES_ROLLUPS_ENABLED", default=False)
+# Seconds a rendered /api/menu-catalogue/ document is kept. Menu edits
+# invalidate it at once in the process (or shared cache) that saw them.
+MENU_CATALOGUE_CACHE_TIMEOUT = env.int("MENU_CATALOGUE_CACHE_TIMEOUT", default=300)
+# Rows fetched per database round trip by the streaming report exports
+REPORT_EXPORT_CHUNK_SIZE = env.int("REPORT_EXPORT_CHUNK_SIZE", default=2000)
+# Largest batch accepted by /api/transactions/bulk/
+TRANSACTION_BULK_MAX_VOUCHERS = env.int("TRANSACTION_BULK_MAX_VOUCHERS", default=20000)
+# Sum trial balances, profit and loss and balance sheets over more than a
+# month from the daily ledger checkpoints instead of the transactions.
+# Run `manage.py rebuild_ledger_balances` once before turning this on.
+FINANCIAL_STATEMENTS_FROM_CHECKPOINTS = env.bool("FINANCIAL_STATEMENTS_FROM_CHECKPOINTS", default=False)
+# Seconds a worker keeps the user behind an access token in memory, and
+# seconds it stays in the shared cache (see restaurant_app/authentication.py)
+AUTH_USER_LOCAL_TTL = env.int("AUTH_USER_LOCAL_TTL", default=5)
+AUTH_USER_CACHE_TIMEOUT = env.int("AUTH_USER_CACHE_TIMEOUT", default=60)
+# Key of the stored passcode hashes. Changing it invalidates every passcode.
+PASSCODE_HASH_KEY = env.str("PASSCODE_HASH_KEY", default=SECRET_KEY)
+# Seconds the user data returned by the passcode login stays cached
+PASSCODE_LOGIN_CACHE_TIMEOUT = env.int("PASSCODE_LOGIN_CACHE_TIMEOUT", default=300)
+# OutstandingToken rows of issued refresh tokens are inserted in batches of
+# this size, or this many seconds after the first one was queued. A batch
+# size of 1 inserts each row at once.
+TOKEN_OUTSTANDING_BATCH_SIZE = env.int("TOKEN_OUTSTANDING_BATCH_SIZE", default=50)
+TOKEN_OUTSTANDING_FLUSH_DELAY = env.int("TOKEN_OUTSTANDING_FLUSH_DELAY", default=2)
+# Broker carrying the order board events (see restaurant_app/realtime.py).
+# The in-memory broker only reaches subscribers of the same process; use
+# restaurant_app.realtime.RedisBroker (needs the redis package) with more
+# than one worker.
+REALTIME_BROKER = env.str("REALTIME_BROKER", default="restaurant_app.realtime.InMemoryBroker")
+REALTIME_REDIS_URL = env.str("REALTIME_REDIS_URL", default="redis://localhost:6379/0")
+# Events buffered per subscriber before the oldest are dropped
+REALTIME_QUEUE_SIZE = env.int("REALTIME_QUEUE_SIZE", default=256)
+# Seconds between keepalive comments on an idle event stream
+REALTIME_KEEPALIVE = env.int("REALTIME_KEEPALIVE", default=15)
+# Callable that runs the order side effects (customer details, notifications,
+# order board events) once the order write has committed. Use
+# "restaurant_app.tasks.queue_order_effects" to hand them to run_worker.
+# Effects that fail in the default runner are queued for run_worker too.
+ORDER_EFFECTS_RUNNER = env.str(
+    "ORDER_EFFECTS_RUNNER", default="restaurant_app.order_effects.run_now"
+)
+
+# Per-endpoint query counts and latencies, see restaurant_app/profiling.py
+# and /api/_perf/. Minutes of requests kept, seconds between copies of a
+# process' histograms to the cache, and identical statements per request
+# counted as an N+1 suspect.
+PERF_PROFILING = env.bool("PERF_PROFILING", default=False)
+PERF_WINDOW_MINUTES = env.int("PERF_WINDOW_MINUTES", default=15)
+PERF_PUBLISH_INTERVAL = env.int("PERF_PUBLISH_INTERVAL", default=10)
+PERF_N_PLUS_ONE_THRESHOLD = env.int("PERF_N_PLUS_ONE_THRESHOLD", default=5)
+
+# Background jobs, run by `manage.py run_worker`
+JOB_TRANSPORT = env.str("JOB_TRANSPORT", default="restaurant_app.jobs.DatabaseTransport")
+JOB_MAX_ATTEMPTS = env.int("JOB_MAX_ATTEMPTS", default=5)
+# Seconds before the first retry, doubled for every further attempt
+JOB_RETRY_BACKOFF = env.int("JOB_RETRY_BACKOFF", default=10)
+JOB_RETRY_BACKOFF_MAX = env.int("JOB_RETRY_BACKOFF_MAX", default=3600)
+# Seconds after which a job still marked running is assumed lost
+JOB_LOCK_TIMEOUT = env.int("JOB_LOCK_TIMEOUT", default=600)
+# Maximum jobs of a queue running at once across all workers
+JOB_QUEUE_LIMITS = env.dict("JOB_QUEUE_LIMITS", subcast_values=int, default={"sms": 2, "pdf": 2})
+# Task name -> seconds between runs, queued by the workers themselves
+JOB_SCHEDULE = env.dict("JOB_SCHEDULE", subcast_values=int, default={"prune_tokens": 3600})
+# Expired simplejwt tokens are deleted this many at a time, with a pause
+# (seconds) between batches, see restaurant_app/token_tables.py
+TOKEN_PRUNE_BATCH_SIZE = env.int("TOKEN_PRUNE_BATCH_SIZE", default=1000)
+TOKEN_PRUNE_PAUSE = env.float("TOKEN_PRUNE_PAUSE", default=0.05)
+
+SMS_BACKEND = env.str("SMS_BACKEND", default="restaurant_app.sms.TwilioBackend")
+# Logo drawn on order PDFs, empty to leave it out
+ORDER_PDF_LOGO = env.str(
+    "ORDER_PDF_LOGO", default="https://cdn-icons-png.flaticon.com/256/261/261192.png"
+)
+
 UNFOLD = {
     "SITE_TITLE": "Nasscript",
     "SITE_HEADER": "Nasscript",
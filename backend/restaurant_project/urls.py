@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from django.urls import path, include
 
 from rest_framework_simplejwt.views import TokenRefreshView
+from restaurant_app import realtime
 from restaurant_app.views import (
     ChairBookingViewSet,
     ChairsViewSet,
@@ -33,6 +34,9 @@ from restaurant_app.views import (
     MessViewSet,
     MessTypeViewSet,
     SearchDishesAPIView,
+    MenuCatalogueView,
+    TokenMetricsView,
+    PerfReportView,
     CreditUserViewSet,
     CreditOrderViewSet,
     MessTransactionViewSet,
@@ -122,7 +126,11 @@ urlpatterns = [
     path("api/login-passcode/", PasscodeLoginView.as_view(), name="login-passcode"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/logout/", LogoutView.as_view({"post": "logout"}), name="logout"),
+    path("api/token-metrics/", TokenMetricsView.as_view(), name="token_metrics"),
+    path("api/_perf/", PerfReportView.as_view(), name="perf_report"),
     path("api/search-dishes/", SearchDishesAPIView.as_view(), name="search_dishes"),  # Include the search API endpoint
+    path("api/menu-catalogue/", MenuCatalogueView.as_view(), name="menu_catalogue"),
+    path("api/events/", realtime.event_stream, name="events"),
 
     # Register the new Cancel Order API
     path("api/bills/<int:bill_id>/cancel_order/", CancelOrderByBillView.as_view(), name="cancel-order-by-bill"),
@@ -0,0 +1,50 @@
+"""
+Gap-free named counters backed by the Sequence table.
+
+`next_value` increments the counter row and reads it back with a single
+UPDATE ... RETURNING, which takes the row lock (the database write lock on
+SQLite) until the surrounding transaction ends. Concurrent callers
+therefore queue on the row and never see the same value. A rolled back
+transaction also rolls back its increment, so no number is skipped. Call
+it inside the transaction that writes the numbered document, and keep
+that transaction short: it holds the lock until it commits.
+"""
+from django.db import IntegrityError, connection, transaction
+
+
+def next_value(name, initial=None, count=1):
+    """
+    Allocate the next value of the sequence `name`.
+
+    `initial` is a callable returning the last value already in use. It is
+    only called the first time the sequence is used, to continue an
+    existing numbering. With `count`, reserves that many consecutive
+    values in one step and returns the last of them.
+    """
+    from sequences.models import Sequence
+
+    with transaction.atomic(savepoint=False):
+        value = _increment(name, count)
+        if value is None:
+            value = (initial() if initial else 0) + count
+            try:
+                with transaction.atomic():
+                    Sequence.objects.create(name=name, last_value=value)
+            except IntegrityError:
+                # Another transaction created it first
+                value = _increment(name, count)
+        return value
+
+
+def _increment(name, count):
+    from sequences.models import Sequence
+
+    table = connection.ops.quote_name(Sequence._meta.db_table)
+    with connection.cursor() as cursor:
+        # UPDATE ... RETURNING is understood by PostgreSQL and SQLite >= 3.35
+        cursor.execute(
+            f"UPDATE {table} SET last_value = last_value + %s WHERE name = %s RETURNING last_value",
+            (count, name),
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class Sequence(models.Model):
+    """
+    Named counter for gap-free document numbers (see counters.py).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
@@ -7,6 +7,7 @@ admin.site.register(NatureGroup,UnflodModelAdmin)
 admin.site.register(MainGroup,UnflodModelAdmin)
 admin.site.register(Ledger,UnflodModelAdmin)
 admin.site.register(Transaction,UnflodModelAdmin)
+admin.site.register(LedgerCheckpoint,UnflodModelAdmin)
 admin.site.register(ShareUsers,UnflodModelAdmin)
 admin.site.register(ProfitLossShareTransaction,UnflodModelAdmin)
 admin.site.register(ShareUserTransaction,UnflodModelAdmin)
@@ -0,0 +1,225 @@
+"""
+Running balances of the ledgers.
+
+A transaction's balance_amount is the signed running total of its ledger
+in (date, id) order: debits add debit_amount, credits subtract
+credit_amount. Next to it, LedgerCheckpoint keeps one row per ledger and
+day with that day's debit and credit totals and the closing balance, so
+the balance at any date is a single indexed lookup instead of a scan of
+the ledger's history. Before a ledger's first checkpoint, e.g. for one
+not recomputed since the checkpoints were added, the balance is the sum
+of its rows up to that date instead.
+
+A transaction added after the last one of its ledger, the usual case,
+only needs its own balance and its day's checkpoint (`append`). Any other
+write only invalidates what comes after it. `recompute(ledger_id,
+from_date)` starts from the last checkpoint before `from_date`, refreshes
+the checkpoints from that day on, and rewrites the balances of the later
+transactions with one windowed UPDATE. Transaction.save calls it for the
+dates it touches; deletes are collected and recomputed once per ledger
+when the transaction commits. Code that writes transactions with
+bulk_create or queryset.update() must call `recompute` itself, or, when it
+appends rows with their balance_amount already set, `refresh_checkpoints`.
+`manage.py rebuild_ledger_balances` recomputes whole ledgers.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When, Window
+
+ZERO = Decimal("0.00")
+
+
+def signed_amount():
+    from .models import Transaction
+
+    return Case(
+        When(debit_credit=Transaction.DEBIT, then=F("debit_amount")),
+        When(debit_credit=Transaction.CREDIT, then=-F("credit_amount")),
+        default=Value(ZERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def _balance(ledger_id, **dates):
+    from .models import LedgerCheckpoint, Transaction
+
+    balance = (
+        LedgerCheckpoint.objects.filter(ledger_id=ledger_id, **dates)
+        .order_by("-date").values_list("closing_balance", flat=True).first()
+    )
+    if balance is not None:
+        return balance
+    # No checkpoint that early, e.g. a ledger never recomputed since the
+    # checkpoints were introduced: add up its rows instead
+    balance = (
+        Transaction.objects.filter(ledger_id=ledger_id, **dates)
+        .aggregate(balance=Sum(signed_amount()))["balance"]
+    )
+    return balance if balance is not None else ZERO
+
+
+def balance_before(ledger_id, date):
+    """Closing balance of the ledger at the end of the day before `date`."""
+    return _balance(ledger_id, date__lt=date)
+
+
+def balance_at(ledger_id, date):
+    """Closing balance of the ledger at the end of `date`."""
+    return _balance(ledger_id, date__lte=date)
+
+
+def closing_balance(ledger_id):
+    """Balance of the ledger after its latest transaction."""
+    return _balance(ledger_id)
+
+
+def _refresh_checkpoints(ledger_id, from_date, opening):
+    from .models import LedgerCheckpoint, Transaction
+
+    days = (
+        Transaction.objects.filter(ledger_id=ledger_id, date__gte=from_date)
+        .values("date")
+        .annotate(
+            debit_total=Sum(Case(
+                When(debit_credit=Transaction.DEBIT, then=F("debit_amount")), default=Value(ZERO),
+            )),
+            credit_total=Sum(Case(
+                When(debit_credit=Transaction.CREDIT, then=F("credit_amount")), default=Value(ZERO),
+            )),
+        )
+        .order_by("date")
+    )
+    checkpoints, balance = [], opening
+    for day in days:
+        balance += day["debit_total"] - day["credit_total"]
+        checkpoints.append(LedgerCheckpoint(
+            ledger_id=ledger_id,
+            date=day["date"],
+            debit_total=day["debit_total"],
+            credit_total=day["credit_total"],
+            closing_balance=balance,
+        ))
+    LedgerCheckpoint.objects.filter(ledger_id=ledger_id, date__gte=from_date).delete()
+    LedgerCheckpoint.objects.bulk_create(checkpoints)
+
+
+def _update_balances(ledger_id, from_date, opening):
+    from .models import Transaction
+
+    running = (
+        Transaction.objects.filter(ledger_id=ledger_id, date__gte=from_date)
+        .annotate(running=Window(Sum(signed_amount()), order_by=[F("date").asc(), F("id").asc()]))
+        .values("id", "running")
+    )
+    select, params = running.query.sql_with_params()
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    with connection.cursor() as cursor:
+        # UPDATE ... FROM is understood by PostgreSQL and SQLite >= 3.33
+        cursor.execute(
+            f"UPDATE {table} SET balance_amount = ROUND(%s + running.running, 2) "
+            f"FROM ({select}) AS running WHERE {table}.id = running.id",
+            (opening, *params),
+        )
+
+
+def recompute(ledger_id, from_date=None):
+    """
+    Recompute the checkpoints and transaction balances of a ledger from
+    `from_date` (default: the whole history) onwards.
+    """
+    from .models import Ledger, LedgerCheckpoint, Transaction
+
+    with transaction.atomic(savepoint=False):
+        # Writers of the same ledger take turns, or each would recompute
+        # the suffix without the other's rows
+        if not Ledger.objects.select_for_update().filter(pk=ledger_id).exists():
+            return
+        if from_date is None:
+            LedgerCheckpoint.objects.filter(ledger_id=ledger_id).delete()
+            from_date = (
+                Transaction.objects.filter(ledger_id=ledger_id)
+                .order_by("date").values_list("date", flat=True).first()
+            )
+            if from_date is None:
+                return
+        opening = balance_before(ledger_id, from_date)
+        _refresh_checkpoints(ledger_id, from_date, opening)
+        _update_balances(ledger_id, from_date, opening)
+
+
+def append(new):
+    """
+    Balance a transaction about to be inserted that sorts after every other
+    one of its ledger: set its balance_amount and add it to the checkpoint
+    of its day. Returns False, changing nothing, when the ledger has later
+    days, or rows that day but no checkpoint; the caller then recomputes
+    once the row is saved.
+    """
+    from .models import Ledger, LedgerCheckpoint, Transaction
+
+    field = Transaction._meta.get_field
+    debit = credit = ZERO
+    if new.debit_credit == Transaction.DEBIT:
+        debit = field("debit_amount").to_python(new.debit_amount)
+    elif new.debit_credit == Transaction.CREDIT:
+        credit = field("credit_amount").to_python(new.credit_amount)
+
+    with transaction.atomic(savepoint=False):
+        if not Ledger.objects.select_for_update().filter(pk=new.ledger_id).exists():
+            return False
+        rows = Transaction.objects.filter(ledger_id=new.ledger_id)
+        if rows.filter(date__gt=new.date).exists():
+            return False
+        checkpoint = LedgerCheckpoint.objects.filter(ledger_id=new.ledger_id, date=new.date).first()
+        if checkpoint is not None:
+            new.balance_amount = checkpoint.closing_balance + debit - credit
+            LedgerCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                debit_total=F("debit_total") + debit,
+                credit_total=F("credit_total") + credit,
+                closing_balance=new.balance_amount,
+            )
+            return True
+        if rows.filter(date=new.date).exists():
+            return False
+        new.balance_amount = balance_before(new.ledger_id, new.date) + debit - credit
+        LedgerCheckpoint.objects.create(
+            ledger_id=new.ledger_id,
+            date=new.date,
+            debit_total=debit,
+            credit_total=credit,
+            closing_balance=new.balance_amount,
+        )
+        return True
+
+
+def refresh_checkpoints(ledger_id, from_date):
+    """
+    Refresh the checkpoints of a ledger from `from_date` onwards, for
+    writers that set balance_amount themselves (see posting.py).
+    """
+    from .models import Ledger
+
+    with transaction.atomic(savepoint=False):
+        Ledger.objects.select_for_update().filter(pk=ledger_id).exists()
+        _refresh_checkpoints(ledger_id, from_date, balance_before(ledger_id, from_date))
+
+
+def recompute_on_commit(ledger_id, from_date):
+    """
+    Recompute once the current transaction commits, merging the requests
+    for the same ledger, e.g. for the rows removed by a cascading delete.
+    """
+    pending = connection.__dict__.setdefault("_pending_ledger_balances", {})
+    if ledger_id not in pending or from_date < pending[ledger_id]:
+        pending[ledger_id] = from_date
+    # The first callback to run does the work for all of them. Requests
+    # left over from a rolled back transaction only cause a redundant,
+    # still correct, recompute.
+    transaction.on_commit(_recompute_pending)
+
+
+def _recompute_pending():
+    pending = connection.__dict__.pop("_pending_ledger_balances", {})
+    for ledger_id, from_date in pending.items():
+        recompute(ledger_id, from_date)
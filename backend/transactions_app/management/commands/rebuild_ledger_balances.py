@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions_app import balances
+from transactions_app.models import Ledger, LedgerCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Recompute the running balances and daily checkpoints of the ledgers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ledger", type=int, action="append",
+                            help="ledger id to rebuild, may be repeated (default: every ledger)")
+
+    def handle(self, *args, **options):
+        ledger_ids = options["ledger"] or list(Ledger.objects.order_by("id").values_list("id", flat=True))
+        unknown = set(ledger_ids) - set(Ledger.objects.filter(id__in=ledger_ids).values_list("id", flat=True))
+        if unknown:
+            raise CommandError(f"Unknown ledger id(s): {', '.join(map(str, sorted(unknown)))}")
+
+        for ledger_id in ledger_ids:
+            balances.recompute(ledger_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(ledger_ids)} ledgers, "
+            f"{LedgerCheckpoint.objects.filter(ledger_id__in=ledger_ids).count()} daily checkpoints."
+        ))
@@ -1,8 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 import datetime
 from decimal import Decimal
 
+from sequences import counters
+
+from . import balances
+
 
 class NatureGroup(models.Model): # This gorup as main group
     name = models.CharField(max_length=100, unique=True)
@@ -25,10 +31,25 @@ class Ledger(models.Model):
     group = models.ForeignKey(MainGroup, on_delete=models.CASCADE, related_name='ledgers')
     debit_credit = models.CharField(max_length=6, choices=[('DEBIT', 'Debit'), ('CREDIT', 'Credit')], blank=True)
 
+    class Meta:
+        indexes = [
+            # The ledger reports look ledgers up by name
+            models.Index(fields=["name"], name="ledger_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+def next_voucher_number(count=1):
+    # Continues from the highest voucher number posted before the counter
+    # existed. With `count`, reserves a block and returns its last number.
+    return counters.next_value(
+        "voucher", count=count,
+        initial=lambda: Transaction.objects.aggregate(last=models.Max("voucher_no"))["last"] or 0,
+    )
+
+
 class Transaction(models.Model):
     DEBIT = 'debit'
     CREDIT = 'credit'
@@ -56,29 +77,81 @@ class Transaction(models.Model):
         choices=DEBIT_CREDIT_CHOICES
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-date", "-id"], name="transaction_date_idx"),
+            # A ledger's lines in statement order; also serves the
+            # running balance recomputes in balances.py
+            models.Index(fields=["ledger", "date", "id"], name="transaction_ledger_date_idx"),
+        ]
+        constraints = [
+            # One debit and one credit leg per voucher; also serves the
+            # voucher_no lookups
+            models.UniqueConstraint(fields=["voucher_no", "debit_credit"], name="transaction_voucher_leg_unique"),
+        ]
+
     def __str__(self):
         return f"{self.ledger.name} - {self.date} - Voucher No: {self.voucher_no}"
 
+    # Fields that move the running balance of the ledger
+    BALANCE_FIELDS = ("ledger_id", "date", "debit_credit", "debit_amount", "credit_amount")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields():
+            instance._balance_state = instance.balance_state()
+        return instance
+
+    def balance_state(self):
+        return tuple(getattr(self, field) for field in self.BALANCE_FIELDS)
+
     def save(self, *args, **kwargs):
-        latest_transaction = Transaction.objects.filter(ledger=self.ledger).order_by('-date', '-id').first()
-        
-        if latest_transaction:
-            previous_balance = latest_transaction.balance_amount
-        else:
-            previous_balance = Decimal('0.00')  
-        
-        was_negative = previous_balance < 0
-        previous_balance = abs(previous_balance)  
-        
-        if self.debit_credit == self.DEBIT:
-            self.balance_amount = previous_balance + self.debit_amount
-        elif self.debit_credit == self.CREDIT:
-            self.balance_amount = previous_balance - self.credit_amount
-        
-        if was_negative:
-            self.balance_amount = -abs(self.balance_amount)
-        
-        super().save(*args, **kwargs)
+        previous = getattr(self, "_balance_state", None)
+        changed = previous is None or previous != self.balance_state()
+        with transaction.atomic(savepoint=False):
+            # A new last line of its ledger is balanced before the insert
+            appended = self.pk is None and balances.append(self)
+            super().save(*args, **kwargs)
+            if changed and not appended:
+                # Everything from the earliest date involved onwards, in
+                # the old and the new ledger
+                start = {self.ledger_id: self.date}
+                if previous is not None:
+                    old_ledger_id, old_date = previous[0], previous[1]
+                    start[old_ledger_id] = min(old_date, start.get(old_ledger_id, old_date))
+                for ledger_id in sorted(start):
+                    balances.recompute(ledger_id, start[ledger_id])
+                self.balance_amount = (
+                    Transaction.objects.filter(pk=self.pk).values_list("balance_amount", flat=True).get()
+                )
+        self._balance_state = self.balance_state()
+
+
+class LedgerCheckpoint(models.Model):
+    """
+    Per ledger and day: the day's debit and credit totals and the ledger's
+    closing balance. Maintained by balances.py.
+    """
+    ledger = models.ForeignKey(Ledger, on_delete=models.CASCADE, related_name="checkpoints")
+    date = models.DateField()
+    debit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    closing_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ("ledger", "date")
+        constraints = [
+            models.UniqueConstraint(fields=["ledger", "date"], name="ledger_checkpoint_unique_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.ledger_id} - {self.date}: {self.closing_balance}"
+
+
+@receiver(post_delete, sender=Transaction)
+def recompute_balances_after_delete(sender, instance, **kwargs):
+    balances.recompute_on_commit(instance.ledger_id, instance.date)
 
 
 
@@ -0,0 +1,71 @@
+"""
+Bulk posting of double-entry vouchers, for the end-of-day imports.
+
+`post_vouchers` takes the validated output of BulkVoucherSerializer and
+writes the whole batch in one transaction: one block of voucher numbers
+from the counter and bulk_create for all the legs, BATCH_SIZE rows per
+INSERT. bulk_create skips Transaction.save, so the running balances are
+handled here. A ledger that only gets legs dated on or after its latest
+transaction, the usual case for an import, has its balances computed in
+memory from its closing balance before the INSERT, and only its
+checkpoints refreshed afterwards. A ledger the batch backdates is recomputed from the earliest
+date posted to it.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from . import balances
+from .models import Ledger, Transaction, next_voucher_number
+
+# Legs per INSERT statement
+BATCH_SIZE = 1000
+
+
+def post_vouchers(vouchers):
+    """Post `vouchers` and return the range of voucher numbers they got."""
+    if not vouchers:
+        return range(0)
+    with transaction.atomic():
+        last = next_voucher_number(count=len(vouchers))
+        numbers = range(last - len(vouchers) + 1, last + 1)
+        legs, by_ledger = [], {}
+        for voucher_no, voucher in zip(numbers, vouchers):
+            for leg in (voucher['transaction1'], voucher['transaction2']):
+                leg = Transaction(**leg, voucher_no=voucher_no)
+                legs.append(leg)
+                by_ledger.setdefault(leg.ledger_id, []).append(leg)
+        starts = {ledger_id: min(leg.date for leg in rows) for ledger_id, rows in by_ledger.items()}
+
+        # Same order as Transaction.save, so concurrent writers lock the
+        # ledgers in the same sequence
+        list(Ledger.objects.select_for_update().filter(pk__in=starts).order_by('pk').values_list('pk'))
+        latest = dict(
+            Transaction.objects.filter(ledger_id__in=starts)
+            .values('ledger_id').annotate(last=Max('date')).values_list('ledger_id', 'last')
+        )
+        appended = {
+            ledger_id for ledger_id, start in starts.items()
+            if ledger_id not in latest or start >= latest[ledger_id]
+        }
+        for ledger_id in appended:
+            _assign_balances(by_ledger[ledger_id], balances.balance_at(ledger_id, starts[ledger_id]))
+
+        Transaction.objects.bulk_create(legs, batch_size=BATCH_SIZE)
+        for ledger_id in sorted(starts):
+            if ledger_id in appended:
+                balances.refresh_checkpoints(ledger_id, starts[ledger_id])
+            else:
+                balances.recompute(ledger_id, starts[ledger_id])
+    return numbers
+
+
+def _assign_balances(legs, opening):
+    # The legs get increasing ids in list order, so (date, list position)
+    # is their (date, id) order
+    balance = opening
+    for leg in sorted(legs, key=lambda leg: leg.date):
+        if leg.debit_credit == Transaction.DEBIT:
+            balance += leg.debit_amount
+        else:
+            balance -= leg.credit_amount
+        leg.balance_amount = balance
@@ -33,14 +33,76 @@ class LedgerSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class TransactionSerializer(serializers.ModelSerializer):
-    ledger_id = serializers.PrimaryKeyRelatedField(queryset=Ledger.objects.all(), source='ledger', write_only=True)
+    # The ledgers come with the groups that ledger and particulars nest
+    ledger_id = serializers.PrimaryKeyRelatedField(queryset=Ledger.objects.select_related('group__nature_group'), source='ledger', write_only=True)
     ledger = LedgerSerializer(read_only=True)
-    particulars_id = serializers.PrimaryKeyRelatedField(queryset=Ledger.objects.all(), source='particulars', write_only=True)
+    particulars_id = serializers.PrimaryKeyRelatedField(queryset=Ledger.objects.select_related('group__nature_group'), source='particulars', write_only=True)
     particulars =  LedgerSerializer(read_only=True)
     class Meta:
         model = Transaction
         fields = '__all__'
 
+class VoucherLegSerializer(TransactionSerializer):
+    # A leg of a new voucher; the view numbers the voucher once both legs
+    # are valid
+    class Meta(TransactionSerializer.Meta):
+        read_only_fields = ['voucher_no']
+
+class BulkVoucherListSerializer(serializers.ListSerializer):
+    def validate(self, vouchers):
+        # Every ledger of the batch in one query, instead of two
+        # PrimaryKeyRelatedField lookups per leg
+        ids = {
+            leg[field]
+            for voucher in vouchers
+            for leg in voucher.values()
+            for field in ('ledger_id', 'particulars_id')
+        }
+        missing = ids - Ledger.objects.only('id').in_bulk(ids).keys()
+        if missing:
+            raise serializers.ValidationError(
+                {'ledger_id': [f'Invalid ledger ids: {", ".join(map(str, sorted(missing)))}.']}
+            )
+        return vouchers
+
+
+class TransactionLegSerializer(serializers.ModelSerializer):
+    ledger_id = serializers.IntegerField()
+    particulars_id = serializers.IntegerField()
+
+    class Meta:
+        model = Transaction
+        fields = [
+            'transaction_type', 'ledger_id', 'particulars_id', 'date', 'debit_amount',
+            'credit_amount', 'remarks', 'ref_no', 'debit_credit',
+        ]
+
+
+class BulkVoucherSerializer(serializers.Serializer):
+    transaction1 = TransactionLegSerializer()
+    transaction2 = TransactionLegSerializer()
+
+    class Meta:
+        list_serializer_class = BulkVoucherListSerializer
+
+    def validate(self, attrs):
+        legs = {leg['debit_credit']: leg for leg in attrs.values()}
+        if legs.keys() != {Transaction.DEBIT, Transaction.CREDIT}:
+            raise serializers.ValidationError('A voucher needs one debit and one credit leg.')
+        # Each leg moves the balance by its own side's amount only
+        for side, amount, other in (
+            (Transaction.DEBIT, 'debit_amount', 'credit_amount'),
+            (Transaction.CREDIT, 'credit_amount', 'debit_amount'),
+        ):
+            if not legs[side].get(amount, 0) > 0:
+                raise serializers.ValidationError(f'The {side} leg needs a positive {amount}.')
+            if legs[side].get(other, 0):
+                raise serializers.ValidationError(f'The {side} leg cannot have a {other}.')
+        if legs[Transaction.DEBIT]['debit_amount'] != legs[Transaction.CREDIT]['credit_amount']:
+            raise serializers.ValidationError('The debit and credit amounts of a voucher must match.')
+        return attrs
+
+
 #ShareManagement
 class ShareUserManagementSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,242 @@
+"""
+Financial statements over the ledger hierarchy.
+
+`ledger_totals` reads the debit and credit totals of every ledger for a
+date range in one grouped query, joined up to its MainGroup and
+NatureGroup. `hierarchy` rolls those rows up into
+NatureGroup -> MainGroup -> Ledger, and the statements are cut from that
+tree:
+
+- trial balance: every ledger, with the debit and credit totals of the
+  period and its balance (debit minus credit);
+- profit and loss: the Income and Expense natures;
+- balance sheet: the Asset and Liability natures with their balances as
+  of the end of the period, everything posted before it included, the
+  period's net profit on the liabilities side and its net loss on the
+  assets side, and the earlier periods' result as retained earnings.
+
+For the balance sheet, `ledger_totals` reads the books from their start:
+each ledger's debit and credit stay the period's, and what was posted
+before the period comes as its opening balance.
+
+Nature groups are matched by name, case-insensitively, like the
+filter-by-nature-group endpoint does. With
+settings.FINANCIAL_STATEMENTS_FROM_CHECKPOINTS, ranges longer than
+CHECKPOINT_MIN_DAYS are summed from the per-day LedgerCheckpoint rows
+instead of the transactions.
+
+The ledger statement is one ledger's lines for a period, as flat rows in
+(date, id) order. Each line carries the running balance that balances.py
+keeps in balance_amount, and the statement opens with the balance at the
+end of the day before the period, read from the checkpoints.
+"""
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+
+from . import balances
+from .balances import ZERO
+from .models import LedgerCheckpoint, Transaction
+
+INCOME = 'income'
+EXPENSE = 'expense'
+ASSET = 'asset'
+LIABILITY = 'liability'
+
+CHECKPOINT_MIN_DAYS = 31
+
+AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+
+
+def ledger_totals(from_date, to_date, opening=False):
+    """
+    Debit and credit totals per ledger between the two dates, inclusive.
+    With `opening`, also the debit and credit totals of everything before
+    `from_date`, as opening_debit and opening_credit.
+    """
+    days = (to_date - from_date).days if not opening else None
+    if settings.FINANCIAL_STATEMENTS_FROM_CHECKPOINTS and (days is None or days >= CHECKPOINT_MIN_DAYS):
+        # A row per ledger and day instead of one per transaction
+        rows = LedgerCheckpoint.objects.all()
+        debit_amount, credit_amount = F('debit_total'), F('credit_total')
+    else:
+        rows = Transaction.objects.all()
+        debit_amount = Case(
+            When(debit_credit=Transaction.DEBIT, then=F('debit_amount')), default=Value(ZERO), output_field=AMOUNT,
+        )
+        credit_amount = Case(
+            When(debit_credit=Transaction.CREDIT, then=F('credit_amount')), default=Value(ZERO), output_field=AMOUNT,
+        )
+    if opening:
+        rows = rows.filter(date__lte=to_date)
+        period, before = Q(date__gte=from_date), Q(date__lt=from_date)
+        totals = {
+            'debit': Sum(debit_amount, filter=period, output_field=AMOUNT),
+            'credit': Sum(credit_amount, filter=period, output_field=AMOUNT),
+            'opening_debit': Sum(debit_amount, filter=before, output_field=AMOUNT),
+            'opening_credit': Sum(credit_amount, filter=before, output_field=AMOUNT),
+        }
+    else:
+        rows = rows.filter(date__range=(from_date, to_date))
+        totals = {'debit': Sum(debit_amount, output_field=AMOUNT), 'credit': Sum(credit_amount, output_field=AMOUNT)}
+    return (
+        rows.values(
+            'ledger_id',
+            'ledger__name',
+            'ledger__group_id',
+            'ledger__group__name',
+            'ledger__group__nature_group_id',
+            'ledger__group__nature_group__name',
+        )
+        .annotate(**totals)
+        .order_by('ledger__group__nature_group__name', 'ledger__group__name', 'ledger__name', 'ledger_id')
+    )
+
+
+def _node(id, name, children_key=None, opening=False):
+    node = {'id': id, 'name': name}
+    if opening:
+        node['opening'] = ZERO
+    node.update(debit=ZERO, credit=ZERO, balance=ZERO)
+    if children_key:
+        node[children_key] = []
+    return node
+
+
+def _add(node, debit, credit, opening=ZERO):
+    node['debit'] += debit
+    node['credit'] += credit
+    if 'opening' in node:
+        node['opening'] += opening
+    node['balance'] = node.get('opening', ZERO) + node['debit'] - node['credit']
+
+
+def hierarchy(rows, opening=False):
+    """
+    Roll ledger_totals rows up into nature groups and their main groups.
+    With `opening`, every node also carries its opening balance, and its
+    balance is the closing one.
+    """
+    natures, groups = {}, {}
+    for row in rows:
+        debit, credit = row['debit'] or ZERO, row['credit'] or ZERO
+        before = (row['opening_debit'] or ZERO) - (row['opening_credit'] or ZERO) if opening else ZERO
+        nature_id, group_id = row['ledger__group__nature_group_id'], row['ledger__group_id']
+        if nature_id not in natures:
+            natures[nature_id] = _node(nature_id, row['ledger__group__nature_group__name'], 'groups', opening)
+        if group_id not in groups:
+            groups[group_id] = _node(group_id, row['ledger__group__name'], 'ledgers', opening)
+            natures[nature_id]['groups'].append(groups[group_id])
+        ledger = _node(row['ledger_id'], row['ledger__name'], opening=opening)
+        groups[group_id]['ledgers'].append(ledger)
+        for node in (ledger, groups[group_id], natures[nature_id]):
+            _add(node, debit, credit, before)
+    return list(natures.values())
+
+
+def _natures(tree, *names):
+    return [nature for nature in tree if nature['name'].lower() in names]
+
+
+def _total(natures, field):
+    return sum((nature[field] for nature in natures), ZERO)
+
+
+def trial_balance(tree):
+    total_debit, total_credit = _total(tree, 'debit'), _total(tree, 'credit')
+    return {
+        'natures': tree,
+        'total_debit': total_debit,
+        'total_credit': total_credit,
+        'difference': total_debit - total_credit,
+    }
+
+
+def profit_and_loss(tree):
+    income, expense = _natures(tree, INCOME), _natures(tree, EXPENSE)
+    # Same measures as before: debits posted to expenses, credits posted
+    # to income
+    total_expense, total_income = _total(expense, 'debit'), _total(income, 'credit')
+    return {
+        'total_expense': total_expense,
+        'total_income': total_income,
+        'net_profit': max(total_income - total_expense, ZERO),
+        'net_loss': max(total_expense - total_income, ZERO),
+        'income': income,
+        'expense': expense,
+    }
+
+
+def balance_sheet(tree):
+    """From a hierarchy with opening balances, see ledger_totals."""
+    assets, liabilities = _natures(tree, ASSET), _natures(tree, LIABILITY)
+    result = profit_and_loss(tree)
+    # Income less expenses posted before the period
+    retained_earnings = -_total(_natures(tree, INCOME, EXPENSE), 'opening')
+    total_assets = _total(assets, 'balance') + result['net_loss']
+    total_liabilities = -_total(liabilities, 'balance') + result['net_profit'] + retained_earnings
+    return {
+        'assets': assets,
+        'liabilities': liabilities,
+        'net_profit': result['net_profit'],
+        'net_loss': result['net_loss'],
+        'retained_earnings': retained_earnings,
+        'total_assets': total_assets,
+        'total_liabilities': total_liabilities,
+        'difference': total_assets - total_liabilities,
+    }
+
+
+STATEMENTS = {
+    'trial-balance': trial_balance,
+    'profit-and-loss': profit_and_loss,
+    'balance-sheet': balance_sheet,
+}
+
+
+# Statements of balances as of to_date rather than movements of the period
+OPENING_BALANCES = {'balance-sheet'}
+
+
+def build(statement, from_date, to_date):
+    opening = statement in OPENING_BALANCES
+    report = STATEMENTS[statement](hierarchy(ledger_totals(from_date, to_date, opening), opening))
+    return {'from_date': from_date, 'to_date': to_date, **report}
+
+
+# (field, header) pairs of a ledger statement line, for exports.stream
+LEDGER_STATEMENT_COLUMNS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('voucher_no', 'voucher_no'),
+    ('transaction_type', 'transaction_type'),
+    ('particulars_id', 'particulars_id'),
+    ('particulars_name', 'particulars'),
+    ('remarks', 'remarks'),
+    ('ref_no', 'ref_no'),
+    ('debit_credit', 'debit_credit'),
+    ('debit_amount', 'debit_amount'),
+    ('credit_amount', 'credit_amount'),
+    ('balance', 'balance'),
+]
+
+
+def ledger_lines(ledger_id, from_date=None, to_date=None):
+    """The ledger's transactions between the dates as flat rows, in (date, id) order."""
+    lines = Transaction.objects.filter(ledger_id=ledger_id)
+    if from_date:
+        lines = lines.filter(date__gte=from_date)
+    if to_date:
+        lines = lines.filter(date__lte=to_date)
+    return lines.values(
+        'id', 'date', 'voucher_no', 'transaction_type', 'particulars_id', 'remarks', 'ref_no',
+        'debit_credit', 'debit_amount', 'credit_amount',
+        particulars_name=F('particulars__name'),
+        balance=F('balance_amount'),
+    ).order_by('date', 'id')
+
+
+def ledger_balances(ledger_id, from_date=None, to_date=None):
+    """Opening and closing balance of the ledger for the period."""
+    opening = balances.balance_before(ledger_id, from_date) if from_date else ZERO
+    closing = balances.balance_at(ledger_id, to_date) if to_date else balances.closing_balance(ledger_id)
+    return opening, closing
@@ -1,6 +1,6 @@
 from rest_framework import viewsets,status
 from django.db import transaction 
-from django.db.models import Sum, Q
+from django.db.models import Q
 from datetime import datetime
 from django.db.models import F, Min
 
@@ -10,7 +10,8 @@ from .models import (
     MainGroup, 
     Ledger, 
     Transaction,
-    ShareUsers
+    ShareUsers,
+    next_voucher_number,
     )
 from .serializers import (
      CashCountSheetSerializer,
@@ -18,14 +19,55 @@ from .serializers import (
      MainGroupSerializer, 
      LedgerSerializer, 
      TransactionSerializer,
+     VoucherLegSerializer,
      ShareUserManagementSerializer,
      ProfitLossShareTransaction,
-     ProfitLossShareTransactionSerializer
+     ProfitLossShareTransactionSerializer,
+     BulkVoucherSerializer,
      )
+from . import posting, statements
+from django.conf import settings
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.utils.dateparse import parse_date
 from rest_framework.exceptions import NotFound
+from rest_framework.settings import api_settings
+from restaurant_app import exports
+from restaurant_app.pagination import KeysetPagination
+from restaurant_app.projections import CompactListMixin, compact_row, compact_rows
+
+
+# The ledger statement also answers ?format=csv|xlsx|ndjson, see exports.py
+REPORT_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, *exports.EXPORT_RENDERERS]
+
+
+class LedgerStatementPagination(KeysetPagination):
+    # Always by cursor, oldest line first: a statement is read forwards and
+    # may run to 100k+ lines
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+    # Start of the statement period. Past the first page the cursor's date
+    # is the tighter bound, and SQLite ranges the index on only one of the
+    # two, so it is only applied where the cursor does not imply it.
+    from_date = None
+
+    def use_keyset(self, request):
+        return True
+
+    def get_ordering(self, queryset, view):
+        return ['date', 'id']
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.from_date and not request.query_params.get(self.cursor_query_param):
+            queryset = queryset.filter(date__gte=self.from_date)
+        return super().paginate_queryset(queryset, request, view)
+
+    def after(self, position, reverse):
+        after = super().after(position, reverse)
+        if reverse and self.from_date:
+            after &= Q(date__gte=self.from_date)
+        return after
 
 class NatureGroupViewSet(viewsets.ModelViewSet):
     queryset = NatureGroup.objects.all()
@@ -35,16 +77,44 @@ class MainGroupViewSet(viewsets.ModelViewSet):
     queryset = MainGroup.objects.all()
     serializer_class = MainGroupSerializer
 
-class LedgerViewSet(viewsets.ModelViewSet):
-    queryset = Ledger.objects.all()
+class LedgerViewSet(CompactListMixin, viewsets.ModelViewSet):
+    queryset = Ledger.objects.select_related('group__nature_group')
     serializer_class = LedgerSerializer
-
-
-class TransactionViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all()
+    compact_fields = {
+        'id': 'id',
+        'name': 'name',
+        'group_id': 'group_id',
+        'group_name': 'group__name',
+        'nature_group_name': 'group__nature_group__name',
+    }
+
+
+class TransactionViewSet(CompactListMixin, viewsets.ModelViewSet):
+    # The serializer nests both ledgers down to their nature group
+    queryset = Transaction.objects.select_related(
+        'ledger__group__nature_group', 'particulars__group__nature_group'
+    )
     serializer_class = TransactionSerializer
+    pagination_class = KeysetPagination
+    # Transaction has no Meta.ordering; newest first, like the ledger views
+    cursor_ordering = ("-date", "-id")
+    compact_fields = {
+        'id': 'id',
+        'date': 'date',
+        'voucher_no': 'voucher_no',
+        'transaction_type': 'transaction_type',
+        'debit_credit': 'debit_credit',
+        'debit_amount': 'debit_amount',
+        'credit_amount': 'credit_amount',
+        'balance_amount': 'balance_amount',
+        'ref_no': 'ref_no',
+        'remarks': 'remarks',
+        'ledger_id': 'ledger_id',
+        'ledger_name': 'ledger__name',
+        'particulars_id': 'particulars_id',
+        'particulars_name': 'particulars__name',
+    }
 
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
         transaction1_data = request.data.get('transaction1')
         transaction2_data = request.data.get('transaction2')
@@ -52,24 +122,51 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if not transaction1_data or not transaction2_data:
             return Response({"error": "Both transaction1 and transaction2 are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Generate the next voucher number
-        last_transaction = Transaction.objects.order_by('-voucher_no').first()
-        next_voucher_no = (last_transaction.voucher_no + 1) if last_transaction else 1
-
-        # Assign the generated voucher number to both transactions
-        transaction1_data['voucher_no'] = next_voucher_no
-        transaction2_data['voucher_no'] = next_voucher_no
-
-        serializer1 = self.get_serializer(data=transaction1_data)
+        # Both legs are validated before the voucher is numbered, so the
+        # counter is only held for the writes
+        context = self.get_serializer_context()
+        serializer1 = VoucherLegSerializer(data=transaction1_data, context=context)
         serializer1.is_valid(raise_exception=True)
-        self.perform_create(serializer1)
-
-        serializer2 = self.get_serializer(data=transaction2_data)
+        serializer2 = VoucherLegSerializer(data=transaction2_data, context=context)
         serializer2.is_valid(raise_exception=True)
-        self.perform_create(serializer2)
-
+        if serializer1.validated_data['debit_credit'] == serializer2.validated_data['debit_credit']:
+            return Response({"error": "A voucher needs one debit and one credit transaction."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Allocated from a locked counter, so concurrent postings never
+            # share a voucher. The counter stays locked until the commit, but
+            # is still taken first: taken after the legs, SQLite refused far
+            # more postings that had read before their first write (see
+            # benchmarks/voucher_stress.py)
+            next_voucher_no = next_voucher_number()
+
+            # Assign the generated voucher number to both transactions
+            serializer1.save(voucher_no=next_voucher_no)
+            serializer2.save(voucher_no=next_voucher_no)
+
+        # Rendered after the commit, with the counter released
         return Response(serializer1.data, status=status.HTTP_201_CREATED) 
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        # {"vouchers": [{"transaction1": {...}, "transaction2": {...}}, ...]},
+        # each voucher shaped like the body of create
+        if not isinstance(request.data, dict):
+            return Response({"error": 'Expected an object with a "vouchers" list.'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = BulkVoucherSerializer(
+            data=request.data.get('vouchers'),
+            many=True,
+            allow_empty=False,
+            max_length=settings.TRANSACTION_BULK_MAX_VOUCHERS,
+        )
+        serializer.is_valid(raise_exception=True)
+        numbers = posting.post_vouchers(serializer.validated_data)
+        return Response({
+            'vouchers': len(numbers),
+            'first_voucher_no': numbers[0],
+            'last_voucher_no': numbers[-1],
+        }, status=status.HTTP_201_CREATED)
+
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
         
@@ -114,6 +211,16 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(filtered_transactions, many=True)
         return Response(serializer.data)
 
+    @staticmethod
+    def _ledgers(ledger_param):
+        # Determine if the parameter is a name or ID
+        try:
+            # If it converts to an integer, assume it's an ID
+            return Ledger.objects.filter(id=int(ledger_param))
+        except ValueError:
+            # Otherwise, treat it as a name
+            return Ledger.objects.filter(name=ledger_param)
+
     @action(detail=False, methods=['get'])
     def ledger_report(self, request):
         ledger_param = request.query_params.get('ledger', None)
@@ -123,19 +230,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if not ledger_param:
             return Response([])
 
-        # Determine if the parameter is a name or ID
-        try:
-            ledger_id = int(ledger_param)
-            # If it converts to an integer, assume it's an ID
-        except ValueError:
-            # Otherwise, treat it as a name and fetch the ID
-            ledger = Ledger.objects.filter(name=ledger_param).first()
-            ledger_id = ledger.id if ledger else None
+        ledger_id = self._ledgers(ledger_param).values_list('id', flat=True).first()
 
         if not ledger_id:
             return Response([])
 
-        queryset = self.queryset.filter(ledger__id=ledger_id)
+        # Balances run in (date, id) order, see balances.py
+        queryset = self.queryset.filter(ledger__id=ledger_id).order_by("date", "id")
 
         if from_date:
             from_date = parse_date(from_date)
@@ -152,6 +253,42 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path='ledger-statement', renderer_classes=REPORT_RENDERERS)
+    def ledger_statement(self, request):
+        ledger_param = request.query_params.get('ledger', None)
+        if not ledger_param:
+            return Response({"error": "ledger parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        ledger = self._ledgers(ledger_param).values('id', 'name').first()
+        if not ledger:
+            raise NotFound("Ledger not found")
+
+        dates = {}
+        for name in ('from_date', 'to_date'):
+            value = request.query_params.get(name, None)
+            dates[name] = parse_date(value) if value else None
+            if value and not dates[name]:
+                return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Flat rows with the running balance kept by balances.py, see
+        # statements.py
+        if request.accepted_renderer.format in exports.FORMATS:
+            lines = statements.ledger_lines(ledger['id'], **dates)
+            return exports.stream(request, lines, statements.LEDGER_STATEMENT_COLUMNS, f"ledger_{ledger['id']}_statement")
+
+        opening, closing = statements.ledger_balances(ledger['id'], **dates)
+        paginator = LedgerStatementPagination()
+        paginator.from_date = dates['from_date']
+        lines = statements.ledger_lines(ledger['id'], to_date=dates['to_date'])
+        page = paginator.paginate_queryset(lines, request, view=self)
+        response = paginator.get_paginated_response(compact_rows(page))
+        response.data = {
+            'ledger': ledger,
+            **dates,
+            **compact_row({'opening_balance': opening, 'closing_balance': closing}),
+            **response.data,
+        }
+        return response
+
     @action(detail=False, methods=['get'], url_path='filter-by-nature-group')
     def filter_by_nature_group(self, request):
         nature_group_name = request.query_params.get('nature_group_name', None)
@@ -186,48 +323,31 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(transactions, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'], url_path='profit-and-loss')
-    def profit_and_loss(self, request):
+    def _statement(self, request, statement):
         from_date = request.query_params.get('from_date', None)
         to_date = request.query_params.get('to_date', None)
 
-        # Date filters
-        filters = Q()
-        if from_date and to_date:
-            from_date_parsed = parse_date(from_date)
-            to_date_parsed = parse_date(to_date)
-
-            if from_date_parsed and to_date_parsed:
-                filters &= Q(date__range=(from_date_parsed, to_date_parsed))
-            else:
-                return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
-        else:
+        if not (from_date and to_date):
             return Response({"error": "Both from_date and to_date are required"}, status=status.HTTP_400_BAD_REQUEST)
+        from_date_parsed = parse_date(from_date)
+        to_date_parsed = parse_date(to_date)
+        if not (from_date_parsed and to_date_parsed):
+            return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Filter transactions for 'Expense' and 'Income'
-        expense_transactions = Transaction.objects.filter(
-            filters & Q(ledger__group__nature_group__name__iexact='Expense')
-        )
-        income_transactions = Transaction.objects.filter(
-            filters & Q(ledger__group__nature_group__name__iexact='Income')
-        )
-
-        # Sum the debit_amount for 'Expense' transactions
-        total_expense = expense_transactions.aggregate(total_debit=Sum('debit_amount'))['total_debit'] or 0
+        # One grouped query over the ledger hierarchy, see statements.py
+        return Response(statements.build(statement, from_date_parsed, to_date_parsed))
 
-        # Sum the credit_amount for 'Income' transactions
-        total_income = income_transactions.aggregate(total_credit=Sum('credit_amount'))['total_credit'] or 0
+    @action(detail=False, methods=['get'], url_path='profit-and-loss')
+    def profit_and_loss(self, request):
+        return self._statement(request, 'profit-and-loss')
 
-        # Calculate net profit and loss
-        net_profit = total_income - total_expense if total_income > total_expense else 0
-        net_loss = total_expense - total_income if total_expense > total_income else 0
+    @action(detail=False, methods=['get'], url_path='trial-balance')
+    def trial_balance(self, request):
+        return self._statement(request, 'trial-balance')
 
-        return Response({
-            'total_expense': total_expense,
-            'total_income': total_income,
-            'net_profit': net_profit,
-            'net_loss': net_loss,
-        })
+    @action(detail=False, methods=['get'], url_path='balance-sheet')
+    def balance_sheet(self, request):
+        return self._statement(request, 'balance-sheet')
 
 
 